@@ -0,0 +1,152 @@
+"""notification retention and partitioning
+
+Revision ID: a8e4c0d7f215
+Revises: f1c7a9e3b284
+Create Date: 2026-10-19 18:12:40.527391
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e4c0d7f215'
+down_revision: Union[str, Sequence[str], None] = 'f1c7a9e3b284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created past the current month; the retention job keeps adding them
+PARTITION_MONTHS_AHEAD = 3
+
+NOTIFICATION_INDEXES = (
+    ('ix_notifications_id', ['id']),
+    ('ix_notifications_created_at_user_id', ['created_at', 'user_id']),
+    ('ix_notifications_user_id_created_at', ['user_id', 'created_at']),
+)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def _partition_notifications() -> None:
+    """Rebuild notifications as a table range-partitioned by month on created_at."""
+    bind = op.get_bind()
+    # A foreign key into a partitioned table would have to include created_at;
+    # the retention job deletes outbox rows together with their notification
+    op.drop_constraint('notification_outbox_notification_id_fkey', 'notification_outbox', type_='foreignkey')
+    for name, _ in NOTIFICATION_INDEXES[:2]:
+        op.drop_index(name, table_name='notifications')
+    op.execute("ALTER TABLE notifications DROP CONSTRAINT notifications_pkey")
+    op.execute("ALTER TABLE notifications RENAME TO notifications_unpartitioned")
+    op.execute("""
+        CREATE TABLE notifications (
+            id INTEGER NOT NULL DEFAULT nextval('notifications_id_seq'),
+            title VARCHAR(200) NOT NULL,
+            message TEXT NOT NULL,
+            type notificationtype NOT NULL,
+            data JSON,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            is_read BOOLEAN,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id")
+
+    now = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM notifications_unpartitioned")).scalar()
+    month = min(now, oldest.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )) if oldest else now
+    while month <= _add_months(now, PARTITION_MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE notifications_p{month:%Y%m} PARTITION OF notifications "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{following:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = following
+    # Catches rows dated past the last monthly partition
+    op.execute("CREATE TABLE notifications_default PARTITION OF notifications DEFAULT")
+
+    op.execute("""
+        INSERT INTO notifications (id, title, message, type, data, user_id, is_read, created_at, updated_at)
+        SELECT id, title, message, type, data, user_id, is_read, COALESCE(created_at, CURRENT_TIMESTAMP), updated_at
+        FROM notifications_unpartitioned
+    """)
+    op.execute("DROP TABLE notifications_unpartitioned")
+    for name, columns in NOTIFICATION_INDEXES:
+        op.create_index(name, 'notifications', columns, unique=False)
+
+
+def _unpartition_notifications() -> None:
+    """Copy notifications back into a plain table."""
+    for name, _ in NOTIFICATION_INDEXES:
+        op.drop_index(name, table_name='notifications')
+    op.execute("ALTER TABLE notifications DROP CONSTRAINT notifications_pkey")
+    op.execute("ALTER TABLE notifications RENAME TO notifications_partitioned")
+    op.execute("""
+        CREATE TABLE notifications (
+            id INTEGER NOT NULL DEFAULT nextval('notifications_id_seq'),
+            title VARCHAR(200) NOT NULL,
+            message TEXT NOT NULL,
+            type notificationtype NOT NULL,
+            data JSON,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            is_read BOOLEAN,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id")
+    op.execute("INSERT INTO notifications SELECT * FROM notifications_partitioned")
+    op.execute("DROP TABLE notifications_partitioned")
+    for name, columns in NOTIFICATION_INDEXES[:2]:
+        op.create_index(name, 'notifications', columns, unique=False)
+    op.create_foreign_key(
+        'notification_outbox_notification_id_fkey', 'notification_outbox', 'notifications',
+        ['notification_id'], ['id'],
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('notifications_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notifications_archive_user_id_created_at', 'notifications_archive', ['user_id', 'created_at'], unique=False)
+    # ### end Alembic commands ###
+    if op.get_bind().dialect.name == 'postgresql':
+        # Builds ix_notifications_user_id_created_at on the partitioned table
+        _partition_notifications()
+    else:
+        op.create_index('ix_notifications_user_id_created_at', 'notifications', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition_notifications()
+    else:
+        op.drop_index('ix_notifications_user_id_created_at', table_name='notifications')
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_notifications_archive_user_id_created_at', table_name='notifications_archive')
+    op.drop_table('notifications_archive')
+    # ### end Alembic commands ###
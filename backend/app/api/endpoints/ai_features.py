@@ -18,6 +18,8 @@ from app.schemas import (
 )
 from app.db_models import User as DBUser, Task as DBTask, Application as DBApplication
 from app.services.ai_service import AIService
+from app.services.embedding_service import embedding_service
+from app.core.monitoring import ai_call_window
 
 router = APIRouter()
 ai_service = AIService()
@@ -82,11 +84,14 @@ async def get_smart_matches(
         )
     
     try:
-        # Get potential freelancers
+        # Shortlist candidates from the embedding index, then rescore them
+        candidates = embedding_service.match_freelancers(db, task, k=limit * 5)
+        candidate_ids = [user_id for user_id, _ in candidates]
         freelancers = db.query(DBUser).filter(
+            DBUser.id.in_(candidate_ids),
             DBUser.is_freelancer == True,
             DBUser.is_active == True
-        ).all()
+        ).all() if candidate_ids else []
         
         # Get smart matches using AI
         matches = await ai_service.get_smart_matches(task, freelancers, limit)
@@ -119,7 +124,7 @@ async def get_pricing_recommendation(
         freelancer = db.query(DBUser).filter(DBUser.id == freelancer_id).first()
     
     try:
-        recommendation = await ai_service.get_pricing_recommendation(task, freelancer)
+        recommendation = await ai_service.get_pricing_recommendation(task, freelancer, db=db)
         return recommendation
     except Exception as e:
         raise HTTPException(
@@ -247,11 +252,12 @@ async def suggest_profile_improvements(
 async def get_market_analysis(
     category: str,
     skills: Optional[List[str]] = None,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
     """Get AI-powered market analysis for a category or skills."""
     try:
-        analysis = await ai_service.get_market_analysis(category, skills or [])
+        analysis = await ai_service.get_market_analysis(category, skills or [], db=db)
         return analysis
     except Exception as e:
         raise HTTPException(
@@ -414,4 +420,16 @@ async def get_ai_insights(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get AI insights: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+
+@router.get("/admin/usage", response_model=Dict[str, Any])
+async def get_ai_usage(
+    window: int = Query(3600, ge=60, description="Window in seconds"),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Per-feature AI cost and latency plus the slowest and most expensive recent calls (admin only)."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return ai_call_window.summary(window_seconds=window, limit=limit) 
\ No newline at end of file
@@ -102,7 +102,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             db.refresh(user)
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
         )
         refresh_token = create_refresh_token(data={"sub": user.email})
         return {
@@ -133,7 +133,7 @@ def login_2fa(user_id: int, code: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid 2FA code")
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": user.email})
     return {
@@ -167,7 +167,7 @@ def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     return {
         "access_token": access_token,
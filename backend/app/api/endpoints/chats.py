@@ -2,8 +2,10 @@
 Chat endpoints for messaging between users.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, File, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
 import os
@@ -11,14 +13,25 @@ from uuid import uuid4
 
 from app.database import get_db
 from app.auth import get_current_active_user
-from app.schemas import Chat, ChatCreate, Message, MessageCreate, ChatFile as ChatFileSchema
-from app.db_models import User, Chat as DBChat, Message as DBMessage, Task, ChatFile
+from app.schemas import (
+    Chat, ChatCreate, ChatInboxItem, Message as MessageSchema, MessageCreate, ChatFile as ChatFileSchema,
+    UploadSessionCreate, UploadSessionStatus
+)
+from app.db_models import User, Chat as DBChat, ChatMember, ChatRead, Message as DBMessage, Task, ChatFile
+from app.services.chat_inbox import inbox, touch_chat
+from app.services.chat_membership import find_direct_chat, is_member, user_chat_ids
+from app.services.unread_counters import message_deltas, removed_message_deltas, unread_counters
+from app.services.read_receipts import read_receipts
+from app.services.file_downloads import DownloadTarget, download_access, download_response
+from app.services.file_store import file_store
+from app.services.uploads import StoredFile, UploadError, rechunk, save_upload, unique_name, upload_sessions
 
 router = APIRouter()
 
 ALLOWED_EXTENSIONS = {"pdf", "docx", "xlsx", "png", "jpg", "jpeg", "zip", "txt", "csv", "gif"}
 MAX_FILE_SIZE = 1 * 1024 * 1024 * 1024  # 1 GB
 UPLOAD_DIR = "uploads/chat_files"
+CHAT_UPLOAD_PURPOSE = "chat_file"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
@@ -32,8 +45,8 @@ def get_user_chats(
     """Get all chats for the current user."""
     # Get chats where user is a participant
     chats = db.query(DBChat).filter(
-        (DBChat.user1_id == current_user.id) | (DBChat.user2_id == current_user.id)
-    ).offset(skip).limit(limit).all()
+        DBChat.id.in_(user_chat_ids(current_user.id))
+    ).options(selectinload(DBChat.members)).order_by(DBChat.id).offset(skip).limit(limit).all()
     
     # Convert to Pydantic schemas
     from app.schemas import Chat as ChatSchema
@@ -47,27 +60,17 @@ def create_chat(
     db: Session = Depends(get_db)
 ):
     """Create a new chat."""
-    # Check if task exists if task_id is provided
-    if chat_data.task_id:
-        task = db.query(Task).filter(Task.id == chat_data.task_id).first()
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-        
-        # Check if user is involved in the task
-        if task.creator_id != current_user.id and task.assigned_to_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to create chat for this task"
-            )
-    
+    others = [user_id for user_id in dict.fromkeys(chat_data.participant_ids) if user_id != current_user.id]
+    if not others:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A chat needs at least one other participant"
+        )
+
     # Check if chat already exists between these users
-    existing_chat = db.query(DBChat).filter(
-        ((DBChat.user1_id == current_user.id) & (DBChat.user2_id == chat_data.user2_id)) |
-        ((DBChat.user1_id == chat_data.user2_id) & (DBChat.user2_id == current_user.id))
-    ).first()
+    existing_chat = None
+    if not chat_data.is_group and len(others) == 1:
+        existing_chat = find_direct_chat(db, current_user.id, others[0])
     
     if existing_chat:
         # Return existing chat
@@ -76,9 +79,10 @@ def create_chat(
     
     # Create new chat
     chat = DBChat(
-        user1_id=current_user.id,
-        user2_id=chat_data.user2_id,
-        task_id=chat_data.task_id,
+        title=chat_data.title,
+        is_group=chat_data.is_group,
+        creator_id=current_user.id,
+        participant_ids=others,
         created_at=datetime.utcnow()
     )
     
@@ -91,6 +95,17 @@ def create_chat(
     return ChatSchema.from_orm(chat)
 
 
+@router.get("/inbox", response_model=List[ChatInboxItem])
+def get_inbox(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the user's chats with their last message and unread count, newest activity first."""
+    return inbox(db, current_user.id, skip=skip, limit=limit)
+
+
 @router.get("/{chat_id}", response_model=Chat)
 def get_chat_by_id(
     chat_id: int,
@@ -106,7 +121,7 @@ def get_chat_by_id(
         )
     
     # Check if user is a participant
-    if chat.user1_id != current_user.id and chat.user2_id != current_user.id:
+    if not is_member(db, chat_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this chat"
@@ -134,7 +149,7 @@ def get_chat_messages(
             detail="Chat not found"
         )
     
-    if chat.user1_id != current_user.id and chat.user2_id != current_user.id:
+    if not is_member(db, chat_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view messages in this chat"
@@ -146,10 +161,12 @@ def get_chat_messages(
     ).order_by(DBMessage.created_at.desc()).offset(skip).limit(limit).all()
     
     # Включить файлы для каждого сообщения
+    read = read_receipts.read_flags(db, current_user.id, chat_id, messages)
     result = []
     for message in messages:
         files = db.query(ChatFile).filter(ChatFile.message_id == message.id).all()
         msg = MessageSchema.from_orm(message)
+        msg.is_read = read[message.id]
         msg.files = [ChatFileSchema.from_orm(f) for f in files]
         result.append(msg)
     return result
@@ -171,7 +188,7 @@ def send_message(
             detail="Chat not found"
         )
     
-    if chat.user1_id != current_user.id and chat.user2_id != current_user.id:
+    if not is_member(db, chat_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to send messages in this chat"
@@ -186,10 +203,12 @@ def send_message(
     )
     
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    db.flush()
+    touch_chat(db, chat_id, message.id, message.created_at)
+    deltas = message_deltas(db, [(chat_id, current_user.id)])
+    unread_counters.increment(db, "messages", deltas)
     
-    # Create ChatFile record
+    # Create ChatFile record; committed with the message
     chat_file = ChatFile(
         message_id=message.id,
         chat_id=chat_id,
@@ -202,6 +221,8 @@ def send_message(
     )
     db.add(chat_file)
     db.commit()
+    db.refresh(message)
+    unread_counters.publish(db, deltas)
 
     # Вернуть message с files
     msg = MessageSchema.from_orm(message)
@@ -254,24 +275,87 @@ def delete_chat(
         )
     
     # Check if user is a participant
-    if chat.user1_id != current_user.id and chat.user2_id != current_user.id:
+    if not is_member(db, chat_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to delete this chat"
         )
     
-    # Delete all messages in the chat
+    # Attachments first; their blobs lose a reference and are collected once unused
+    files = db.query(ChatFile).filter(ChatFile.chat_id == chat_id)
+    file_store.release(db, [sha256 for sha256, in files.with_entities(ChatFile.sha256)])
+    files.delete(synchronize_session=False)
+
+    # Unread messages in the chat stop counting for the members who had them
+    deltas = removed_message_deltas(db, chat_id)
+    unread_counters.increment(db, "messages", deltas)
+
+    # Delete all messages and read watermarks in the chat; members go with the chat
     db.query(DBMessage).filter(DBMessage.chat_id == chat_id).delete()
+    db.query(ChatRead).filter(ChatRead.chat_id == chat_id).delete()
     
     # Delete the chat
     db.delete(chat)
     db.commit()
+    unread_counters.publish(db, deltas)
     
     return {"message": "Chat deleted successfully"}
 
 
+def _attach_file(
+    db: Session, chat_id: int, user_id: int, filename: str, file_type: str,
+    stored: StoredFile, is_safe: bool
+) -> MessageSchema:
+    """Post an uploaded file to the chat as a message with the file attached.
+
+    The bytes go to the shared content-addressed store; blocking, so callers
+    run it in the thread pool. The blob reference, the message and the
+    ChatFile row that owns the reference are committed together.
+    """
+    file_store.add(db, stored.path, stored.sha256, stored.size)
+    message = DBMessage(
+        chat_id=chat_id,
+        sender_id=user_id,
+        content=f"[file] {filename}",
+    )
+    db.add(message)
+    db.flush()
+    touch_chat(db, chat_id, message.id, message.created_at)
+    deltas = message_deltas(db, [(chat_id, user_id)])
+    unread_counters.increment(db, "messages", deltas)
+
+    # Create ChatFile record
+    chat_file = ChatFile(
+        message_id=message.id,
+        chat_id=chat_id,
+        user_id=user_id,
+        filename=filename,
+        file_url=f"/api/v1/chats/files/{unique_name(filename)}",
+        file_type=file_type,
+        file_size=stored.size,
+        sha256=stored.sha256,
+        is_safe=is_safe
+    )
+    db.add(chat_file)
+    db.commit()
+    db.refresh(message)
+    unread_counters.publish(db, deltas)
+
+    # Вернуть message с files
+    msg = MessageSchema.from_orm(message)
+    msg.files = [ChatFileSchema.from_orm(chat_file)]
+    return msg
+
+
+def _extension(filename: str) -> str:
+    ext = filename.split(".")[-1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+    return ext
+
+
 @router.post("/{chat_id}/upload", response_model=MessageSchema)
-def upload_chat_file(
+async def upload_chat_file(
     chat_id: int,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
@@ -279,77 +363,154 @@ def upload_chat_file(
 ):
     """Upload a file to a chat message (with security checks)."""
     # Check chat exists and user is a participant
+    await run_in_threadpool(_check_upload_access, db, chat_id, current_user.id)
+
+    ext = _extension(file.filename)
+
+    # Stream to disk in chunks; the size limit is checked as the bytes are copied
+    try:
+        stored = await save_upload(file, file_store.staging_path(), MAX_FILE_SIZE)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    # (Optional) Antivirus scan placeholder
+    is_safe = True  # TODO: Integrate with antivirus if needed
+
+    return await run_in_threadpool(
+        _attach_file, db, chat_id, current_user.id, file.filename,
+        file.content_type or ext, stored, is_safe
+    )
+
+
+def _check_upload_access(db: Session, chat_id: int, user_id: int) -> None:
     chat = db.query(DBChat).filter(DBChat.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    if chat.user1_id != current_user.id and chat.user2_id != current_user.id:
+    if not is_member(db, chat_id, user_id):
         raise HTTPException(status_code=403, detail="Not authorized to upload files in this chat")
 
-    # Validate file extension
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="File type not allowed")
 
-    # Validate file size
-    contents = file.file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large (max 1GB)")
+# Resumable uploads for large files: start a session, PUT chunks, complete
+def _chat_upload(db: Session, upload_id: str, user: User):
+    session = upload_sessions.get(db, upload_id, user.id, CHAT_UPLOAD_PURPOSE)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
 
-    # (Optional) Antivirus scan placeholder
-    is_safe = True  # TODO: Integrate with antivirus if needed
 
-    # Save file
-    unique_name = f"{uuid4().hex}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, unique_name)
-    with open(file_path, "wb") as f:
-        f.write(contents)
+@router.post("/{chat_id}/uploads", response_model=UploadSessionStatus)
+def start_chat_upload(
+    chat_id: int,
+    upload: UploadSessionCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable file upload to a chat."""
+    if not is_member(db, chat_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized to upload files in this chat")
+    _extension(upload.filename)
+    try:
+        session = upload_sessions.create(
+            db, current_user.id, CHAT_UPLOAD_PURPOSE, upload.filename, upload.size, MAX_FILE_SIZE,
+            content_type=upload.content_type, params={"chat_id": chat_id}
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return upload_sessions.status(session)
 
-    # Create message with file attachment
-    message = DBMessage(
-        chat_id=chat_id,
-        sender_id=current_user.id,
-        content=f"[file] {file.filename}",
-    )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
 
-    # Create ChatFile record
-    chat_file = ChatFile(
-        message_id=message.id,
-        chat_id=chat_id,
-        user_id=current_user.id,
-        filename=file.filename,
-        file_url=f"/api/v1/chats/files/{unique_name}",
-        file_type=file.content_type or ext,
-        file_size=len(contents),
-        is_safe=is_safe
+@router.get("/uploads/{upload_id}", response_model=UploadSessionStatus)
+def get_chat_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Where an upload stands, to resume it after a dropped connection."""
+    return upload_sessions.status(_chat_upload(db, upload_id, current_user))
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def upload_chat_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Append the raw request body to the upload at `offset`."""
+    session = await run_in_threadpool(_chat_upload, db, upload_id, current_user)
+    length = request.headers.get("content-length")
+    try:
+        await upload_sessions.append(
+            db, session, offset, rechunk(request.stream()), int(length) if length else None
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return upload_sessions.status(session)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=MessageSchema)
+async def complete_chat_upload(
+    upload_id: str,
+    sha256: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Finish an upload and post the file to its chat; `sha256` is checked if given."""
+    session = await run_in_threadpool(_chat_upload, db, upload_id, current_user)
+    chat_id = session.params["chat_id"]
+    await run_in_threadpool(_check_upload_access, db, chat_id, current_user.id)
+    filename, content_type = session.filename, session.content_type
+    try:
+        stored = await upload_sessions.complete(db, session, file_store.staging_path(), sha256)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return await run_in_threadpool(
+        _attach_file, db, chat_id, current_user.id, filename,
+        content_type or _extension(filename), stored, True
     )
-    db.add(chat_file)
-    db.commit()
 
-    # Вернуть message с files
-    msg = MessageSchema.from_orm(message)
-    msg.files = [ChatFileSchema.from_orm(chat_file)]
-    return msg
 
-from fastapi.responses import FileResponse
+@router.delete("/uploads/{upload_id}")
+def cancel_chat_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Abandon an upload and drop what was received."""
+    upload_sessions.discard(db, _chat_upload(db, upload_id, current_user))
+    return {"message": "Upload cancelled"}
+
+def _chat_file_target(db: Session, user_id: int, file_name: str) -> DownloadTarget:
+    """The file behind a download URL, with the membership check in the same query."""
+    row = (
+        db.query(
+            ChatFile.filename, ChatFile.file_type, ChatFile.file_size, ChatFile.sha256,
+            ChatMember.user_id.label("member_id"),
+        )
+        .outerjoin(ChatMember, and_(ChatMember.chat_id == ChatFile.chat_id, ChatMember.user_id == user_id))
+        .filter(ChatFile.file_url == f"/api/v1/chats/files/{file_name}")
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="File not found")
+    if row.member_id is None:
+        raise HTTPException(status_code=403, detail="Not authorized to download this file")
+    if row.sha256:
+        return DownloadTarget(row.filename, row.file_type, sha256=row.sha256, size=row.file_size)
+    # Stored before deduplication: still under its own name in UPLOAD_DIR
+    return DownloadTarget(row.filename, row.file_type, legacy_path=os.path.join(UPLOAD_DIR, file_name))
+
 
 @router.get("/files/{file_name}")
 def download_chat_file(
     file_name: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Download a file from chat (with access check)."""
-    chat_file = db.query(ChatFile).filter(ChatFile.file_url == f"/api/v1/chats/files/{file_name}").first()
-    if not chat_file:
-        raise HTTPException(status_code=404, detail="File not found")
-    # Check user is participant of the chat
-    chat = db.query(DBChat).filter(DBChat.id == chat_file.chat_id).first()
-    if not chat or (chat.user1_id != current_user.id and chat.user2_id != current_user.id):
-        raise HTTPException(status_code=403, detail="Not authorized to download this file")
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found on server")
-    return FileResponse(file_path, filename=chat_file.filename, media_type=chat_file.file_type)
+    """Download a file from chat (with access check); honors Range and If-None-Match."""
+    target = download_access.get_or_load(
+        (current_user.id, "chat", file_name), lambda: _chat_file_target(db, current_user.id, file_name)
+    )
+    return download_response(request, target)
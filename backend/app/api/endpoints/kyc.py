@@ -1,22 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
 import os
-from uuid import uuid4
 from app.database import get_db
 from app.auth import get_current_active_user
-from app.db_models import User, KYCRequest, KYCStatus
-from app.schemas import KYCRequest as KYCRequestSchema, KYCRequestCreate, KYCStatus as KYCStatusSchema
-from app.services.ai_service import ai_service
-import asyncio
+from app.db_models import FileBlob, User, KYCRequest, KYCStatus
+from app.schemas import (
+    KYCRequest as KYCRequestSchema, KYCRequestCreate, KYCStatus as KYCStatusSchema,
+    KYCUploadSessionCreate, UploadSessionStatus
+)
+from app.services.kyc_review_service import kyc_review_queue
+from app.services.file_downloads import DownloadTarget, download_access, download_response
+from app.services.file_store import file_store
+from app.services.uploads import StoredFile, UploadError, rechunk, save_upload, unique_name, upload_sessions
 
 router = APIRouter()
 
 KYC_UPLOAD_DIR = "uploads/kyc_docs"
+KYC_ALLOWED_EXTENSIONS = {"pdf", "jpg", "jpeg", "png"}
+KYC_MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+KYC_UPLOAD_PURPOSE = "kyc_document"
 os.makedirs(KYC_UPLOAD_DIR, exist_ok=True)
 
+def _submit_document(
+    db: Session, user: User, document_type: str, comment: str, filename: str, stored: StoredFile
+) -> KYCRequestSchema:
+    """Add the document to the file store and queue it for review; blocking, run in the thread pool."""
+    file_store.add(db, stored.path, stored.sha256, stored.size)
+    document_url = f"/api/v1/kyc/files/{unique_name(filename)}"
+    kyc = KYCRequest(
+        user_id=user.id,
+        status=KYCStatus.PENDING,
+        document_type=document_type,
+        document_url=document_url,
+        document_sha256=stored.sha256,
+        comment=comment,
+        # Queued right below in this process; other processes' sweeps skip it
+        review_claimed_at=datetime.now(timezone.utc)
+    )
+    db.add(kyc)
+    db.commit()
+    db.refresh(kyc)
+    # AI review runs on the background queue; the verdict is pushed over the notification socket
+    kyc_review_queue.submit({
+        "kyc_id": kyc.id,
+        "document_type": document_type,
+        "comment": comment,
+        "document_url": document_url,
+        "user_info": {"id": user.id, "email": user.email}
+    })
+    return KYCRequestSchema.from_orm(kyc)
+
+def _check_extension(filename: str) -> None:
+    ext = filename.split(".")[-1].lower()
+    if ext not in KYC_ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+
 @router.post("/upload", response_model=KYCRequestSchema)
-def upload_kyc_document(
+async def upload_kyc_document(
     document_type: str,
     file: UploadFile = File(...),
     comment: str = "",
@@ -24,46 +67,95 @@ def upload_kyc_document(
     db: Session = Depends(get_db)
 ):
     """Upload a KYC document for verification."""
-    ext = file.filename.split(".")[-1].lower()
-    allowed = {"pdf", "jpg", "jpeg", "png"}
-    if ext not in allowed:
-        raise HTTPException(status_code=400, detail="File type not allowed")
-    contents = file.file.read()
-    if len(contents) > 20 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large (max 20MB)")
-    unique_name = f"{uuid4().hex}_{file.filename}"
-    file_path = os.path.join(KYC_UPLOAD_DIR, unique_name)
-    with open(file_path, "wb") as f:
-        f.write(contents)
-    document_url = f"/api/v1/kyc/files/{unique_name}"
-    # AI review
-    ai_result = None
+    _check_extension(file.filename)
     try:
-        ai_result = asyncio.run(ai_service.review_kyc_document(
-            document_type=document_type,
-            comment=comment,
-            document_url=document_url,
-            user_info={"id": current_user.id, "email": current_user.email}
-        ))
-    except Exception as e:
-        ai_result = None
-    if ai_result and ai_result.get("status") in ("APPROVED", "REJECTED"):
-        status_val = KYCStatus[ai_result["status"].upper()]
-        ai_reason = ai_result.get("reason", "")
-    else:
-        status_val = KYCStatus.PENDING
-        ai_reason = "AI недоступен или не дал ответа"
-    kyc = KYCRequest(
-        user_id=current_user.id,
-        status=status_val.value,
-        document_type=document_type,
-        document_url=document_url,
-        comment=comment + (f"\n[AI]: {ai_reason}" if ai_reason else "")
+        stored = await save_upload(file, file_store.staging_path(), KYC_MAX_FILE_SIZE)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return await run_in_threadpool(
+        _submit_document, db, current_user, document_type, comment, file.filename, stored
     )
-    db.add(kyc)
-    db.commit()
-    db.refresh(kyc)
-    return KYCRequestSchema.from_orm(kyc)
+
+# Resumable uploads: start a session, PUT chunks, complete
+def _kyc_upload(db: Session, upload_id: str, user: User):
+    session = upload_sessions.get(db, upload_id, user.id, KYC_UPLOAD_PURPOSE)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@router.post("/uploads", response_model=UploadSessionStatus)
+def start_kyc_upload(
+    upload: KYCUploadSessionCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable KYC document upload."""
+    _check_extension(upload.filename)
+    try:
+        session = upload_sessions.create(
+            db, current_user.id, KYC_UPLOAD_PURPOSE, upload.filename, upload.size, KYC_MAX_FILE_SIZE,
+            content_type=upload.content_type,
+            params={"document_type": upload.document_type, "comment": upload.comment}
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return upload_sessions.status(session)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionStatus)
+def get_kyc_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Where an upload stands, to resume it after a dropped connection."""
+    return upload_sessions.status(_kyc_upload(db, upload_id, current_user))
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def upload_kyc_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Append the raw request body to the upload at `offset`."""
+    session = await run_in_threadpool(_kyc_upload, db, upload_id, current_user)
+    length = request.headers.get("content-length")
+    try:
+        await upload_sessions.append(
+            db, session, offset, rechunk(request.stream()), int(length) if length else None
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return upload_sessions.status(session)
+
+@router.post("/uploads/{upload_id}/complete", response_model=KYCRequestSchema)
+async def complete_kyc_upload(
+    upload_id: str,
+    sha256: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Finish an upload and submit the document for review; `sha256` is checked if given."""
+    session = await run_in_threadpool(_kyc_upload, db, upload_id, current_user)
+    params, filename = dict(session.params), session.filename
+    try:
+        stored = await upload_sessions.complete(db, session, file_store.staging_path(), sha256)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return await run_in_threadpool(
+        _submit_document, db, current_user, params["document_type"], params.get("comment", ""), filename, stored
+    )
+
+@router.delete("/uploads/{upload_id}")
+def cancel_kyc_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Abandon an upload and drop what was received."""
+    upload_sessions.discard(db, _kyc_upload(db, upload_id, current_user))
+    return {"message": "Upload cancelled"}
 
 @router.get("/status", response_model=List[KYCRequestSchema])
 def get_kyc_status(
@@ -74,24 +166,43 @@ def get_kyc_status(
     kyc_requests = db.query(KYCRequest).filter(KYCRequest.user_id == current_user.id).all()
     return [KYCRequestSchema.from_orm(req) for req in kyc_requests]
 
-from fastapi.responses import FileResponse
+def _kyc_document_target(db: Session, user: User, file_name: str) -> DownloadTarget:
+    row = (
+        db.query(KYCRequest.user_id, KYCRequest.document_sha256, FileBlob.size)
+        .outerjoin(FileBlob, FileBlob.sha256 == KYCRequest.document_sha256)
+        .filter(KYCRequest.document_url == f"/api/v1/kyc/files/{file_name}")
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="File not found")
+    if row.user_id != user.id and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to access this file")
+    if row.document_sha256:
+        return DownloadTarget(file_name, sha256=row.document_sha256, size=row.size)
+    # Stored before deduplication: still under its own name in KYC_UPLOAD_DIR
+    return DownloadTarget(file_name, legacy_path=os.path.join(KYC_UPLOAD_DIR, file_name))
+
 @router.get("/files/{file_name}")
 def download_kyc_file(
     file_name: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    kyc = db.query(KYCRequest).filter(KYCRequest.document_url == f"/api/v1/kyc/files/{file_name}").first()
-    if not kyc:
-        raise HTTPException(status_code=404, detail="File not found")
-    if kyc.user_id != current_user.id and not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="Not authorized to access this file")
-    file_path = os.path.join(KYC_UPLOAD_DIR, file_name)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found on server")
-    return FileResponse(file_path, filename=os.path.basename(file_path))
+    """Download a KYC document; honors Range and If-None-Match."""
+    target = download_access.get_or_load(
+        (current_user.id, "kyc", file_name), lambda: _kyc_document_target(db, current_user, file_name)
+    )
+    return download_response(request, target)
 
 # Admin endpoints
+@router.get("/admin/queue-stats")
+def get_kyc_queue_stats(current_user: User = Depends(get_current_active_user)):
+    """Get throughput and backlog of the background KYC review queue."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return kyc_review_queue.stats()
+
 @router.get("/admin/requests", response_model=List[KYCRequestSchema])
 def list_kyc_requests(
     current_user: User = Depends(get_current_active_user),
@@ -5,7 +5,6 @@ Message management endpoints.
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from datetime import datetime
 
 from app.database import get_db
 from app.auth import get_current_active_user
@@ -23,7 +22,10 @@ from app.schemas import (
     MessageResponse,
     PaginatedResponse
 )
-from app.db_models import User, Chat, Message as DBMessage
+from app.db_models import User, Message as DBMessage
+from app.services.chat_membership import is_member, user_chat_ids
+from app.services.read_receipts import read_receipts
+from app.services.unread_counters import unread_counters
 from app.auth import get_current_user
 
 router = APIRouter()
@@ -74,23 +76,6 @@ def get_all_messages(
     )
 
 
-@router.get("/{message_id}", response_model=Message)
-def get_message_by_id(
-    message_id: int,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """Get message by ID."""
-    message = get_message(db, message_id)
-    if not message:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Message not found"
-        )
-    
-    return message
-
-
 @router.put("/{message_id}", response_model=Message)
 def update_message_details(
     message_id: int,
@@ -169,7 +154,13 @@ def get_chat_messages(
     messages = get_messages(
         db, skip=skip, limit=limit, chat_id=chat_id
     )
-    return messages
+    read = read_receipts.read_flags(db, current_user.id, chat_id, messages)
+    result = []
+    for message in messages:
+        msg = Message.from_orm(message)
+        msg.is_read = read[message.id]
+        result.append(msg)
+    return result
 
 
 @router.get("/me/sent", response_model=List[Message])
@@ -194,9 +185,8 @@ def like_message(
     """Like/unlike a message"""
     message = (
         db.query(DBMessage)
-        .join(Chat)
         .filter(DBMessage.id == message_id)
-        .filter(Chat.participant_ids.contains([current_user.id]))
+        .filter(DBMessage.chat_id.in_(user_chat_ids(current_user.id)))
         .first()
     )
 
@@ -236,8 +226,7 @@ def search_messages(
     """Search messages by content"""
     message_query = (
         db.query(DBMessage)
-        .join(Chat)
-        .filter(Chat.participant_ids.contains([current_user.id]))
+        .filter(DBMessage.chat_id.in_(user_chat_ids(current_user.id)))
         .filter(DBMessage.content.ilike(f"%{query}%"))
     )
 
@@ -257,21 +246,16 @@ def get_unread_messages(
     limit: int = 50):
     """Get unread messages for current user"""
     unread_messages = (
-        db.query(DBMessage)
-        .join(Chat)
-        .filter(
-            Chat.participant_ids.contains([current_user.id]),
-            DBMessage.sender_id != current_user.id,
-            ~DBMessage.read_by.contains([current_user.id]))
-        .order_by(DBMessage.created_at.desc())
+        read_receipts.unread(db, current_user.id, user_chat_ids(current_user.id))
+        .order_by(DBMessage.id.desc())
         .offset(skip)
         .limit(limit)
         .all()
     )
 
     return {
-        "unread_messages": [MessageResponse.from_orm(message) for message in unread_messages],
-        "total": len(unread_messages)
+        "unread_messages": [Message.from_orm(message) for message in unread_messages],
+        "total": unread_counters.get(db, current_user.id)["messages"]
     }
 
 
@@ -280,12 +264,11 @@ def mark_message_as_read(
     message_id: int,
     current_user: User=Depends(get_current_user),
     db: Session=Depends(get_db)):
-    """Mark a specific message as read"""
+    """Mark a message, and every earlier one in its chat, as read"""
     message = (
         db.query(DBMessage)
-        .join(Chat)
         .filter(DBMessage.id == message_id)
-        .filter(Chat.participant_ids.contains([current_user.id]))
+        .filter(DBMessage.chat_id.in_(user_chat_ids(current_user.id)))
         .first()
     )
 
@@ -294,14 +277,9 @@ def mark_message_as_read(
             status_code=status.HTTP_404_NOT_FOUND, detail="Message not found"
         )
 
-    # Mark as read if not message.read_by:
-    if not hasattr(message, 'read_by') or message.read_by is None:
-        message.read_by = []
-
-    if current_user.id not in message.read_by:
-        message.read_by.append(current_user.id)
-        db.add(message)
+    if read_receipts.mark_read(db, current_user.id, message.chat_id, message.id):
         db.commit()
+        unread_counters.publish(db, [current_user.id])
 
     return {"message": "Message marked as read"}
 
@@ -310,15 +288,7 @@ def mark_message_as_read(
 def get_unread_message_count(current_user: User=
     Depends(get_current_user), db: Session=Depends(get_db)):
     """Get count of unread messages"""
-    unread_count = (
-        db.query(DBMessage)
-        .join(Chat)
-        .filter(
-            Chat.participant_ids.contains([current_user.id]),
-            DBMessage.sender_id != current_user.id,
-            DBMessage.read == False)
-        .count()
-    )
+    unread_count = unread_counters.get(db, current_user.id)["messages"]
 
     return {"unread_count": unread_count}
 
@@ -329,21 +299,17 @@ def mark_all_messages_as_read(
     current_user: User=Depends(get_current_user),
     db: Session=Depends(get_db)):
     """Mark all messages as read"""
-    message_query = (
-        db.query(DBMessage)
-        .join(Chat)
-        .filter(
-            Chat.participant_ids.contains([current_user.id]),
-            DBMessage.sender_id != current_user.id,
-            DBMessage.read == False)
-    )
-
     if chat_id:
-        message_query = message_query.filter(DBMessage.chat_id == chat_id)
-
-    updated_count = message_query.update({"read": True, "read_at": datetime.utcnow()})
+        if not is_member(db, chat_id, current_user.id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+            )
+        updated_count = read_receipts.mark_chat_read(db, current_user.id, chat_id)
+    else:
+        updated_count = read_receipts.mark_all_read(db, current_user.id, user_chat_ids(current_user.id))
 
     db.commit()
+    unread_counters.publish(db, [current_user.id])
 
     return {"message": f"Marked {updated_count} messages as read"}
 
@@ -356,8 +322,7 @@ def get_recent_messages(
     """Get recent messages from all chats"""
     recent_messages = (
         db.query(DBMessage)
-        .join(Chat)
-        .filter(Chat.participant_ids.contains([current_user.id]))
+        .filter(DBMessage.chat_id.in_(user_chat_ids(current_user.id)))
         .order_by(DBMessage.created_at.desc())
         .limit(limit)
         .all()
@@ -377,9 +342,25 @@ def get_recent_messages(
         ]
     }
 
-router = APIRouter()
-
 
 @router.get("/ping")
 def ping():
     return {"message": "pong"}
+
+
+# Declared last so the fixed paths above (/unread, /search, /recent) match first
+@router.get("/{message_id}", response_model=Message)
+def get_message_by_id(
+    message_id: int,
+    current_user=Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get message by ID."""
+    message = get_message(db, message_id)
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found"
+        )
+    
+    return message
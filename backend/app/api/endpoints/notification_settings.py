@@ -23,6 +23,7 @@ from app.schemas import (
     PaginatedResponse
 )
 from app.db_models import NotificationSetting as DBNotificationSetting
+from app.services.notification_preferences import notification_preferences
 
 router = APIRouter()
 
@@ -36,6 +37,7 @@ def create_new_notification_setting(
     """Create a new notification setting."""
     # Create notification setting
     setting = create_notification_setting(db, setting_data, current_user.id)
+    notification_preferences.invalidate(current_user.id)
     return setting
 
 
@@ -123,6 +125,7 @@ def update_notification_setting_details(
     updated_setting = update_notification_setting(
         db, setting_id, setting_data.dict(exclude_unset=True)
     )
+    notification_preferences.invalidate(current_user.id)
     if updated_setting is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -154,6 +157,7 @@ def delete_notification_setting_by_id(
         )
     
     success = delete_notification_setting(db, setting_id)
+    notification_preferences.invalidate(current_user.id)
     if success is None or success is False:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -207,6 +211,7 @@ def bulk_update_notification_settings(
         
         updated_count += 1
     
+    notification_preferences.invalidate(current_user.id)
     return {"message": f"Updated {updated_count} notification settings"}
 
 
@@ -225,6 +230,7 @@ def disable_all_notifications(
         setattr(setting, 'sms_enabled', False)  # type: ignore
     
     db.commit()
+    notification_preferences.invalidate(current_user.id)
     
     return {"message": f"Disabled {len(settings)} notification settings"}
 
@@ -244,6 +250,7 @@ def enable_all_notifications(
         setattr(setting, 'sms_enabled', True)  # type: ignore
     
     db.commit()
+    notification_preferences.invalidate(current_user.id)
     
     return {"message": f"Enabled {len(settings)} notification settings"}
 
@@ -11,6 +11,7 @@ from app.database import get_db
 from app.auth import get_current_active_user
 from app.schemas import Notification, NotificationCreate
 from app.db_models import User, Notification as DBNotification
+from app.services.unread_counters import unread_counters
 
 router = APIRouter()
 
@@ -42,10 +43,7 @@ def get_unread_count(
     db: Session = Depends(get_db)
 ):
     """Get count of unread notifications."""
-    count = db.query(DBNotification).filter(
-        DBNotification.user_id == current_user.id,
-        DBNotification.is_read == False
-    ).count()
+    count = unread_counters.get(db, current_user.id)["notifications"]
     
     return {"unread_count": count}
 
@@ -65,8 +63,10 @@ def create_notification(
     )
     
     db.add(notification)
+    unread_counters.increment(db, "notifications", {current_user.id: 1})
     db.commit()
     db.refresh(notification)
+    unread_counters.publish(db, [current_user.id])
     
     # Convert to Pydantic schema
     from app.schemas import Notification as NotificationSchema
@@ -120,9 +120,11 @@ def mark_as_read(
             detail="Not authorized to update this notification"
         )
     
-    notification.is_read = True
-    notification.read_at = datetime.utcnow()
-    db.commit()
+    if not notification.is_read:
+        notification.is_read = True
+        unread_counters.increment(db, "notifications", {current_user.id: -1})
+        db.commit()
+        unread_counters.publish(db, [current_user.id])
     
     return {"message": "Notification marked as read"}
 
@@ -136,12 +138,11 @@ def mark_all_as_read(
     db.query(DBNotification).filter(
         DBNotification.user_id == current_user.id,
         DBNotification.is_read == False
-    ).update({
-        "is_read": True,
-        "read_at": datetime.utcnow()
-    })
+    ).update({"is_read": True}, synchronize_session=False)
+    unread_counters.reset(db, "notifications", current_user.id)
     
     db.commit()
+    unread_counters.publish(db, [current_user.id])
     
     return {"message": "All notifications marked as read"}
 
@@ -167,8 +168,13 @@ def delete_notification(
             detail="Not authorized to delete this notification"
         )
     
+    was_unread = not notification.is_read
+    if was_unread:
+        unread_counters.increment(db, "notifications", {current_user.id: -1})
     db.delete(notification)
     db.commit()
+    if was_unread:
+        unread_counters.publish(db, [current_user.id])
     
     return {"message": "Notification deleted successfully"}
 
@@ -180,6 +186,8 @@ def delete_all_notifications(
 ):
     """Delete all notifications for the current user."""
     db.query(DBNotification).filter(DBNotification.user_id == current_user.id).delete()
+    unread_counters.reset(db, "notifications", current_user.id)
     db.commit()
+    unread_counters.publish(db, [current_user.id])
     
     return {"message": "All notifications deleted successfully"}
@@ -10,7 +10,8 @@ from app.database import get_db
 from app.auth import get_current_active_user
 from app.crud.tasks import get_task, get_tasks, create_task, update_task, delete_task
 from app.schemas import Task, TaskCreate, TaskUpdate, TaskDetail
-from app.db_models import User
+from app.db_models import User, Task as DBTask, TaskStatus as DBTaskStatus
+from app.services.embedding_service import embedding_service
 
 router = APIRouter()
 
@@ -78,6 +79,18 @@ def get_recommended_tasks(
             detail="Only freelancers can get recommended tasks"
         )
     
+    # Ранжируем открытые задачи по семантической близости к профилю
+    candidates = embedding_service.recommend_tasks(db, current_user, k=(skip + limit) * 4)
+    if candidates:
+        scores = dict(candidates)
+        tasks = db.query(DBTask).filter(
+            DBTask.id.in_(list(scores)),
+            DBTask.status == DBTaskStatus.OPEN,
+            DBTask.complexity_level <= current_user.level  # type: ignore
+        ).all()
+        tasks.sort(key=lambda x: scores[x.id], reverse=True)
+        return tasks[skip:skip + limit]
+
     # Получаем задачи подходящего уровня сложности
     tasks = get_tasks(
         db, 
@@ -15,6 +15,8 @@ celery_app = Celery(
         "app.services.notification_service",
         "app.services.ai_service",
         "app.services.financial_service",
+        "app.services.market_rollup_service",
+        "app.services.file_store",
     ],
 )
 
@@ -41,6 +43,7 @@ celery_app.conf.task_routes = {
     "app.services.notification_service.*": {"queue": "notifications"},
     "app.services.ai_service.*": {"queue": "ai"},
     "app.services.financial_service.*": {"queue": "financial"},
+    "app.services.market_rollup_service.*": {"queue": "ai"},
 }
 
 # Beat schedule for periodic tasks
@@ -53,6 +56,22 @@ celery_app.conf.beat_schedule = {
         "task": "app.services.auth_service.cleanup_expired_tokens",
         "schedule": 3600.0,  # 1 hour
     },
+    "reconcile-unread-counters": {
+        "task": "app.services.notification_service.reconcile_unread_counters",
+        "schedule": 900.0,  # 15 minutes
+    },
+    "archive-expired-notifications": {
+        "task": "app.services.notification_service.archive_expired_notifications",
+        "schedule": 3600.0,  # 1 hour, each run capped by NOTIFICATION_ARCHIVE_MAX_SECONDS
+    },
+    "collect-file-blobs": {
+        "task": "app.services.file_store.collect_file_blobs",
+        "schedule": 3600.0,  # 1 hour
+    },
+    "adopt-orphan-file-blobs": {
+        "task": "app.services.file_store.adopt_orphan_blobs",
+        "schedule": 86400.0,  # 1 day; lists the whole storage
+    },
     "update-user-stats": {
         "task": "app.services.user_service.update_user_statistics",
         "schedule": 1800.0,  # 30 minutes
@@ -61,6 +80,14 @@ celery_app.conf.beat_schedule = {
         "task": "app.services.financial_service.process_pending_payments",
         "schedule": 300.0,  # 5 minutes
     },
+    "rebuild-market-rollups": {
+        "task": "app.services.market_rollup_service.rebuild_market_rollups",
+        "schedule": 86400.0,  # 24 hours
+    },
+    "refresh-market-rollups": {
+        "task": "app.services.market_rollup_service.refresh_market_rollups",
+        "schedule": 900.0,  # 15 minutes
+    },
 }
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 Configuration settings for the application.
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import validator
 import os
@@ -33,6 +33,18 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 587
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
+    SMTP_USE_TLS: bool = True  # off for a local debugging server
+    SMTP_POOL_SIZE: int = 4  # authenticated sessions kept per provider
+    SMTP_RATE_LIMIT: float = 10.0  # messages per second per provider, 0 for no cap
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    SMTP_IDLE_TIMEOUT: float = 60.0  # seconds before a pooled session is re-checked with NOOP
+    EMAIL_FROM: str = "noreply@freelanceai.com"
+
+    # Digest emails
+    DIGEST_BATCH_SIZE: int = 100  # users sent in parallel between checkpoints
+    DIGEST_CONCURRENCY: int = 8
+    DIGEST_MAX_ITEMS: int = 20  # notifications listed per digest
+    DIGEST_YIELD_PER: int = 1000  # rows fetched per round trip from the cursor
 
     # AI/OpenAI
     OPENAI_API_KEY: Optional[str] = None
@@ -41,9 +53,102 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
 
+    # WebSocket fan-out between workers
+    WEBSOCKET_BACKPLANE: str = "memory"  # memory, redis
+    WEBSOCKET_BACKPLANE_CHANNEL: str = "ws:events"
+    WEBSOCKET_SEND_QUEUE_SIZE: int = 256  # per connection
+    WEBSOCKET_SEND_TIMEOUT: float = 5.0  # seconds before a stuck send evicts the client
+    WEBSOCKET_SLOW_CONSUMER_POLICY: str = "disconnect"  # disconnect, drop_oldest, drop_newest
+    WEBSOCKET_EVENT_LOG: str = "memory"  # memory, redis (use redis with several workers)
+    WEBSOCKET_EVENT_LOG_SIZE: int = 200  # events kept per user for resume
+    WEBSOCKET_EVENT_LOG_TTL: int = 86400
+    WEBSOCKET_HEARTBEAT_INTERVAL: float = 25.0  # app-level ping the client answers with pong
+    WEBSOCKET_IDLE_TIMEOUT: float = 75.0  # close sockets with no inbound frame for this long
+    WEBSOCKET_PING_INTERVAL: float = 20.0  # protocol-level ping, handled by uvicorn
+    WEBSOCKET_PING_TIMEOUT: float = 20.0
+    WEBSOCKET_PER_MESSAGE_DEFLATE: bool = True  # compress frames when the client offers the extension
+    WEBSOCKET_COALESCE_WINDOW_MS: float = 10.0  # batch a user's events into one frame; 0 disables
+    WEBSOCKET_COALESCE_MAX_EVENTS: int = 50
+
     # File uploads
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # bytes copied per write
+    UPLOAD_SESSION_DIR: str = "uploads/.sessions"  # partial files; same filesystem as the upload dirs
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # seconds an idle resumable upload is kept
+
+    # File storage
+    FILE_STORAGE_BACKEND: str = "local"  # local, s3
+    FILE_STORAGE_DIR: str = "uploads/blobs"  # local blobs, and the staging area for new ones
+    FILE_STORAGE_S3_BUCKET: str = "freelance-files"
+    FILE_STORAGE_S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    FILE_STORAGE_S3_ACCESS_KEY: Optional[str] = None
+    FILE_STORAGE_S3_SECRET_KEY: Optional[str] = None
+    FILE_STORAGE_S3_REGION: str = "us-east-1"
+    FILE_STORAGE_S3_PREFIX: str = ""  # key prefix inside the bucket
+    FILE_BLOB_GC_GRACE: int = 3600  # seconds an unreferenced blob is kept before it is collected
+
+    # File downloads
+    FILE_DOWNLOAD_CACHE_CONTROL: str = "private, max-age=3600"  # the content behind a file URL never changes
+    FILE_ACCESS_CACHE_TTL: float = 30.0  # seconds an allowed (user, file) download skips the access query
+    FILE_ACCESS_CACHE_SIZE: int = 100000  # entries
+
+    # Notifications
+    NOTIFICATION_PREFERENCES_TTL: float = 300.0  # seconds compiled settings are cached
+    NOTIFICATION_PREFERENCES_CACHE_SIZE: int = 100000  # users
+    NOTIFICATION_BULK_CHUNK_SIZE: int = 1000  # rows per multi-row INSERT
+
+    # Notification retention
+    NOTIFICATION_RETENTION_DAYS: int = 365  # default age at which notifications are archived
+    NOTIFICATION_RETENTION_DAYS_BY_TYPE: Dict[str, int] = {}  # e.g. {"system_message": 90}
+    NOTIFICATION_ARCHIVE_BACKEND: str = "table"  # table, jsonl
+    NOTIFICATION_ARCHIVE_DIR: str = "archive/notifications"  # gzipped JSONL files for the jsonl backend
+    NOTIFICATION_ARCHIVE_BATCH_SIZE: int = 1000  # rows moved per transaction
+    NOTIFICATION_ARCHIVE_DUTY_CYCLE: float = 0.25  # share of wall time spent moving rows
+    NOTIFICATION_ARCHIVE_MAX_SECONDS: float = 600.0  # per run; the rest waits for the next run
+    NOTIFICATION_PARTITION_MONTHS_AHEAD: int = 3  # monthly Postgres partitions created in advance
+
+    # Notification outbox dispatcher
+    OUTBOX_BATCH_SIZE: int = 200  # rows claimed per round
+    OUTBOX_POLL_INTERVAL: float = 1.0  # seconds between checks when nothing woke the dispatcher
+    OUTBOX_WEBSOCKET_CONCURRENCY: int = 1  # keeps pushes in id order
+    OUTBOX_EMAIL_CONCURRENCY: int = 4
+    OUTBOX_PUSH_CONCURRENCY: int = 4
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_BACKOFF_BASE: float = 2.0  # seconds, raised to the attempt number
+    OUTBOX_BACKOFF_MAX: float = 300.0
+
+    # Realtime chat
+    CHAT_FLUSH_INTERVAL_MS: float = 20.0  # write-behind batching window
+    CHAT_FLUSH_MAX_BATCH: int = 500
+    CHAT_FLUSH_MAX_ATTEMPTS: int = 5  # a message failing this often is dropped and its sender told
+    CHAT_FLUSH_RETRY_BACKOFF: float = 0.5  # seconds before the first retry, doubled per attempt
+    CHAT_PARTICIPANTS_TTL: int = 60  # seconds chat membership is cached
+
+    # KYC review queue
+    KYC_REVIEW_CONCURRENCY: int = 4
+    KYC_REVIEW_QUEUE_SIZE: int = 1000
+    KYC_REVIEW_SWEEP_INTERVAL: int = 300  # seconds between re-queues of unreviewed requests
+    KYC_REVIEW_CLAIM_TTL: int = 3600  # seconds a process holds a request for review before others may take it
+
+    # Embedding index for semantic matching
+    EMBEDDING_DIR: str = "data/embeddings"
+    EMBEDDING_DIM: int = 256
+    EMBEDDING_MODEL: Optional[str] = None  # "package.module:factory", hashing embedder when unset
+    EMBEDDING_IVF_LISTS: int = 0  # 0 disables IVF partitioning
+    EMBEDDING_IVF_PROBES: int = 4
+
+    # Market rollups
+    MARKET_ROLLUP_ACCURACY: float = 0.01  # relative error of price/time-to-hire percentiles
+    MARKET_ROLLUP_MIN_SAMPLES: int = 5  # hires needed before rollups replace the heuristics
+
+    # AI usage accounting
+    AI_PROMPT_COST_PER_1K: float = 0.002  # USD per 1K prompt tokens
+    AI_COMPLETION_COST_PER_1K: float = 0.006  # USD per 1K completion tokens
+    AI_USAGE_WINDOW_SECONDS: int = 3600
+    AI_RESPONSE_CACHE_SIZE: int = 1000
+    # Features whose identical prompts may reuse an answer for an hour; none by default
+    AI_RESPONSE_CACHE_FEATURES: List[str] = []
 
     # Rate limiting
     RATE_LIMIT_PER_MINUTE: int = 60
@@ -3,6 +3,8 @@ Monitoring and metrics configuration.
 """
 
 import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Union
 from prometheus_client import (
     Counter,
     Histogram,
@@ -59,6 +61,267 @@ ERROR_COUNT = Counter(
     ["type", "endpoint"]
 )
 
+KYC_REVIEW_COUNT = Counter(
+    "kyc_reviews_total",
+    "Total number of KYC documents reviewed by the background queue",
+    ["outcome"]
+)
+
+KYC_REVIEW_DURATION = Histogram(
+    "kyc_review_duration_seconds",
+    "Time spent reviewing a single KYC document"
+)
+
+KYC_REVIEW_WAIT = Histogram(
+    "kyc_review_wait_seconds",
+    "Time a KYC document spent queued before review started"
+)
+
+KYC_REVIEW_QUEUE_DEPTH = Gauge(
+    "kyc_review_queue_depth",
+    "Number of KYC documents waiting for review"
+)
+
+BULK_NOTIFICATIONS = Counter(
+    "bulk_notifications_total",
+    "Notifications created through the bulk path"
+)
+
+OUTBOX_DELIVERIES = Counter(
+    "notification_outbox_deliveries_total",
+    "Notification outbox deliveries by channel",
+    ["channel", "outcome"]
+)
+
+OUTBOX_DELIVERY_DURATION = Histogram(
+    "notification_outbox_delivery_duration_seconds",
+    "Time spent delivering one outbox row",
+    ["channel"]
+)
+
+EMAILS_SENT = Counter(
+    "emails_sent_total",
+    "Emails handed to the SMTP server",
+    ["outcome"]
+)
+
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds",
+    "Time spent on one SMTP transaction over a pooled session"
+)
+
+UNREAD_COUNTER_DRIFT = Counter(
+    "unread_counter_drift_total",
+    "Unread count difference corrected by the reconciler",
+    ["kind"]
+)
+
+PREFERENCE_CACHE = Counter(
+    "notification_preference_cache_total",
+    "Notification preference lookups by cache result",
+    ["result"]
+)
+
+DIGESTS = Counter(
+    "notification_digests_total",
+    "Digest emails by outcome",
+    ["outcome"]
+)
+
+NOTIFICATIONS_ARCHIVED = Counter(
+    "notifications_archived_total",
+    "Notifications moved out of the live table by the retention job",
+    ["backend"]
+)
+
+NOTIFICATION_ARCHIVE_BATCH_DURATION = Histogram(
+    "notification_archive_batch_duration_seconds",
+    "Time spent moving one batch of expired notifications"
+)
+
+SMTP_CONNECTIONS = Counter(
+    "smtp_connections_total",
+    "SMTP session pool events",
+    ["event"]
+)
+
+CHAT_MESSAGES = Counter(
+    "chat_messages_total",
+    "Chat messages received over the WebSocket gateway",
+    ["outcome"]
+)
+
+CHAT_FLUSH_SIZE = Histogram(
+    "chat_flush_size",
+    "Chat messages stored per write-behind flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+CHAT_FLUSH_DURATION = Histogram(
+    "chat_flush_duration_seconds",
+    "Time spent on one write-behind flush of chat messages"
+)
+
+CHAT_WRITE_BEHIND_DEPTH = Gauge(
+    "chat_write_behind_depth",
+    "Chat messages acknowledged but not yet stored"
+)
+
+AI_CALL_COUNT = Counter(
+    "ai_calls_total",
+    "Total number of AI feature calls",
+    ["feature", "outcome"]
+)
+
+AI_TOKENS = Counter(
+    "ai_tokens_total",
+    "Tokens consumed by AI feature calls",
+    ["feature", "kind"]
+)
+
+AI_CALL_LATENCY = Histogram(
+    "ai_call_duration_seconds",
+    "AI call duration split into network and parse time",
+    ["feature", "phase"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+
+AI_PROMPT_SIZE = Histogram(
+    "ai_prompt_chars",
+    "Prompt size in characters",
+    ["feature"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+
+AI_CACHE_COUNT = Counter(
+    "ai_cache_requests_total",
+    "AI response cache lookups",
+    ["feature", "result"]
+)
+
+AI_FALLBACK_COUNT = Counter(
+    "ai_fallbacks_total",
+    "AI calls that fell back to default values",
+    ["feature", "reason"]
+)
+
+WEBSOCKET_BACKPLANE_MESSAGES = Counter(
+    "websocket_backplane_messages_total",
+    "WebSocket events passed through the cross-worker backplane",
+    ["event"]
+)
+
+WEBSOCKET_BACKPLANE_LATENCY = Histogram(
+    "websocket_backplane_latency_seconds",
+    "Delay between publishing an event and another worker receiving it",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+WEBSOCKET_SEND_QUEUE_DEPTH = Gauge(
+    "websocket_send_queue_depth",
+    "Messages waiting in per-connection WebSocket send queues"
+)
+
+WEBSOCKET_DROPPED = Counter(
+    "websocket_messages_dropped_total",
+    "WebSocket messages that were not delivered",
+    ["reason"]
+)
+
+WEBSOCKET_EVICTIONS = Counter(
+    "websocket_evictions_total",
+    "WebSocket clients disconnected for falling behind",
+    ["reason"]
+)
+
+WEBSOCKET_FRAMES_SENT = Counter(
+    "websocket_frames_sent_total",
+    "WebSocket frames written",
+    ["codec"]
+)
+
+WEBSOCKET_EVENTS_SENT = Counter(
+    "websocket_events_sent_total",
+    "WebSocket events written, several per frame when coalesced",
+    ["codec"]
+)
+
+WEBSOCKET_BYTES_SENT = Counter(
+    "websocket_bytes_sent_total",
+    "WebSocket payload bytes written, before permessage-deflate",
+    ["codec"]
+)
+
+
+class AICallWindow:
+    """Sliding window of recent AI calls for the admin usage report."""
+
+    def __init__(self, window_seconds: int = 3600, max_calls: int = 5000):
+        self.window_seconds = window_seconds
+        self.calls: Deque[Dict[str, Any]] = deque(maxlen=max_calls)
+
+    def add(self, call: Dict[str, Any]) -> None:
+        call.setdefault("timestamp", time.time())
+        self.calls.append(call)
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.window_seconds
+        while self.calls and self.calls[0]["timestamp"] < cutoff:
+            self.calls.popleft()
+
+    def summary(self, window_seconds: Optional[int] = None, limit: int = 10) -> Dict[str, Any]:
+        self._prune()
+        window = min(window_seconds or self.window_seconds, self.window_seconds)
+        cutoff = time.time() - window
+        calls = [call for call in self.calls if call["timestamp"] >= cutoff]
+
+        features: Dict[str, Dict[str, Any]] = {}
+        latencies: Dict[str, List[float]] = {}
+        for call in calls:
+            stats = features.setdefault(call["feature"], {
+                "calls": 0, "api_calls": 0, "cache_hits": 0, "fallbacks": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+            })
+            stats["calls"] += 1
+            if call["outcome"] == "cache_hit":
+                stats["cache_hits"] += 1
+            elif call["outcome"] == "fallback":
+                stats["fallbacks"] += 1
+            if call["outcome"] != "cache_hit":
+                stats["api_calls"] += 1
+            stats["prompt_tokens"] += call.get("prompt_tokens", 0)
+            stats["completion_tokens"] += call.get("completion_tokens", 0)
+            stats["cost"] += call.get("cost", 0.0)
+            if call["outcome"] == "success":
+                latencies.setdefault(call["feature"], []).append(call["latency"])
+
+        for feature, stats in features.items():
+            samples = sorted(latencies.get(feature, []))
+            stats["cost"] = round(stats["cost"], 6)
+            stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["calls"], 3)
+            stats["fallback_rate"] = round(stats["fallbacks"] / stats["calls"], 3)
+            stats["avg_latency"] = round(sum(samples) / len(samples), 3) if samples else None
+            stats["p95_latency"] = round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 3) if samples else None
+
+        def public(call: Dict[str, Any]) -> Dict[str, Any]:
+            return {key: value for key, value in call.items() if key != "timestamp"} | {
+                "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(call["timestamp"]))
+            }
+
+        api_calls = [call for call in calls if call["outcome"] != "cache_hit"]
+        return {
+            "window_seconds": window,
+            "total_calls": len(calls),
+            "total_cost": round(sum(call.get("cost", 0.0) for call in calls), 6),
+            "features": features,
+            "slowest": [public(call) for call in sorted(api_calls, key=lambda call: -call["latency"])[:limit]],
+            "most_expensive": [public(call) for call in sorted(api_calls, key=lambda call: -call.get("cost", 0.0))[:limit]],
+        }
+
+
+ai_call_window = AICallWindow(settings.AI_USAGE_WINDOW_SECONDS)
+
 
 class MetricsMiddleware:
     """Middleware for collecting metrics."""
@@ -134,6 +397,146 @@ def record_error(error_type: str, endpoint: str) -> None:
     ERROR_COUNT.labels(type=error_type, endpoint=endpoint).inc()
 
 
+def record_kyc_review(outcome: str, duration: float, wait: float) -> None:
+    """Record KYC review queue metrics."""
+    KYC_REVIEW_COUNT.labels(outcome=outcome).inc()
+    KYC_REVIEW_DURATION.observe(duration)
+    KYC_REVIEW_WAIT.observe(wait)
+
+
+def record_bulk_notifications(count: int) -> None:
+    """Record notifications inserted by one bulk chunk."""
+    BULK_NOTIFICATIONS.inc(count)
+
+
+def record_outbox_delivery(channel: str, outcome: str, duration: float) -> None:
+    """Record one outbox delivery attempt (sent, error) or a row given up on (failed)."""
+    OUTBOX_DELIVERIES.labels(channel=channel, outcome=outcome).inc()
+    if outcome != "failed":
+        OUTBOX_DELIVERY_DURATION.labels(channel=channel).observe(duration)
+
+
+def record_email_send(outcome: str, duration: float) -> None:
+    """Record one email accepted (sent) or given up on (failed) by the SMTP server."""
+    EMAILS_SENT.labels(outcome=outcome).inc()
+    if outcome == "sent":
+        EMAIL_SEND_DURATION.observe(duration)
+
+
+def record_unread_drift(kind: str, amount: int) -> None:
+    """Record how far a stored unread counter was from the true count."""
+    UNREAD_COUNTER_DRIFT.labels(kind=kind).inc(amount)
+
+
+def record_preference_cache(result: str, count: int = 1) -> None:
+    """Record notification preference lookups (hit, miss)."""
+    if count:
+        PREFERENCE_CACHE.labels(result=result).inc(count)
+
+
+def record_digest(outcome: str, count: int = 1) -> None:
+    """Record digest emails by outcome (sent, failed)."""
+    DIGESTS.labels(outcome=outcome).inc(count)
+
+
+def record_notification_archive(backend: str, count: int, duration: float) -> None:
+    """Record one batch of notifications archived by the retention job."""
+    NOTIFICATIONS_ARCHIVED.labels(backend=backend).inc(count)
+    NOTIFICATION_ARCHIVE_BATCH_DURATION.observe(duration)
+
+
+def record_smtp_connection(event: str) -> None:
+    """Record SMTP pool events (opened, reused, retired, dropped)."""
+    SMTP_CONNECTIONS.labels(event=event).inc()
+
+
+def record_chat_message(outcome: str, count: int = 1) -> None:
+    """Record chat messages by outcome (accepted, duplicate, flush_failed, dropped)."""
+    CHAT_MESSAGES.labels(outcome=outcome).inc(count)
+
+
+def record_chat_flush(size: int, duration: float) -> None:
+    """Record one write-behind flush of chat messages."""
+    CHAT_FLUSH_SIZE.observe(size)
+    CHAT_FLUSH_DURATION.observe(duration)
+
+
+def record_ai_call(
+    feature: str,
+    outcome: str,
+    network: float = 0.0,
+    parse: float = 0.0,
+    prompt_chars: int = 0,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    fallback_reason: Optional[str] = None,
+    cacheable: bool = True,
+) -> None:
+    """Record metrics and the sliding-window entry for one AI call.
+
+    Calls of features that do not use the response cache count as "bypass",
+    so hit and miss rates describe only the cached features.
+    """
+    AI_CALL_COUNT.labels(feature=feature, outcome=outcome).inc()
+    if outcome == "cache_hit":
+        AI_CACHE_COUNT.labels(feature=feature, result="hit").inc()
+    else:
+        AI_CACHE_COUNT.labels(feature=feature, result="miss" if cacheable else "bypass").inc()
+        AI_PROMPT_SIZE.labels(feature=feature).observe(prompt_chars)
+    if network:
+        AI_CALL_LATENCY.labels(feature=feature, phase="network").observe(network)
+    if parse:
+        AI_CALL_LATENCY.labels(feature=feature, phase="parse").observe(parse)
+    if prompt_tokens:
+        AI_TOKENS.labels(feature=feature, kind="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        AI_TOKENS.labels(feature=feature, kind="completion").inc(completion_tokens)
+    if fallback_reason:
+        AI_FALLBACK_COUNT.labels(feature=feature, reason=fallback_reason).inc()
+
+    cost = (
+        prompt_tokens * settings.AI_PROMPT_COST_PER_1K
+        + completion_tokens * settings.AI_COMPLETION_COST_PER_1K
+    ) / 1000
+    ai_call_window.add({
+        "feature": feature,
+        "outcome": outcome,
+        "latency": round(network + parse, 4),
+        "network": round(network, 4),
+        "parse": round(parse, 4),
+        "prompt_chars": prompt_chars,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": cost,
+        "fallback_reason": fallback_reason,
+    })
+
+
+def record_backplane_message(event: str, latency: Optional[float] = None) -> None:
+    """Record a backplane publish/receive and cross-worker delivery latency."""
+    WEBSOCKET_BACKPLANE_MESSAGES.labels(event=event).inc()
+    if latency is not None:
+        WEBSOCKET_BACKPLANE_LATENCY.observe(max(latency, 0.0))
+
+
+def record_websocket_drop(reason: str) -> None:
+    """Record a WebSocket message that was dropped."""
+    WEBSOCKET_DROPPED.labels(reason=reason).inc()
+
+
+def record_websocket_eviction(reason: str) -> None:
+    """Record a slow WebSocket client being evicted."""
+    WEBSOCKET_EVICTIONS.labels(reason=reason).inc()
+
+
+def record_websocket_frame(codec: str, events: int, frame: Union[str, bytes]) -> None:
+    """Record one outbound frame; bytes / events gives bytes-per-event."""
+    size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+    WEBSOCKET_FRAMES_SENT.labels(codec=codec).inc()
+    WEBSOCKET_EVENTS_SENT.labels(codec=codec).inc(events)
+    WEBSOCKET_BYTES_SENT.labels(codec=codec).inc(size)
+
+
 class HealthChecker:
     """Health check utilities."""
 
@@ -5,6 +5,7 @@ from datetime import datetime
 
 from app.db_models import Task
 from app.schemas import TaskCreate, TaskUpdate
+from app.services.embedding_service import embedding_service
 
 
 def create_task(db: Session, task_data: TaskCreate, creator_id: int) -> Task:
@@ -13,6 +14,7 @@ def create_task(db: Session, task_data: TaskCreate, creator_id: int) -> Task:
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
+    embedding_service.upsert_task(db_task)
     return db_task
 
 
@@ -61,6 +63,7 @@ def update_task(db: Session, task_id: int, task_data: Dict[str, Any]) -> Optiona
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
+    embedding_service.upsert_task(db_task)
     return db_task
 
 
@@ -72,4 +75,5 @@ def delete_task(db: Session, task_id: int) -> bool:
 
     db.delete(db_task)
     db.commit()
+    embedding_service.remove_task(task_id)
     return True
\ No newline at end of file
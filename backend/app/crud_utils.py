@@ -11,7 +11,7 @@ from decimal import Decimal
 from app.db_models import (
     User, Task, Application, Review, Payment, Notification, Message, Chat,
     PortfolioItem, Achievement, Level, Certificate, Escrow, FinancialGoal,
-    Invoice, NotificationSetting, PaymentMethod, Transaction, Budget
+    Invoice, NotificationSetting, PaymentMethod, Transaction, Budget, ChatFile
 )
 from app.schemas import (
     UserCreate, UserUpdate, TaskCreate, TaskUpdate, ApplicationCreate,
@@ -25,6 +25,11 @@ from app.schemas import (
     PaymentMethodCreate, PaymentMethodUpdate, TransactionCreate, TransactionUpdate,
     BudgetCreate, BudgetUpdate
 )
+from app.services.chat_inbox import refresh_last_message, touch_chat
+from app.services.chat_membership import user_chat_ids
+from app.services.embedding_service import embedding_service
+from app.services.file_store import file_store
+from app.services.unread_counters import message_deltas, removed_message_deltas, unread_counters
 
 
 # User CRUD functions
@@ -49,6 +54,7 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         setattr(db_user, "updated_at", now)
     db.commit()
     db.refresh(db_user)
+    embedding_service.upsert_freelancer(db_user)
     return db_user
 
 
@@ -88,6 +94,7 @@ def update_user(db: Session, user_id: int, user_data: Dict[str, Any]) -> Optiona
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    embedding_service.upsert_freelancer(db_user)
     return db_user
 
 
@@ -99,6 +106,7 @@ def delete_user(db: Session, user_id: int) -> bool:
     
     db.delete(db_user)
     db.commit()
+    embedding_service.remove_freelancer(user_id)
     return True
 
 
@@ -299,8 +307,10 @@ def create_notification(db: Session, notification_data: NotificationCreate, user
     """Create a new notification."""
     db_notification = Notification(**notification_data.dict(), user_id=user_id)
     db.add(db_notification)
+    unread_counters.increment(db, "notifications", {user_id: 1})
     db.commit()
     db.refresh(db_notification)
+    unread_counters.publish(db, [user_id])
     return db_notification
 
 
@@ -349,8 +359,13 @@ def delete_notification(db: Session, notification_id: int) -> bool:
     if not db_notification:
         return False
     
+    was_unread = not db_notification.is_read
+    if was_unread:
+        unread_counters.increment(db, "notifications", {db_notification.user_id: -1})
     db.delete(db_notification)
     db.commit()
+    if was_unread:
+        unread_counters.publish(db, [db_notification.user_id])
     return True
 
 
@@ -360,10 +375,15 @@ def mark_notification_as_read(db: Session, notification_id: int) -> bool:
     if not db_notification:
         return False
     
+    was_unread = not db_notification.is_read
+    if was_unread:
+        unread_counters.increment(db, "notifications", {db_notification.user_id: -1})
     setattr(db_notification, "is_read", True)
     setattr(db_notification, "updated_at", datetime.utcnow())
     db.add(db_notification)
     db.commit()
+    if was_unread:
+        unread_counters.publish(db, [db_notification.user_id])
     return True
 
 
@@ -372,8 +392,13 @@ def create_message(db: Session, message_data: MessageCreate, sender_id: int) ->
     """Create a new message."""
     db_message = Message(**message_data.dict(), sender_id=sender_id)
     db.add(db_message)
+    db.flush()
+    touch_chat(db, db_message.chat_id, db_message.id, db_message.created_at)
+    deltas = message_deltas(db, [(db_message.chat_id, sender_id)])
+    unread_counters.increment(db, "messages", deltas)
     db.commit()
     db.refresh(db_message)
+    unread_counters.publish(db, deltas)
     return db_message
 
 
@@ -419,15 +444,27 @@ def delete_message(db: Session, message_id: int) -> bool:
     if not db_message:
         return False
     
+    chat_id = db_message.chat_id
+    # Recipients who had not read it yet lose it from their unread count
+    deltas = removed_message_deltas(db, chat_id, message_id)
+    unread_counters.increment(db, "messages", deltas)
+    files = db.query(ChatFile).filter(ChatFile.message_id == message_id)
+    file_store.release(db, [sha256 for sha256, in files.with_entities(ChatFile.sha256)])
+    files.delete(synchronize_session=False)
     db.delete(db_message)
+    db.flush()
+    refresh_last_message(db, chat_id)
     db.commit()
+    unread_counters.publish(db, deltas)
     return True
 
 
 # Chat CRUD functions
 def create_chat(db: Session, chat_data: ChatCreate, creator_id: int) -> Chat:
     """Create a new chat."""
-    db_chat = Chat(**chat_data.dict(), creator_id=creator_id)
+    data = chat_data.dict()
+    participant_ids = data.pop("participant_ids")
+    db_chat = Chat(**data, creator_id=creator_id, participant_ids=participant_ids)
     db.add(db_chat)
     db.commit()
     db.refresh(db_chat)
@@ -447,7 +484,7 @@ def get_chats(
     query = db.query(Chat)
     
     if participant_id:
-        query = query.filter(Chat.participant_ids.contains([participant_id]))
+        query = query.filter(Chat.id.in_(user_chat_ids(participant_id)))
     
     return query.order_by(desc(Chat.updated_at)).offset(skip).limit(limit).all()
 
@@ -30,6 +30,18 @@ def get_db():
         db.close()
 
 
+def upsert(db, model):
+    """INSERT for `model` with ON CONFLICT support on the session's dialect."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"INSERT ... ON CONFLICT is not available on {dialect}")
+    return insert(model)
+
+
 def create_tables():
     """Create all database tables."""
     Base.metadata.create_all(bind=engine)
@@ -4,7 +4,8 @@ SQLAlchemy database models.
 
 from sqlalchemy import (
     Column, Integer, String, Text, Boolean, DateTime, Float, 
-    ForeignKey, Table, MetaData, DECIMAL, JSON, Date, Enum as SQLEnum
+    ForeignKey, Table, MetaData, DECIMAL, JSON, Date, Enum as SQLEnum,
+    UniqueConstraint, Index
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, backref
@@ -260,6 +261,12 @@ class Payment(Base):
 # Notification model
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Digest runs scan one day of notifications
+        Index("ix_notifications_created_at_user_id", "created_at", "user_id"),
+        # A user's notification list, newest first
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -275,15 +282,72 @@ class Notification(Base):
     user = relationship("User", back_populates="notifications")
 
 
+# Notifications moved out of the live table by the retention job
+class NotificationArchive(Base):
+    __tablename__ = "notifications_archive"
+    __table_args__ = (
+        Index("ix_notifications_archive_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id the notification had
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String(50), nullable=False)  # NotificationType name
+    data = Column(JSON)
+    user_id = Column(Integer, nullable=False)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Unread counters, kept in step with notification and message writes
+class UnreadCounter(Base):
+    __tablename__ = "unread_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    notifications = Column(Integer, default=0, nullable=False)
+    messages = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# Notification outbox: deliveries written in the same transaction as the notification
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    channel = Column(String(20), nullable=False)  # websocket, email, push
+    dedup_key = Column(String(100), nullable=False, unique=True)
+    payload = Column(JSON)
+    status = Column(String(20), nullable=False, default="pending")  # pending, processing, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_at = Column(DateTime(timezone=True))
+    sent_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 # Message model
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Lets clients resend after a reconnect without creating duplicates
+        UniqueConstraint("sender_id", "client_msg_id", name="uq_messages_sender_client_msg"),
+        # Unread messages are the ids above a member's read watermark
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    is_read = Column(Boolean, default=False)
+    client_msg_id = Column(String(64))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -300,7 +364,7 @@ class Chat(Base):
     title = Column(String(200))
     is_group = Column(Boolean, default=False)
     creator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    participant_ids = Column(JSON, default=list)
+    last_message_id = Column(Integer)  # newest message, kept by the send paths for the inbox
     last_message_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -308,6 +372,47 @@ class Chat(Base):
     # Relationships
     creator = relationship("User", back_populates="chats_created", foreign_keys=[creator_id])
     messages = relationship("Message", back_populates="chat")
+    members = relationship("ChatMember", cascade="all, delete-orphan", order_by="ChatMember.user_id")
+
+    def __init__(self, participant_ids: Optional[List[int]] = None, **kwargs):
+        # Members are set after creator_id, whatever order the keywords came in
+        super().__init__(**kwargs)
+        if participant_ids is not None:
+            self.participant_ids = participant_ids
+
+    @property
+    def participant_ids(self) -> List[int]:
+        """Member ids, creator included."""
+        return [member.user_id for member in self.members]
+
+    @participant_ids.setter
+    def participant_ids(self, user_ids: List[int]) -> None:
+        current = {member.user_id: member for member in self.members}
+        wanted = [self.creator_id, *user_ids] if self.creator_id is not None else list(user_ids)
+        self.members = [current.get(user_id) or ChatMember(user_id=user_id) for user_id in dict.fromkeys(wanted)]
+
+
+# Chat membership, one row per member with the creator included
+class ChatMember(Base):
+    __tablename__ = "chat_members"
+    __table_args__ = (
+        # A user's chats; the primary key covers a chat's members
+        Index("ix_chat_members_user_id_chat_id", "user_id", "chat_id"),
+    )
+
+    chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    joined_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Read watermark: a member has read every message in the chat up to this id
+class ChatRead(Base):
+    __tablename__ = "chat_reads"
+
+    chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    read_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 # Portfolio Item model
@@ -557,6 +662,7 @@ class ChatFile(Base):
     file_url = Column(String(500), nullable=False)
     file_type = Column(String(50), nullable=False)
     file_size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), ForeignKey("file_blobs.sha256"), index=True)  # NULL for files stored before dedup
     is_safe = Column(Boolean, default=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -566,6 +672,17 @@ class ChatFile(Base):
     user = relationship("User")
 
 
+# Content-addressed file blob, shared by every row that points at its hash
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    released_at = Column(DateTime(timezone=True), index=True)  # when ref_count last dropped to zero
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 # KYC Request model
 class KYCRequest(Base):
     __tablename__ = "kyc_requests"
@@ -575,10 +692,12 @@ class KYCRequest(Base):
     status = Column(SQLEnum(KYCStatus), default=KYCStatus.PENDING)
     document_type = Column(String(100), nullable=False)  # passport, id_card, selfie, etc.
     document_url = Column(String(500), nullable=False)
+    document_sha256 = Column(String(64), ForeignKey("file_blobs.sha256"))
     comment = Column(String(500))
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
     reviewed_at = Column(DateTime(timezone=True))
     reviewed_by = Column(Integer, ForeignKey("users.id"))
+    review_claimed_at = Column(DateTime(timezone=True))  # when a worker process took it for AI review
 
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
@@ -598,3 +717,73 @@ class TwoFactorSecret(Base):
     confirmed_at = Column(DateTime(timezone=True))
 
     user = relationship("User")
+
+
+# Market rollup models
+class MarketRollup(Base):
+    __tablename__ = "market_rollups"
+    __table_args__ = (UniqueConstraint("dimension", "key", name="uq_market_rollups_dimension_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    dimension = Column(String(20), nullable=False)  # category, skill
+    key = Column(String(100), nullable=False)
+    tasks_posted = Column(Integer, default=0)
+    tasks_completed = Column(Integer, default=0)
+    bids_count = Column(Integer, default=0)
+    hires_count = Column(Integer, default=0)
+    payments_count = Column(Integer, default=0)
+    payments_total = Column(DECIMAL(14, 2), default=0)
+    price_sketch = Column(JSON)  # accepted bid amounts
+    hire_time_sketch = Column(JSON)  # hours from posting to accepted bid
+    price_p25 = Column(DECIMAL(10, 2))
+    price_p50 = Column(DECIMAL(10, 2))
+    price_p75 = Column(DECIMAL(10, 2))
+    price_p90 = Column(DECIMAL(10, 2))
+    hire_hours_p50 = Column(Float)
+    hire_hours_p90 = Column(Float)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class MarketRollupState(Base):
+    __tablename__ = "market_rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime(timezone=True))
+    rebuilt_at = Column(DateTime(timezone=True))
+
+
+# Status changes already folded into the rollups; a later edit of the row is not counted again
+class MarketRollupEvent(Base):
+    __tablename__ = "market_rollup_events"
+
+    kind = Column(String(20), primary_key=True)  # completed, hire, payment
+    entity_id = Column(Integer, primary_key=True)
+
+
+# Digest run checkpoint: a run resumes after the last user it finished
+class DigestState(Base):
+    __tablename__ = "digest_state"
+
+    name = Column(String(50), primary_key=True)  # daily, weekly
+    window_start = Column(DateTime(timezone=True))
+    window_end = Column(DateTime(timezone=True))
+    last_user_id = Column(Integer, default=0, nullable=False)
+    users_sent = Column(Integer, default=0, nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+
+# Resumable upload: the partial file lives in UPLOAD_SESSION_DIR under the session id
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    purpose = Column(String(20), nullable=False)  # chat_file, kyc_document
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100))
+    size = Column(Integer, nullable=False)  # declared by the client
+    received = Column(Integer, default=0, nullable=False)
+    params = Column(JSON, default=dict)  # chat_id, document_type, comment
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
@@ -6,13 +6,21 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
-from fastapi import WebSocket, WebSocketDisconnect
+from fastapi import WebSocket
 import time
+from typing import Optional
 
 from app.core.config import settings
 from app.database import create_tables
 from app.api.api import api_router
-from app.websockets.notification_manager import NotificationConnectionManager
+from app.websockets.notification_manager import notification_manager
+from app.websockets.gateway import websocket_endpoint as websocket_gateway
+from app.websockets import chat as websocket_chat  # noqa: F401 - registers the chat frame handler
+from app.services.chat_message_writer import chat_message_writer
+from app.services.notification_service import notification_outbox
+from app.services.kyc_review_service import kyc_review_queue
+from app.services.email_templates import email_templates
+from app.services.unread_counters import unread_counters
 
 # Create FastAPI app
 app = FastAPI(
@@ -24,8 +32,8 @@ app = FastAPI(
     redoc_url="/redoc" if settings.DEBUG else None
 )
 
-# WebSocket manager
-websocket_manager = NotificationConnectionManager()
+# WebSocket manager (shared with the services that push notifications)
+websocket_manager = notification_manager
 
 # CORS middleware
 app.add_middleware(
@@ -64,17 +72,8 @@ app.include_router(api_router, prefix="/api/v1")
 
 # WebSocket endpoint
 @app.websocket("/ws/{token}")
-async def websocket_endpoint(websocket: WebSocket, token: str):
-    # Extract user_id from token (simplified - in real app you'd decode JWT)
-    user_id = 1  # Default user ID, in real app decode from JWT
-    await websocket_manager.connect(user_id, websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            # Handle incoming messages if needed
-            await websocket.send_text(f"Message received: {data}")
-    except WebSocketDisconnect:
-        websocket_manager.disconnect(user_id, websocket)
+async def websocket_endpoint(websocket: WebSocket, token: str, last_event_id: Optional[int] = None):
+    await websocket_gateway(websocket, token, last_event_id)
 
 
 @app.get("/")
@@ -103,9 +102,20 @@ async def startup_event():
     # Create database tables
     create_tables()
     print("Database tables created successfully")
+    email_templates.preload()
+    await kyc_review_queue.start()
+    await notification_manager.start()
+    await chat_message_writer.start()
+    await notification_outbox.start()
+    await unread_counters.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler."""
+    await kyc_review_queue.stop()
+    await chat_message_writer.stop()
+    await notification_outbox.stop()
+    await unread_counters.stop()
+    await notification_manager.stop()
     print("Application shutting down")
@@ -353,7 +353,8 @@ class Message(MessageBase):
     content: str
     chat_id: int
     sender_id: int
-    is_read: bool = False
+    client_msg_id: Optional[str] = None
+    is_read: bool = False  # as the requesting user sees it, from the chat's read watermarks
     created_at: datetime
     updated_at: datetime
     files: List[ChatFile] = Field(default_factory=list)
@@ -388,6 +389,23 @@ class ChatDetail(Chat):
     messages: List['Message'] = Field(default_factory=list)
 
 
+class InboxMessage(BaseSchema):
+    id: int
+    snippet: str
+    sender_id: int
+    sender_name: Optional[str] = None
+    is_own: bool = False
+
+
+class ChatInboxItem(BaseSchema):
+    chat_id: int
+    title: Optional[str] = None
+    is_group: bool = False
+    last_message_at: Optional[datetime] = None
+    last_message: Optional[InboxMessage] = None
+    unread_count: int = 0
+
+
 class PortfolioItemBase(BaseSchema):
     title: str = Field(..., max_length=200)
     description: str = Field(..., min_length=10, max_length=2000)
@@ -864,6 +882,25 @@ class MessageResponse(BaseModel):
     message: str
 
 
+class UploadSessionCreate(BaseSchema):
+    filename: str = Field(..., max_length=255)
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = Field(None, max_length=100)
+
+
+class KYCUploadSessionCreate(UploadSessionCreate):
+    document_type: str = Field(..., max_length=100)
+    comment: str = Field("", max_length=500)
+
+
+class UploadSessionStatus(BaseSchema):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int
+    chunk_size: int
+
+
 class KYCStatus(str, Enum):
     PENDING = "pending"
     APPROVED = "approved"
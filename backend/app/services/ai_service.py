@@ -3,8 +3,11 @@ AI Service for the freelance platform.
 """
 
 import asyncio
+import hashlib
 import json
 import os
+import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Tuple, Optional
 from decimal import Decimal
 from datetime import datetime, timedelta
@@ -17,6 +20,10 @@ from pydantic import BaseModel
 
 from app.db_models import User, Task, Application
 from app.schemas import SmartMatch, PricingRecommendation, SkillAnalysis, AIResponse
+from app.services.embedding_service import embedding_service
+from app.services.market_rollup_service import market_rollup_service
+from app.core.config import settings
+from app.core.monitoring import record_ai_call
 
 # Configuration
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
@@ -72,13 +79,38 @@ class AIService:
         self.api_url = MISTRAL_API_URL
         self.model = MISTRAL_MODEL
         self.model_name = "mistral-large-latest"  # Using user's preferred model
-        self.cache = {}
+        self.cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
         self.cache_duration = timedelta(hours=1)
+        self.cache_size = settings.AI_RESPONSE_CACHE_SIZE
+        # Answers are only reused for features that opt in; the rest always ask the model
+        self.cacheable_features = set(settings.AI_RESPONSE_CACHE_FEATURES)
         
-    async def _call_mistral_api(self, messages: List[MistralMessage]) -> Optional[str]:
+    def _cache_get(self, key: str) -> Optional[str]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires_at, content = entry
+        if expires_at < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return content
+
+    def _cache_put(self, key: str, content: str) -> None:
+        self.cache[key] = (time.monotonic() + self.cache_duration.total_seconds(), content)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _call_mistral_api(self, messages: List[MistralMessage], feature: str = "other") -> Optional[str]:
         """Вызывает Mistral AI API"""
+        prompt_chars = sum(len(msg.content) for msg in messages)
+        cacheable = feature in self.cacheable_features
         if not self.api_key:
             print("Warning: MISTRAL_API_KEY not set")
+            record_ai_call(
+                feature, "fallback", prompt_chars=prompt_chars, fallback_reason="not_configured", cacheable=cacheable
+            )
             return None
             
         headers = {
@@ -93,6 +125,16 @@ class AIService:
             "max_tokens": 2000
         }
         
+        cache_key = None
+        if cacheable:
+            cache_key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                record_ai_call(feature, "cache_hit", prompt_chars=prompt_chars)
+                return cached
+
+        started = time.perf_counter()
+        network = 0.0
         try:
             async with httpx.AsyncClient() as client:
                 response = await client.post(
@@ -102,12 +144,42 @@ class AIService:
                     timeout=30.0
                 )
                 response.raise_for_status()
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+            network = time.perf_counter() - started
+            parse_started = time.perf_counter()
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            usage = result.get("usage") or {}
+            parse = time.perf_counter() - parse_started
         except Exception as e:
             print(f"Error calling Mistral API: {e}")
+            if isinstance(e, httpx.TimeoutException):
+                reason = "timeout"
+            elif isinstance(e, httpx.HTTPError):
+                reason = "http_error"
+            else:
+                reason = "bad_response"
+            record_ai_call(
+                feature, "fallback",
+                network=network or time.perf_counter() - started,
+                prompt_chars=prompt_chars,
+                fallback_reason=reason,
+                cacheable=cacheable,
+            )
             return None
 
+        record_ai_call(
+            feature, "success",
+            network=network,
+            parse=parse,
+            prompt_chars=prompt_chars,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cacheable=cacheable,
+        )
+        if cacheable:
+            self._cache_put(cache_key, content)
+        return content
+
     async def analyze_task_complexity_and_pricing(
         self,
         task_title: str,
@@ -154,7 +226,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="task_analysis")
         
         if not response:
             # Fallback values
@@ -229,7 +301,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="interview_questions")
         
         if not response:
             return []
@@ -282,7 +354,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="application_analysis")
         
         if not response:
             return {"error": "Не удалось проанализировать заявку"}
@@ -330,7 +402,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="task_recommendations")
         
         if not response:
             return []
@@ -360,7 +432,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="assistant")
         
         if not response:
             return "Извините, произошла ошибка. Попробуйте позже."
@@ -393,7 +465,7 @@ class AIService:
         """
         
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="level_upgrade")
         
         if not response:
             return {"error": "Не удалось проанализировать"}
@@ -462,12 +534,13 @@ class AIService:
         """Get smart matches for a task."""
         matches = []
         
-        for freelancer in freelancers[:limit]:
-            # Calculate match score based on skills overlap
+        for freelancer in freelancers:
+            # Semantic similarity of the task and profile embeddings, so that
+            # "React" matches "ReactJS" and descriptions/bios are taken into account
             task_skills = task.skills_required or []
             freelancer_skills = freelancer.skills or []
-            skill_overlap = set(task_skills) & set(freelancer_skills)
-            match_score = len(skill_overlap) / max(len(task_skills), 1)
+            skill_overlap = embedding_service.matching_skills(task_skills, freelancer_skills)
+            match_score = max(0.0, embedding_service.similarity(task, freelancer))
             
             # Adjust score based on experience level
             if freelancer.level >= task.complexity_level:
@@ -483,7 +556,7 @@ class AIService:
                 matches.append(SmartMatch(
                     freelancer_id=freelancer.id,
                     match_score=match_score,
-                    skills_match=list(skill_overlap),
+                    skills_match=skill_overlap,
                     experience_level=f"Level {freelancer.level}",
                     hourly_rate=freelancer.hourly_rate,
                     availability="Available" if freelancer.is_active else "Busy",
@@ -497,13 +570,20 @@ class AIService:
         matches.sort(key=lambda x: x.match_score, reverse=True)
         return matches[:limit]
     
-    async def get_pricing_recommendation(self, task: Task, freelancer: Optional[User] = None) -> PricingRecommendation:
+    async def get_pricing_recommendation(self, task: Task, freelancer: Optional[User] = None, db=None) -> PricingRecommendation:
         """Get pricing recommendations for a task."""
+        if db is not None:
+            recommendation = self._pricing_from_rollups(db, task)
+            if recommendation is not None:
+                return recommendation
+
         # Base pricing logic
+        complexity_level = task.complexity_level or 1
+        skills_required = task.skills_required or []
         base_price = 100
-        complexity_factor = task.complexity_level * 0.3
-        demand_factor = 1.2 if task.complexity_level <= 2 else 0.8
-        skill_rarity_factor = 1.1 if len(task.skills_required) > 3 else 0.9
+        complexity_factor = complexity_level * 0.3
+        demand_factor = 1.2 if complexity_level <= 2 else 0.8
+        skill_rarity_factor = 1.1 if len(skills_required) > 3 else 0.9
         
         if freelancer:
             # Adjust based on freelancer's hourly rate
@@ -522,9 +602,55 @@ class AIService:
             complexity_factor=complexity_factor,
             demand_factor=demand_factor,
             skill_rarity_factor=skill_rarity_factor,
-            justification=f"Based on {task.complexity_level} complexity level and {len(task.skills_required)} required skills",
+            justification=f"Based on {complexity_level} complexity level and {len(skills_required)} required skills",
             confidence_score=0.85
         )
+
+    def _pricing_from_rollups(self, db, task: Task) -> Optional[PricingRecommendation]:
+        """Price a task from the category/skill rollups, or None when there is too little history."""
+        rollups = market_rollup_service.lookup(db, task.category, task.skills_required)
+        category = next((row for (dimension, _), row in rollups.items() if dimension == "category"), None)
+        if category is None or (category.hires_count or 0) < settings.MARKET_ROLLUP_MIN_SAMPLES or not category.price_p50:
+            return None
+
+        category_median = float(category.price_p50)
+        skill_rows = [
+            row for (dimension, _), row in rollups.items()
+            if dimension == "skill" and row.price_p50 and (row.hires_count or 0) >= settings.MARKET_ROLLUP_MIN_SAMPLES
+        ]
+        if skill_rows:
+            # Hire-weighted skill median relative to the category median
+            weight = sum(row.hires_count for row in skill_rows)
+            skill_median = sum(float(row.price_p50) * row.hires_count for row in skill_rows) / weight
+            skill_rarity_factor = min(max(skill_median / category_median, 0.5), 2.0)
+        else:
+            skill_rarity_factor = 1.0
+
+        bids_per_task = (category.bids_count or 0) / max(category.tasks_posted or 0, 1)
+        demand_factor = min(max(1 + (5 - bids_per_task) * 0.05, 0.8), 1.25)
+        complexity_factor = 1 + ((task.complexity_level or 3) - 3) * 0.1
+        adjustment = skill_rarity_factor * demand_factor * complexity_factor
+
+        recommended_min = float(category.price_p25 or category.price_p50) * adjustment
+        recommended_max = float(category.price_p75 or category.price_p50) * adjustment
+        market_average = category_median * adjustment
+        samples = category.hires_count
+
+        return PricingRecommendation(
+            task_id=task.id,
+            recommended_min=Decimal(str(round(recommended_min, 2))),
+            recommended_max=Decimal(str(round(recommended_max, 2))),
+            market_average=Decimal(str(round(market_average, 2))),
+            complexity_factor=round(complexity_factor, 3),
+            demand_factor=round(demand_factor, 3),
+            skill_rarity_factor=round(skill_rarity_factor, 3),
+            justification=(
+                f"Based on {samples} accepted bids in {task.category} "
+                f"(25th-75th percentile {category.price_p25}-{category.price_p75}), "
+                f"{bids_per_task:.1f} bids per task and {len(skill_rows)} skills with price history"
+            ),
+            confidence_score=round(min(0.95, 0.5 + samples / 200), 2)
+        )
     
     async def analyze_user_profile(self, user: User) -> SkillAnalysis:
         """Analyze user profile and provide skill insights."""
@@ -666,8 +792,13 @@ class AIService:
             "estimated_impact": "High impact on profile visibility and client attraction"
         }
     
-    async def get_market_analysis(self, category: str, skills: List[str]) -> Dict[str, Any]:
+    async def get_market_analysis(self, category: str, skills: List[str], db=None) -> Dict[str, Any]:
         """Get AI-powered market analysis for a category or skills."""
+        if db is not None:
+            analysis = self._market_analysis_from_rollups(db, category, skills)
+            if analysis is not None:
+                return analysis
+
         # Mock market analysis
         demand_levels = ["low", "medium", "high"]
         demand = random.choice(demand_levels)
@@ -706,6 +837,72 @@ class AIService:
             ]
         }
     
+    @staticmethod
+    def _demand_level(row) -> str:
+        bids_per_task = (row.bids_count or 0) / max(row.tasks_posted or 0, 1)
+        if bids_per_task < 3:
+            return "high"
+        if bids_per_task < 8:
+            return "medium"
+        return "low"
+
+    def _market_analysis_from_rollups(self, db, category: str, skills: List[str]) -> Optional[Dict[str, Any]]:
+        """Market analysis read from the rollup tables, or None when the category has no history."""
+        rollups = market_rollup_service.lookup(db, category, skills)
+        row = next((row for (dimension, _), row in rollups.items() if dimension == "category"), None)
+        if row is None or not row.tasks_posted:
+            return None
+
+        def percentiles(item) -> Dict[str, Optional[float]]:
+            return {
+                name: float(value) if value is not None else None
+                for name, value in (("p25", item.price_p25), ("p50", item.price_p50),
+                                    ("p75", item.price_p75), ("p90", item.price_p90))
+            }
+
+        demand = self._demand_level(row)
+        skill_breakdown = {
+            key: {
+                "demand_level": self._demand_level(item),
+                "tasks_posted": item.tasks_posted or 0,
+                "hires": item.hires_count or 0,
+                "price_percentiles": percentiles(item),
+            }
+            for (dimension, key), item in rollups.items() if dimension == "skill"
+        }
+        in_demand = sorted(
+            (key for key, item in skill_breakdown.items() if item["demand_level"] == "high"),
+            key=lambda key: -skill_breakdown[key]["tasks_posted"]
+        )
+
+        trends = [f"{row.tasks_posted} tasks posted, {row.tasks_completed or 0} completed"]
+        if row.hire_hours_p50 is not None:
+            trends.append(f"Median time to hire is {row.hire_hours_p50:.0f} hours")
+        if in_demand:
+            trends.append(f"Few bids per task for: {', '.join(in_demand[:3])}")
+
+        return {
+            "category": category,
+            "skills": skills,
+            "demand_level": demand,
+            "price_percentiles": percentiles(row),
+            "time_to_hire_hours": {"p50": row.hire_hours_p50, "p90": row.hire_hours_p90},
+            "demand": {
+                "tasks_posted": row.tasks_posted or 0,
+                "tasks_completed": row.tasks_completed or 0,
+                "bids": row.bids_count or 0,
+                "hires": row.hires_count or 0,
+                "bids_per_task": round((row.bids_count or 0) / max(row.tasks_posted, 1), 2),
+                "payments": row.payments_count or 0,
+                "paid_volume": float(row.payments_total or 0),
+            },
+            "skills_breakdown": skill_breakdown,
+            "market_trends": trends,
+            "sample_size": row.hires_count or 0,
+            "data_source": "rollup",
+            "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        }
+
     async def screen_applications_async(self, task: Task, applications: List[Application]):
         """Asynchronously screen applications."""
         # This would run in the background
@@ -907,7 +1104,7 @@ class AIService:
         Если есть подозрение на подделку, плохое качество или несоответствие — отклоняй.
         """
         messages = [MistralMessage(role="user", content=prompt)]
-        response = await self._call_mistral_api(messages)
+        response = await self._call_mistral_api(messages, feature="kyc_review")
         if not response:
             return {"status": "REJECTED", "reason": "AI недоступен"}
         try:
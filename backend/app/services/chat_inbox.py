@@ -0,0 +1,97 @@
+"""
+The chat list ("inbox") in one query.
+
+Each chat keeps its newest message in chats.last_message_id and
+last_message_at, advanced by every send path. The inbox reads a user's
+chats through chat_members, joins that message and its sender, and counts
+unread messages per chat above the user's read watermark. The count is a
+range scan on messages (chat_id, id), so one round trip serves the whole
+chat list screen.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.db_models import Chat, ChatMember, ChatRead, Message, User
+
+SNIPPET_LENGTH = 120
+
+
+def touch_chat(db: Session, chat_id: int, message_id: int, created_at: datetime) -> None:
+    """Record a new message as the chat's latest, unless a newer one got there first."""
+    db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id, or_(Chat.last_message_id.is_(None), Chat.last_message_id < message_id))
+        .values(last_message_id=message_id, last_message_at=created_at)
+    )
+
+
+def refresh_last_message(db: Session, chat_id: int) -> None:
+    """Point the chat at its newest remaining message, e.g. after a delete."""
+    latest = db.query(Message.id, Message.created_at).filter(Message.chat_id == chat_id).order_by(
+        Message.id.desc()
+    ).first()
+    db.execute(
+        update(Chat).where(Chat.id == chat_id).values(
+            last_message_id=latest.id if latest else None,
+            last_message_at=latest.created_at if latest else None,
+        )
+    )
+
+
+def _snippet(content: str) -> str:
+    if len(content) <= SNIPPET_LENGTH:
+        return content
+    return content[:SNIPPET_LENGTH - 1].rstrip() + "…"
+
+
+def inbox(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    """The user's chats, most recently active first, with last message and unread count."""
+    unread = aliased(Message)
+    unread_count = (
+        select(func.count(unread.id))
+        .where(
+            unread.chat_id == Chat.id,
+            unread.id > func.coalesce(ChatRead.last_read_message_id, 0),
+            unread.sender_id != user_id,
+        )
+        .correlate(Chat, ChatRead)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(
+            Chat.id, Chat.title, Chat.is_group, Chat.last_message_at,
+            Message.id.label("message_id"), Message.content, Message.sender_id,
+            User.full_name, User.username,
+            unread_count.label("unread_count"),
+        )
+        .select_from(ChatMember)
+        .join(Chat, Chat.id == ChatMember.chat_id)
+        .outerjoin(ChatRead, and_(ChatRead.chat_id == ChatMember.chat_id, ChatRead.user_id == ChatMember.user_id))
+        .outerjoin(Message, Message.id == Chat.last_message_id)
+        .outerjoin(User, User.id == Message.sender_id)
+        .filter(ChatMember.user_id == user_id)
+        .order_by(Chat.last_message_at.is_(None), Chat.last_message_at.desc(), Chat.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return [
+        {
+            "chat_id": row.id,
+            "title": row.title,
+            "is_group": bool(row.is_group),
+            "last_message_at": row.last_message_at,
+            "last_message": {
+                "id": row.message_id,
+                "snippet": _snippet(row.content),
+                "sender_id": row.sender_id,
+                "sender_name": row.full_name or row.username,
+                "is_own": row.sender_id == user_id,
+            } if row.message_id is not None else None,
+            "unread_count": row.unread_count,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,50 @@
+"""
+Chat membership lookups over chat_members.
+
+Every member of a chat, creator included, has a chat_members row. Checking
+whether a user is in a chat is a primary key lookup, and a user's chats come
+from the (user_id, chat_id) index, where the old participant_ids JSON lists
+had to be scanned on every chat.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from app.db_models import Chat, ChatMember
+
+
+def chat_recipients(db: Session, chat_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """Members of each chat; chats without members are left out."""
+    members: Dict[int, Set[int]] = defaultdict(set)
+    for chat_id, user_id in db.query(ChatMember.chat_id, ChatMember.user_id).filter(
+        ChatMember.chat_id.in_(set(chat_ids))
+    ):
+        members[chat_id].add(user_id)
+    return dict(members)
+
+
+def is_member(db: Session, chat_id: int, user_id: int) -> bool:
+    return db.query(ChatMember.chat_id).filter(
+        ChatMember.chat_id == chat_id, ChatMember.user_id == user_id
+    ).first() is not None
+
+
+def user_chat_ids(user_id: int):
+    """Subquery of the user's chat ids, for `column.in_(...)` filters."""
+    return select(ChatMember.chat_id).where(ChatMember.user_id == user_id).scalar_subquery()
+
+
+def find_direct_chat(db: Session, user_id: int, other_id: int) -> Optional[Chat]:
+    """The one-to-one chat between two users, if there is one."""
+    mine, theirs = aliased(ChatMember), aliased(ChatMember)
+    return (
+        db.query(Chat)
+        .join(mine, mine.chat_id == Chat.id)
+        .join(theirs, theirs.chat_id == Chat.id)
+        .filter(mine.user_id == user_id, theirs.user_id == other_id, Chat.is_group.isnot(True))
+        .order_by(Chat.id)
+        .first()
+    )
@@ -0,0 +1,310 @@
+"""
+Write-behind persistence for chat messages sent over the WebSocket gateway.
+
+Messages are acknowledged as soon as they are accepted and written in
+micro-batches with one bulk INSERT. Each batch is delivered to the chat
+participants only after it is stored, so every client sees the same order as
+the database (message id). `(sender_id, client_msg_id)` is unique, which makes
+resending after a reconnect safe.
+
+A batch that fails is written again one message at a time, so a single bad
+message (one for a chat deleted in the meantime, say) cannot hold up the
+rest. A chat with a failed message is held back with exponential backoff,
+which keeps its order, while other chats go on flushing; after
+CHAT_FLUSH_MAX_ATTEMPTS the message is dropped and the sender gets a
+`chat_error` for it.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, tuple_
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import CHAT_WRITE_BEHIND_DEPTH, record_chat_flush, record_chat_message
+from app.database import SessionLocal
+from app.db_models import Message
+from app.services.chat_inbox import touch_chat
+from app.services.chat_membership import chat_recipients
+from app.services.unread_counters import message_deltas, unread_counters
+from app.websockets.notification_manager import notification_manager
+
+logger = get_logger(__name__)
+
+DeliverHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+RejectHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+MAX_RETRY_DELAY = 30.0
+
+# chat_id -> (expires_at, participant ids)
+_participants: Dict[int, Tuple[float, Set[int]]] = {}
+
+
+def _load_participants(chat_id: int) -> Optional[Set[int]]:
+    db = SessionLocal()
+    try:
+        return chat_recipients(db, [chat_id]).get(chat_id)
+    finally:
+        db.close()
+
+
+async def chat_participants(chat_id: int) -> Optional[Set[int]]:
+    """Participant ids of a chat, cached for CHAT_PARTICIPANTS_TTL seconds."""
+    cached = _participants.get(chat_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    participants = await run_in_threadpool(_load_participants, chat_id)
+    if participants is not None:
+        _participants[chat_id] = (time.monotonic() + settings.CHAT_PARTICIPANTS_TTL, participants)
+    return participants
+
+
+def message_event(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "chat_message",
+        "id": message["id"],
+        "chat_id": message["chat_id"],
+        "sender_id": message["sender_id"],
+        "client_msg_id": message["client_msg_id"],
+        "content": message["content"],
+        "created_at": message["created_at"].isoformat(),
+    }
+
+
+async def deliver_chat_messages(messages: List[Dict[str, Any]]) -> None:
+    """Push stored messages to every participant, the sender's other sockets included."""
+    for message in messages:
+        participants = await chat_participants(message["chat_id"]) or {message["sender_id"]}
+        event = message_event(message)
+        for user_id in participants:
+            await notification_manager.send_personal_notification(user_id, event)
+
+
+async def reject_chat_messages(messages: List[Dict[str, Any]]) -> None:
+    """Tell each sender a message was dropped, so the client stops resending it."""
+    for message in messages:
+        await notification_manager.send_personal_notification(message["sender_id"], {
+            "type": "chat_error",
+            "chat_id": message["chat_id"],
+            "client_msg_id": message["client_msg_id"],
+            "detail": "Message could not be stored",
+        })
+
+
+class ChatMessageWriter:
+    """Buffers accepted chat messages and flushes them with bulk INSERTs."""
+
+    def __init__(
+        self,
+        deliver: Optional[DeliverHandler] = None,
+        session_factory: Callable = SessionLocal,
+        flush_interval: float = 0.02,
+        max_batch: int = 500,
+        reject: Optional[RejectHandler] = None,
+        max_attempts: int = 5,
+        retry_backoff: float = 0.5,
+    ):
+        self.deliver = deliver
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.reject = reject
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        # chat_id -> monotonic time before which the chat's failed messages are not retried
+        self._retry_at: Dict[int, float] = {}
+        self.pending: List[Dict[str, Any]] = []
+        # (sender_id, client_msg_id) -> message not yet stored
+        self.inflight: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Chat message writer started, flushing every {self.flush_interval * 1000:.0f} ms")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(force=True)
+
+    def submit(self, chat_id: int, sender_id: int, client_msg_id: str, content: str) -> Tuple[Dict[str, Any], bool]:
+        """Buffer a message; returns it and whether it was already buffered."""
+        key = (sender_id, client_msg_id)
+        if key in self.inflight:
+            record_chat_message("duplicate")
+            return self.inflight[key], True
+        message = {
+            "chat_id": chat_id,
+            "sender_id": sender_id,
+            "client_msg_id": client_msg_id,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        }
+        self.inflight[key] = message
+        self.pending.append(message)
+        CHAT_WRITE_BEHIND_DEPTH.set(len(self.pending))
+        record_chat_message("accepted")
+        if len(self.pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+        return message, False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self, force: bool = False) -> None:
+        """Persist and deliver everything buffered so far, oldest first.
+
+        Chats backing off after a failure are skipped, and so is a chat that
+        failed earlier in this call, unless `force` is set (on shutdown).
+        """
+        failed_chats: Set[int] = set()
+        # One flush at a time keeps ids in acceptance order
+        async with self._lock:
+            while self.pending:
+                now = time.monotonic()
+                batch, waiting = [], []
+                for message in self.pending:
+                    chat_id = message["chat_id"]
+                    ready = force or (chat_id not in failed_chats and self._retry_at.get(chat_id, 0.0) <= now)
+                    (batch if ready and len(batch) < self.max_batch else waiting).append(message)
+                if not batch:
+                    return
+                self.pending[:] = waiting
+                started = time.monotonic()
+                try:
+                    stored, failed = await run_in_threadpool(self._persist, batch), []
+                except Exception as e:
+                    record_chat_message("flush_failed", len(batch))
+                    logger.error(f"Chat message flush of {len(batch)} messages failed, writing them one by one: {e}")
+                    stored, failed = await run_in_threadpool(self._persist_each, batch)
+
+                retry, dropped = [], []
+                for message in failed:
+                    message["attempts"] = message.get("attempts", 0) + 1
+                    (dropped if message["attempts"] >= self.max_attempts else retry).append(message)
+                # Back in front so order holds; their chat waits out the backoff
+                self.pending[:0] = retry
+                attempts: Dict[int, int] = {}
+                for message in retry:
+                    attempts[message["chat_id"]] = max(attempts.get(message["chat_id"], 0), message["attempts"])
+                for chat_id in {message["chat_id"] for message in batch}:
+                    if chat_id in attempts:
+                        delay = min(self.retry_backoff * 2 ** (attempts[chat_id] - 1), MAX_RETRY_DELAY)
+                        self._retry_at[chat_id] = time.monotonic() + delay
+                        failed_chats.add(chat_id)
+                    else:
+                        self._retry_at.pop(chat_id, None)
+                retrying = {id(message) for message in retry}
+                for message in batch:
+                    if id(message) not in retrying:
+                        self.inflight.pop((message["sender_id"], message["client_msg_id"]), None)
+                CHAT_WRITE_BEHIND_DEPTH.set(len(self.pending))
+                record_chat_flush(len(stored), time.monotonic() - started)
+                duplicates = len(batch) - len(stored) - len(failed)
+                if duplicates:
+                    record_chat_message("duplicate", duplicates)
+                if stored and self.deliver is not None:
+                    try:
+                        await self.deliver(stored)
+                    except Exception as e:
+                        logger.error(f"Chat message delivery failed: {e}")
+                if dropped:
+                    record_chat_message("dropped", len(dropped))
+                    logger.error(f"Dropped {len(dropped)} chat messages after {self.max_attempts} failed attempts")
+                    if self.reject is not None:
+                        try:
+                            await self.reject(dropped)
+                        except Exception as e:
+                            logger.error(f"Chat message rejection failed: {e}")
+
+    def _persist_each(self, batch: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Insert the messages one transaction each; returns the stored ones and the ones that failed."""
+        stored: List[Dict[str, Any]] = []
+        failed: List[Dict[str, Any]] = []
+        for message in batch:
+            try:
+                stored.extend(self._persist([message]))
+            except Exception as e:
+                logger.error(
+                    f"Chat message {message['client_msg_id']} from user {message['sender_id']} "
+                    f"could not be stored: {e}"
+                )
+                failed.append(message)
+        return stored, failed
+
+    def _persist(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert the batch, skipping messages stored by an earlier connection; returns the new ones."""
+        db = self.session_factory()
+        try:
+            # Row-value IN matches the (sender_id, client_msg_id) unique index
+            existing = {
+                (row.sender_id, row.client_msg_id)
+                for row in db.query(Message.sender_id, Message.client_msg_id).filter(
+                    tuple_(Message.sender_id, Message.client_msg_id).in_(
+                        {(message["sender_id"], message["client_msg_id"]) for message in batch}
+                    )
+                )
+            }
+            fresh = [message for message in batch if (message["sender_id"], message["client_msg_id"]) not in existing]
+            if not fresh:
+                return []
+            ids = db.scalars(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "chat_id": message["chat_id"],
+                        "sender_id": message["sender_id"],
+                        "client_msg_id": message["client_msg_id"],
+                        "content": message["content"],
+                        "created_at": message["created_at"],
+                    }
+                    for message in fresh
+                ],
+            ).all()
+            latest: Dict[int, Tuple[int, datetime]] = {}
+            for message, message_id in zip(fresh, ids):
+                latest[message["chat_id"]] = (message_id, message["created_at"])
+            for chat_id, (message_id, created_at) in latest.items():
+                touch_chat(db, chat_id, message_id, created_at)
+            deltas = message_deltas(db, ((message["chat_id"], message["sender_id"]) for message in fresh))
+            unread_counters.increment(db, "messages", deltas)
+            db.commit()
+            unread_counters.publish(db, deltas)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return [{**message, "id": message_id} for message, message_id in zip(fresh, ids)]
+
+
+chat_message_writer = ChatMessageWriter(
+    deliver_chat_messages,
+    flush_interval=settings.CHAT_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.CHAT_FLUSH_MAX_BATCH,
+    reject=reject_chat_messages,
+    max_attempts=settings.CHAT_FLUSH_MAX_ATTEMPTS,
+    retry_backoff=settings.CHAT_FLUSH_RETRY_BACKOFF,
+)
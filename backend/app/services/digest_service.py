@@ -0,0 +1,176 @@
+"""
+Daily digest emails, built from one streamed query.
+
+Unread notifications in the digest window are read in a single query ordered by
+user, through a server-side cursor, and grouped as they arrive. Digests for a
+batch of users are sent in parallel. After each batch the last finished user id
+is checkpointed, so a crashed run resumes with the next user and only the
+in-flight batch can be sent twice. Memory is bounded by the batch size and the
+per-digest item cap, whatever the number of users.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import chain, groupby
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import record_digest
+from app.database import SessionLocal
+from app.db_models import DigestState, Notification, User
+
+logger = get_logger(__name__)
+
+DigestJob = Tuple[int, str, str, List[Dict[str, Any]], int]
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class DigestBuilder:
+    """Streams unread notifications per user and sends one digest email each."""
+
+    def __init__(
+        self,
+        email_service,
+        session_factory: Callable[[], Session] = SessionLocal,
+        digest_type: str = "daily",
+        window: timedelta = timedelta(days=1),
+        batch_size: int = 100,
+        concurrency: int = 8,
+        max_items: int = 20,
+        yield_per: int = 1000,
+    ):
+        self.email_service = email_service
+        self.session_factory = session_factory
+        self.digest_type = digest_type
+        self.window = window
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_items = max_items
+        self.yield_per = yield_per
+
+    def _start(self) -> DigestState:
+        """Resume an unfinished run, or open a new window ending now."""
+        db = self.session_factory()
+        try:
+            state = db.get(DigestState, self.digest_type)
+            if state is None:
+                state = DigestState(name=self.digest_type)
+                db.add(state)
+            if state.window_end is None or state.completed_at is not None:
+                now = datetime.now(timezone.utc)
+                state.window_start = now - self.window
+                state.window_end = now
+                state.last_user_id = 0
+                state.users_sent = 0
+                state.started_at = now
+                state.completed_at = None
+            else:
+                logger.info(f"Resuming {self.digest_type} digest after user {state.last_user_id}")
+            db.commit()
+            db.refresh(state)
+            db.expunge(state)
+            return state
+        finally:
+            db.close()
+
+    def _checkpoint(self, last_user_id: Optional[int], sent: int, completed: bool = False) -> None:
+        db = self.session_factory()
+        try:
+            state = db.get(DigestState, self.digest_type)
+            if last_user_id is not None:
+                state.last_user_id = last_user_id
+            state.users_sent = (state.users_sent or 0) + sent
+            if completed:
+                state.completed_at = datetime.now(timezone.utc)
+            db.commit()
+        finally:
+            db.close()
+
+    def _jobs(self, db: Session, state: DigestState) -> Iterator[DigestJob]:
+        """One digest per user, in user id order, from a single streamed query."""
+        rows = (
+            db.query(
+                Notification.user_id, Notification.title, Notification.message,
+                Notification.created_at, User.email, User.full_name, User.username,
+            )
+            .join(User, User.id == Notification.user_id)
+            .filter(
+                Notification.is_read.is_(False),
+                Notification.created_at >= _aware(state.window_start),
+                Notification.created_at < _aware(state.window_end),
+                Notification.user_id > state.last_user_id,
+                User.is_active.is_(True),
+            )
+            .order_by(Notification.user_id, Notification.id)
+            .execution_options(yield_per=self.yield_per)
+        )
+        for user_id, group in groupby(rows, key=lambda row: row.user_id):
+            first = next(group)
+            items: List[Dict[str, Any]] = []
+            total = 0
+            for row in chain((first,), group):
+                total += 1
+                if len(items) < self.max_items:
+                    items.append({
+                        "title": row.title,
+                        "message": row.message,
+                        "created_at": row.created_at.strftime("%b %d, %H:%M") if row.created_at else "",
+                    })
+            yield user_id, first.email, first.full_name or first.username, items, total
+
+    def _send(self, job: DigestJob) -> bool:
+        user_id, email, name, items, total = job
+        if total > len(items):
+            items = items + [{"title": f"and {total - len(items)} more", "message": "", "created_at": ""}]
+        try:
+            return bool(self.email_service.send_digest_email(email, name, items, self.digest_type))
+        except Exception as e:
+            logger.error(f"Digest for user {user_id} failed: {e}")
+            return False
+
+    def _send_batch(self, executor: ThreadPoolExecutor, batch: List[DigestJob]) -> int:
+        sent = sum(executor.map(self._send, batch))
+        record_digest("sent", sent)
+        record_digest("failed", len(batch) - sent)
+        self._checkpoint(batch[-1][0], sent)
+        return sent
+
+    def run(self) -> Dict[str, Any]:
+        state = self._start()
+        users = sent = 0
+        db = self.session_factory()
+        try:
+            with ThreadPoolExecutor(max(1, self.concurrency)) as executor:
+                batch: List[DigestJob] = []
+                for job in self._jobs(db, state):
+                    batch.append(job)
+                    if len(batch) >= self.batch_size:
+                        sent += self._send_batch(executor, batch)
+                        users += len(batch)
+                        batch = []
+                if batch:
+                    sent += self._send_batch(executor, batch)
+                    users += len(batch)
+        finally:
+            db.close()
+        self._checkpoint(None, 0, completed=True)
+        logger.info(f"{self.digest_type.capitalize()} digest: {sent}/{users} users emailed")
+        return {"users": users, "sent": sent, "resumed_after": state.last_user_id}
+
+
+def create_digest_builder(email_service) -> DigestBuilder:
+    return DigestBuilder(
+        email_service,
+        batch_size=settings.DIGEST_BATCH_SIZE,
+        concurrency=settings.DIGEST_CONCURRENCY,
+        max_items=settings.DIGEST_MAX_ITEMS,
+        yield_per=settings.DIGEST_YIELD_PER,
+    )
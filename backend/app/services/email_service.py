@@ -1,20 +1,32 @@
-import os
-import smtplib
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
-from jinja2 import Template
+
+from app.core.config import settings
+from app.services.email_templates import FALLBACK_TEMPLATE, email_templates
+from app.services.smtp_pool import SMTPConnectionPool, get_smtp_pool
 
 class EmailService:
-    def __init__(self, smtp_server, smtp_port, smtp_username, smtp_password, from_email, from_name="FreelanceAI"):
+    def __init__(
+        self,
+        smtp_server,
+        smtp_port,
+        smtp_username,
+        smtp_password,
+        from_email,
+        from_name="FreelanceAI",
+        pool: Optional[SMTPConnectionPool] = None
+    ):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.smtp_username = smtp_username
         self.smtp_password = smtp_password
         self.from_email = from_email
         self.from_name = from_name
+        # Sessions are shared with every other service using the same account
+        self.pool = pool or get_smtp_pool(smtp_server, smtp_port, smtp_username, smtp_password)
 
     def send_email(
         self,
@@ -24,44 +36,62 @@ class EmailService:
         text_content: Optional[str] = None,
         attachments: Optional[List[Dict[str, str]]] = None
     ) -> bool:
-        """Send an email"""
+        """Send an email over a pooled SMTP session"""
         try:
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = f"{self.from_name} <{self.from_email}>"
-            msg["To"] = to_email
-
-            # Add text content
-            if text_content:
-                text_part = MIMEText(text_content, "plain")
-                msg.attach(text_part)
-
-            # Add HTML content
-            html_part = MIMEText(html_content, "html")
-            msg.attach(html_part)
-
-            # Add attachments
-            if attachments:
-                for attachment in attachments:
-                    with open(attachment["path"], "rb") as f:
-                        part = MIMEImage(f.read())
-                        part.add_header(
-                            "Content-Disposition",
-                            "attachment",
-                            filename=attachment["filename"]
-                        )
-                        msg.attach(part)
-
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-
-            return True
+            msg = self._build_message(to_email, subject, html_content, text_content, attachments)
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            print(f"Failed to build email: {e}")
             return False
+        return self.pool.send(msg)
+
+    def send_bulk_emails(self, emails: List[Dict[str, Any]]) -> int:
+        """Send many emails back to back on pooled sessions; returns how many were accepted.
+
+        Each item takes the keyword arguments of send_email.
+        """
+        messages = []
+        for email in emails:
+            try:
+                messages.append(self._build_message(**email))
+            except Exception as e:
+                print(f"Failed to build email: {e}")
+        return self.pool.send_many(messages)
+
+    def _build_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+        attachments: Optional[List[Dict[str, str]]] = None
+    ) -> MIMEMultipart:
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = f"{self.from_name} <{self.from_email}>"
+        msg["To"] = to_email
+
+        # Add text content
+        if text_content:
+            text_part = MIMEText(text_content, "plain")
+            msg.attach(text_part)
+
+        # Add HTML content
+        html_part = MIMEText(html_content, "html")
+        msg.attach(html_part)
+
+        # Add attachments
+        if attachments:
+            for attachment in attachments:
+                with open(attachment["path"], "rb") as f:
+                    part = MIMEImage(f.read())
+                    part.add_header(
+                        "Content-Disposition",
+                        "attachment",
+                        filename=attachment["filename"]
+                    )
+                    msg.attach(part)
+
+        return msg
 
     def send_notification_email(
         self,
@@ -128,79 +158,11 @@ class EmailService:
         context: Dict[str, Any]
     ) -> str:
         """Render email template with context"""
-        template_path = f"app/templates/emails/{template_name}"
-
-        if not os.path.exists(template_path):
-            # Return a simple fallback template
-            return self._get_fallback_template(context)
-
-        with open(template_path, "r", encoding="utf-8") as f:
-            template_content = f.read()
-
-        template = Template(template_content)
-        return template.render(**context)
+        return email_templates.render(template_name, context)
 
     def _get_fallback_template(self, context: Dict[str, Any]) -> str:
         """Fallback template if custom template doesn't exist"""
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset=\"utf-8\">
-            <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">
-            <title>FreelanceAI Notification</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                    border-radius: 10px 10px 0 0;
-                }}
-                .content {{
-                    background: #f9f9f9;
-                    padding: 30px;
-                    border-radius: 0 0 10px 10px;
-                }}
-                .button {{
-                    display: inline-block;
-                    padding: 12px 24px;
-                    background: #667eea;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 10px 0;
-                }}
-                .footer {{
-                    text-align: center;
-                    margin-top: 30px;
-                    color: #666;
-                    font-size: 12px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class=\"container\">
-                <div class=\"header\">
-                    <h1>FreelanceAI</h1>
-                    <p>Hello {context.get('user_name', 'there')}!</p>
-                </div>
-                <div class=\"content\">
-                    <h2>Notification</h2>
-                    <p>You have a new notification from FreelanceAI.</p>
-                    <p><strong>Date:</strong> {context.get('current_date', '')}</p>
-                    <a href=\"https://freelanceai.com\" class=\"button\">View Details</a>
-                </div>
-                <div class=\"footer\">
-                    <p>This email was sent from FreelanceAI. If you don't want to receive these emails, you can
-                    <a href=\"{context.get('unsubscribe_url', '#')}\">unsubscribe here</a>.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return email_templates.render(FALLBACK_TEMPLATE, context)
 
     def send_digest_email(
         self,
@@ -231,73 +193,20 @@ class EmailService:
         digest_type: str
     ) -> str:
         """Render digest email template"""
-        notification_items = ""
-        for notification in notifications:
-            notification_items += f"""
-            <div style=\"border-left: 3px solid #667eea; padding-left: 15px; margin: 15px 0;\">
-                <h3 style=\"margin: 0 0 5px 0; color: #333;\">{notification.get('title', 'Notification')}</h3>
-                <p style=\"margin: 0; color: #666;\">{notification.get('message', '')}</p>
-                <small style=\"color: #999;\">{notification.get('created_at', '')}</small>
-            </div>
-            """
+        return email_templates.render(
+            "digest.html",
+            {"to_name": to_name, "notifications": notifications, "digest_type": digest_type}
+        )
 
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset=\"utf-8\">
-            <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">
-            <title>FreelanceAI {digest_type.capitalize()} Digest</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                    border-radius: 10px 10px 0 0;
-                }}
-                .content {{
-                    background: #f9f9f9;
-                    padding: 30px;
-                    border-radius: 0 0 10px 10px;
-                }}
-                .button {{
-                    display: inline-block;
-                    padding: 12px 24px;
-                    background: #667eea;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 10px 0;
-                }}
-                .footer {{
-                    text-align: center;
-                    margin-top: 30px;
-                    color: #666;
-                    font-size: 12px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class=\"container\">
-                <div class=\"header\">
-                    <h1>FreelanceAI</h1>
-                    <p>Your {digest_type.capitalize()} Digest</p>
-                </div>
-                <div class=\"content\">
-                    <h2>Hello {to_name}!</h2>
-                    <p>Here's a summary of your {digest_type} activity:</p>
-                    {notification_items}
-                    <a href=\"https://freelanceai.com/dashboard\" class=\"button\">
-                        View Dashboard
-                    </a>
-                </div>
-                <div class=\"footer\">
-                    <p>This email was sent from FreelanceAI. You can manage your notification preferences in your account settings.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+
+def create_email_service() -> Optional[EmailService]:
+    """EmailService for the configured SMTP account, or None when email is not set up."""
+    if not settings.SMTP_HOST:
+        return None
+    return EmailService(
+        settings.SMTP_HOST,
+        settings.SMTP_PORT,
+        settings.SMTP_USER,
+        settings.SMTP_PASSWORD,
+        settings.EMAIL_FROM
+    )
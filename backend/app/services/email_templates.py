@@ -0,0 +1,74 @@
+"""
+Compiled email templates.
+
+All templates under app/templates/emails share one Jinja Environment. Each is
+parsed and compiled once, on first use or by preload() at startup, and then
+rendered from the cached code. The shared layout (_layout.html) holds the header,
+footer and CSS, which compile to constant strings and cost nothing per render.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Set
+
+from jinja2 import Environment, FileSystemLoader, Template, TemplateNotFound, select_autoescape
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "emails")
+FALLBACK_TEMPLATE = "fallback.html"
+
+
+class EmailTemplateRegistry:
+    """Loads and compiles email templates once and renders them from memory."""
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(["html"]),
+            # Templates only change on deploy; skip the mtime check on every render
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self._templates: Dict[str, Template] = {}
+        self._missing: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def preload(self) -> int:
+        """Compile every template now so the first send does not pay for it."""
+        for name in self.env.list_templates(extensions=["html"]):
+            self.get(name)
+        logger.info(f"Compiled {len(self._templates)} email templates")
+        return len(self._templates)
+
+    def get(self, name: str) -> Template:
+        template = self._templates.get(name)
+        if template is not None:
+            return template
+        with self._lock:
+            if name not in self._templates:
+                self._templates[name] = self.env.get_template(name)
+            return self._templates[name]
+
+    def exists(self, name: str) -> bool:
+        if name in self._templates:
+            return True
+        if name in self._missing:
+            return False
+        try:
+            self.get(name)
+            return True
+        except TemplateNotFound:
+            self._missing.add(name)
+            return False
+
+    def render(self, name: str, context: Dict[str, Any]) -> str:
+        """Render a template, or the generic fallback when it does not exist."""
+        if not self.exists(name):
+            name = FALLBACK_TEMPLATE
+        return self.get(name).render(**context)
+
+
+email_templates = EmailTemplateRegistry()
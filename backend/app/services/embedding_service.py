@@ -0,0 +1,539 @@
+"""
+Local embedding index for semantic task <-> freelancer matching.
+
+Vectors are produced without any network access (hashed word and character
+n-grams by default) and stored as float32 rows in memory-mapped matrices, so
+top-k cosine queries are a single NumPy matrix-vector product.
+
+Every worker process maps the same files. Writers take an exclusive flock on
+``<name>.lock`` and re-read the metadata under it before claiming rows;
+readers reload the row map whenever the generation in ``<name>.json`` moves.
+"""
+
+import importlib
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db_models import Task, TaskStatus, User
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
+
+logger = get_logger(__name__)
+
+TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder over words and character n-grams.
+
+    Character n-grams make near-identical skill spellings ("React", "ReactJS",
+    "react.js") land close to each other without a vocabulary.
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        for token in TOKEN_RE.findall(text.lower()):
+            yield f"w:{token}", 1.0
+            padded = f"<{token}>"
+            low, high = self.ngram_range
+            for n in range(low, high + 1):
+                for i in range(max(len(padded) - n + 1, 1)):
+                    yield f"c:{padded[i:i + n]}", 0.5
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text or ""):
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * weight
+        return _normalize(vector)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed_one(text) for text in texts])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def load_embedder(model: Optional[str], dim: int) -> Any:
+    """Load the configured embedder.
+
+    ``model`` is an optional ``"package.module:factory"`` path; the factory is
+    called with ``dim`` and must return an object exposing ``dim`` and
+    ``embed(texts) -> np.ndarray``. Without it the hashing embedder is used.
+    """
+    if not model:
+        return HashingEmbedder(dim=dim)
+    try:
+        module_name, _, attr = model.partition(":")
+        factory = getattr(importlib.import_module(module_name), attr)
+        return factory(dim)
+    except Exception as e:
+        logger.error(f"Failed to load embedding model {model}, using hashing embedder: {e}")
+        return HashingEmbedder(dim=dim)
+
+
+class EmbeddingIndex:
+    """Append/overwrite float32 vector store backed by ``np.memmap`` files.
+
+    Rows are addressed by an external integer id. Deleted rows are tombstoned
+    (id set to -1) and reused on the next insert. When ``ivf_lists`` is set
+    the rows are partitioned around k-means centroids and queries only score
+    the ``ivf_probes`` closest partitions.
+
+    Several processes may open the same index: mutations hold an exclusive
+    file lock and start from the latest metadata on disk, and every write
+    republishes the metadata so other processes pick the new rows up.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        dim: int,
+        ivf_lists: int = 0,
+        ivf_probes: int = 4,
+        initial_capacity: int = 1024,
+    ):
+        self.directory = directory
+        self.name = name
+        self.dim = dim
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = max(1, ivf_probes)
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self.generation = 0
+        self._ids_inode: Optional[int] = None
+        self.count = 0
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self.ids: Optional[np.memmap] = None
+        self.positions: Dict[int, int] = {}
+        self.free_rows: List[int] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+        self.trained_at_count = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open(initial_capacity)
+
+    # Storage
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold the index against other threads and, through flock, other processes."""
+        with self.lock:
+            if fcntl is not None and self._lock_depth == 0:
+                if self._lock_file is None:
+                    self._lock_file = open(self._path("lock"), "a+")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if fcntl is not None and self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self, initial_capacity: int) -> None:
+        with self._exclusive():
+            meta = self._read_meta()
+            if meta is not None:
+                if meta.get("dim") == self.dim:
+                    self._load(meta)
+                    return
+                logger.warning(f"Embedding index {self.name} has dim {meta.get('dim')}, rebuilding with dim {self.dim}")
+            self._allocate(initial_capacity)
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path("json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, meta: Dict[str, Any]) -> None:
+        """Adopt the row layout another process (or an earlier run) published."""
+        ids_inode = os.stat(self._path("ids")).st_ino
+        if self.vectors is None or meta["capacity"] != self.capacity or ids_inode != self._ids_inode:
+            # The files were grown (replaced) since they were mapped
+            self.vectors = None
+            self.ids = None
+            self.capacity = meta["capacity"]
+            self.vectors = np.memmap(self._path("f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+            self.ids = np.memmap(self._path("ids"), dtype=np.int64, mode="r+", shape=(self.capacity,))
+            self._ids_inode = ids_inode
+        self.count = meta["count"]
+        ids = np.asarray(self.ids[:self.count])
+        live = np.nonzero(ids >= 0)[0]
+        self.positions = dict(zip(ids[live].tolist(), live.tolist()))
+        self.free_rows = np.nonzero(ids < 0)[0].tolist()
+        if self.centroids is not None:
+            self.assignments = np.full(self.capacity, -1, dtype=np.int32)
+            if len(live):
+                self.assignments[live] = np.argmax(np.asarray(self.vectors[live]) @ self.centroids.T, axis=1)
+        self.generation = meta.get("generation", 0)
+
+    def _sync(self) -> None:
+        """Reload the row map if another process has published a newer one."""
+        meta = self._read_meta()
+        if meta is not None and meta.get("dim") == self.dim and meta.get("generation", 0) != self.generation:
+            self._load(meta)
+
+    def _allocate(self, capacity: int) -> None:
+        vectors = np.memmap(self._path("f32.tmp"), dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        ids = np.memmap(self._path("ids.tmp"), dtype=np.int64, mode="w+", shape=(capacity,))
+        ids[:] = -1
+        if self.vectors is not None and self.count:
+            vectors[:self.count] = self.vectors[:self.count]
+            ids[:self.count] = self.ids[:self.count]
+        vectors.flush()
+        ids.flush()
+        del vectors, ids
+        self.vectors = None
+        self.ids = None
+        os.replace(self._path("f32.tmp"), self._path("f32"))
+        os.replace(self._path("ids.tmp"), self._path("ids"))
+        self.capacity = capacity
+        self.vectors = np.memmap(self._path("f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.ids = np.memmap(self._path("ids"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self._ids_inode = os.stat(self._path("ids")).st_ino
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        tmp_path = self._path("json.tmp")
+        self.generation += 1
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"dim": self.dim, "count": self.count, "capacity": self.capacity, "generation": self.generation}, f
+            )
+        os.replace(tmp_path, self._path("json"))
+
+    def flush(self) -> None:
+        with self._exclusive():
+            self.vectors.flush()
+            self.ids.flush()
+            self._write_meta()
+
+    def __len__(self) -> int:
+        with self.lock:
+            self._sync()
+            return len(self.positions)
+
+    # Mutation
+
+    def upsert(self, item_ids: Sequence[int], vectors: np.ndarray, flush: bool = True) -> None:
+        """Write vectors; with ``flush=False`` the metadata is still published but pages are not synced."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(item_ids), self.dim))
+        with self._exclusive():
+            self._sync()
+            for item_id, vector in zip(item_ids, vectors):
+                row = self.positions.get(int(item_id))
+                if row is None:
+                    row = self._claim_row()
+                    self.positions[int(item_id)] = row
+                    self.ids[row] = int(item_id)
+                self.vectors[row] = vector
+                if self.centroids is not None:
+                    self.assignments[row] = self._nearest_centroids(vector, 1)[0]
+            if flush:
+                self.flush()
+            else:
+                # Rows claimed here must be visible before the file lock is released
+                self._write_meta()
+            self._maybe_train()
+
+    def _claim_row(self) -> int:
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.count >= self.capacity:
+            self._allocate(max(self.capacity * 2, 1024))
+            if self.assignments is not None:
+                self.assignments = np.concatenate(
+                    [self.assignments, np.full(self.capacity - len(self.assignments), -1, dtype=np.int32)]
+                )
+        row = self.count
+        self.count += 1
+        return row
+
+    def remove(self, item_id: int, flush: bool = True) -> None:
+        with self._exclusive():
+            self._sync()
+            row = self.positions.pop(int(item_id), None)
+            if row is None:
+                return
+            self.ids[row] = -1
+            self.vectors[row] = 0
+            if self.assignments is not None:
+                self.assignments[row] = -1
+            self.free_rows.append(row)
+            if flush:
+                self.flush()
+            else:
+                self._write_meta()
+
+    # IVF partitioning
+
+    def _maybe_train(self) -> None:
+        if not self.ivf_lists:
+            return
+        live = len(self.positions)
+        if live < self.ivf_lists * 8:
+            return
+        if self.centroids is None or live >= self.trained_at_count * 2:
+            self.train()
+
+    def train(self, iterations: int = 10) -> None:
+        """(Re)compute IVF centroids with a few rounds of spherical k-means."""
+        with self.lock:
+            rows = np.array(sorted(self.positions.values()), dtype=np.int64)
+            if len(rows) < self.ivf_lists:
+                return
+            data = np.asarray(self.vectors[rows])
+            rng = np.random.default_rng(0)
+            centroids = data[rng.choice(len(rows), self.ivf_lists, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                for k in range(self.ivf_lists):
+                    members = data[labels == k]
+                    if len(members):
+                        centroids[k] = members.sum(axis=0)
+                centroids = _normalize(centroids)
+            assignments = np.full(self.capacity, -1, dtype=np.int32)
+            assignments[rows] = np.argmax(data @ centroids.T, axis=1)
+            self.centroids = centroids
+            self.assignments = assignments
+            self.trained_at_count = len(rows)
+
+    def _nearest_centroids(self, vector: np.ndarray, probes: int) -> np.ndarray:
+        scores = self.centroids @ vector
+        probes = min(probes, len(scores))
+        return np.argpartition(-scores, probes - 1)[:probes]
+
+    # Queries
+
+    def vector(self, item_id: int) -> Optional[np.ndarray]:
+        with self.lock:
+            self._sync()
+            row = self.positions.get(int(item_id))
+            return None if row is None else np.array(self.vectors[row])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        allowed_ids: Optional[Iterable[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(id, cosine)`` pairs, best first."""
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        with self.lock:
+            self._sync()
+            if not self.positions or k <= 0:
+                return []
+            if allowed_ids is not None:
+                rows = np.array(
+                    [self.positions[i] for i in allowed_ids if i in self.positions], dtype=np.int64
+                )
+            elif self.centroids is not None:
+                probes = self._nearest_centroids(query, self.ivf_probes)
+                rows = np.nonzero(np.isin(self.assignments[:self.count], probes))[0]
+            else:
+                rows = np.arange(self.count)
+            if len(rows) == 0:
+                return []
+            ids = np.asarray(self.ids[rows])
+            scores = np.asarray(self.vectors[rows]) @ query
+        live = ids >= 0
+        ids, scores = ids[live], scores[live]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+def task_text(task: Task) -> str:
+    skills = " ".join(task.skills_required or [])
+    # Skills are repeated so they outweigh long free-text descriptions
+    return f"{task.title} {task.category} {skills} {skills} {task.description or ''}"
+
+
+def profile_text(user: User) -> str:
+    skills = " ".join(user.skills or [])
+    return f"{skills} {skills} {user.full_name or ''} {user.bio or ''}"
+
+
+class EmbeddingService:
+    """Keeps task and freelancer vectors in sync and answers matching queries."""
+
+    def __init__(
+        self,
+        directory: str,
+        dim: int,
+        model: Optional[str] = None,
+        ivf_lists: int = 0,
+        ivf_probes: int = 4,
+    ):
+        self.directory = directory
+        self.embedder = load_embedder(model, dim)
+        self.dim = self.embedder.dim
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self._indexes: Dict[str, EmbeddingIndex] = {}
+        self._lock = threading.Lock()
+
+    def index(self, name: str) -> EmbeddingIndex:
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = EmbeddingIndex(
+                    self.directory, name, self.dim, self.ivf_lists, self.ivf_probes
+                )
+            return self._indexes[name]
+
+    @property
+    def tasks(self) -> EmbeddingIndex:
+        return self.index("tasks")
+
+    @property
+    def freelancers(self) -> EmbeddingIndex:
+        return self.index("freelancers")
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embedder.embed([text])[0]
+
+    # Incremental upserts
+
+    def upsert_task(self, task: Task) -> None:
+        try:
+            if task.status in (TaskStatus.OPEN, None):
+                self.tasks.upsert([task.id], self.embedder.embed([task_text(task)]))
+            else:
+                self.tasks.remove(task.id)
+        except Exception as e:
+            logger.error(f"Failed to index task {task.id}: {e}")
+
+    def remove_task(self, task_id: int) -> None:
+        try:
+            self.tasks.remove(task_id)
+        except Exception as e:
+            logger.error(f"Failed to remove task {task_id} from index: {e}")
+
+    def upsert_freelancer(self, user: User) -> None:
+        try:
+            if user.is_freelancer and user.is_active is not False:
+                self.freelancers.upsert([user.id], self.embedder.embed([profile_text(user)]))
+            else:
+                self.freelancers.remove(user.id)
+        except Exception as e:
+            logger.error(f"Failed to index user {user.id}: {e}")
+
+    def remove_freelancer(self, user_id: int) -> None:
+        try:
+            self.freelancers.remove(user_id)
+        except Exception as e:
+            logger.error(f"Failed to remove user {user_id} from index: {e}")
+
+    def rebuild(
+        self, db: Session, batch_size: int = 500, names: Sequence[str] = ("tasks", "freelancers")
+    ) -> Dict[str, int]:
+        """Index every open task and active freelancer from the database, or only the named indexes."""
+        sources = {
+            "tasks": (db.query(Task).filter(Task.status == TaskStatus.OPEN), task_text),
+            "freelancers": (
+                db.query(User).filter(User.is_freelancer == True, User.is_active == True), profile_text
+            ),
+        }
+        counts = {}
+        for name in names:
+            query, to_text = sources[name]
+            counts[name] = self._rebuild_index(self.index(name), query.yield_per(batch_size), to_text, batch_size)
+        return counts
+
+    def _rebuild_index(
+        self, index: EmbeddingIndex, rows: Iterable[Any], to_text: Callable[[Any], str], batch_size: int
+    ) -> int:
+        count = 0
+        batch: List[Any] = []
+
+        def _flush(items: List[Any]) -> None:
+            if items:
+                index.upsert([item.id for item in items], self.embedder.embed([to_text(item) for item in items]), flush=False)
+
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= batch_size:
+                _flush(batch)
+                batch = []
+        _flush(batch)
+        index.flush()
+        return count
+
+    def ensure_built(self, db: Session) -> None:
+        """Backfill each index from the database the first time it is queried empty."""
+        empty = [name for name in ("tasks", "freelancers") if not len(self.index(name))]
+        if empty:
+            counts = self.rebuild(db, names=empty)
+            logger.info(f"Embedding index backfilled: {counts}")
+
+    # Queries
+
+    def task_vector(self, task: Task) -> np.ndarray:
+        vector = self.tasks.vector(task.id)
+        return vector if vector is not None else self.embed_text(task_text(task))
+
+    def profile_vector(self, user: User) -> np.ndarray:
+        vector = self.freelancers.vector(user.id)
+        return vector if vector is not None else self.embed_text(profile_text(user))
+
+    def match_freelancers(self, db: Session, task: Task, k: int = 10) -> List[Tuple[int, float]]:
+        self.ensure_built(db)
+        return self.freelancers.search(self.task_vector(task), k)
+
+    def recommend_tasks(self, db: Session, user: User, k: int = 10) -> List[Tuple[int, float]]:
+        self.ensure_built(db)
+        return self.tasks.search(self.profile_vector(user), k)
+
+    def similarity(self, task: Task, user: User) -> float:
+        return float(np.dot(self.task_vector(task), self.profile_vector(user)))
+
+    def matching_skills(self, wanted: Sequence[str], offered: Sequence[str], threshold: float = 0.5) -> List[str]:
+        """Offered skills that are semantically close to any wanted skill."""
+        if not wanted or not offered:
+            return []
+        scores = self.embedder.embed(list(offered)) @ self.embedder.embed(list(wanted)).T
+        return [skill for skill, best in zip(offered, scores.max(axis=1)) if best >= threshold]
+
+
+embedding_service = EmbeddingService(
+    directory=settings.EMBEDDING_DIR,
+    dim=settings.EMBEDDING_DIM,
+    model=settings.EMBEDDING_MODEL,
+    ivf_lists=settings.EMBEDDING_IVF_LISTS,
+    ivf_probes=settings.EMBEDDING_IVF_PROBES,
+)
@@ -0,0 +1,225 @@
+"""
+Attachment downloads: byte ranges, strong ETags and a short-lived access cache.
+
+Blob-backed files are tagged with their SHA-256, a strong ETag that never
+changes for a URL, so a matching If-None-Match is answered with 304 and no
+body. A single `Range: bytes=...` is served as 206, which lets an
+interrupted download resume where it stopped (If-Range falls back to the
+whole file when the content changed); several ranges in one request get the
+whole file. Local files are sent with the ASGI zero-copy extension when the
+server offers it (sendfile from the file descriptor), otherwise with
+positional reads in the thread pool. S3 objects are streamed with the range
+passed through to the bucket.
+
+Which file a (user, URL) pair resolves to, once allowed, is remembered for
+FILE_ACCESS_CACHE_TTL seconds, so the metadata and membership query does not
+run on every request of a resumed or parallel download. Denials are not
+cached, and a revoked permission applies once the entry expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from mimetypes import guess_type
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.file_store import file_store
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+
+@dataclass(frozen=True)
+class DownloadTarget:
+    """What an allowed download serves: a blob, or a file stored before deduplication."""
+
+    filename: str
+    media_type: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    legacy_path: Optional[str] = None
+
+
+class AccessCache:
+    """Bounded LRU of allowed downloads, each valid for `ttl` seconds."""
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, DownloadTarget]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, load: Callable[[], DownloadTarget]) -> DownloadTarget:
+        """The cached target for `key`, or `load()`; a load that raises (403, 404) is not cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        target = load()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, target)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return target
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+download_access = AccessCache(ttl=settings.FILE_ACCESS_CACHE_TTL, max_size=settings.FILE_ACCESS_CACHE_SIZE)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive (start, end) of a single byte range, or None to send the whole file."""
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else None
+            if end is not None and end < start:
+                return None
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison, as If-None-Match uses."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (tag[2:] if tag.startswith("W/") else tag) == opaque
+        for tag in (part.strip() for part in header.split(","))
+    )
+
+
+class FileRangeResponse(Response):
+    """A byte range of a local file, sent zero-copy when the server supports it."""
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, status_code: int, headers: Dict[str, str], media_type: str):
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.whole = start == 0 and self.count == size
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or self.count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if self.whole and PATHSEND_EXTENSION in extensions:
+            await send({"type": PATHSEND_EXTENSION, "path": os.path.abspath(self.path)})
+            return
+        handle = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if ZERO_COPY_EXTENSION in extensions:
+                await send({
+                    "type": ZERO_COPY_EXTENSION, "file": handle,
+                    "offset": self.start, "count": self.count, "more_body": False,
+                })
+                return
+            offset, remaining = self.start, self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, handle.fileno(), min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the body rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            handle.close()
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def download_response(request: Request, target: DownloadTarget) -> Response:
+    """Serve `target` honoring If-None-Match, Range and If-Range."""
+    path = target.legacy_path or (file_store.local_path(target.sha256) if target.sha256 else None)
+    if target.sha256:
+        etag, size = f'"{target.sha256}"', target.size
+    else:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found on server")
+        # Files from before deduplication have no hash; their tag is only as good as mtime and size
+        etag, size = f'W/"{int(stat.st_mtime)}-{stat.st_size}"', stat.st_size
+    if size is None:
+        size = os.path.getsize(path) if path else file_store.size(target.sha256)
+
+    headers = {"etag": etag, "cache-control": settings.FILE_DOWNLOAD_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    headers["accept-ranges"] = "bytes"
+    headers["content-disposition"] = _content_disposition(target.filename)
+    media_type = target.media_type or guess_type(target.filename)[0] or "application/octet-stream"
+
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if if_range is None or (if_range == etag and not etag.startswith("W/")):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}", **headers})
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+
+    if path is not None:
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="File not found on server")
+        return FileRangeResponse(path, start, end, size, status_code, headers, media_type)
+    body: Iterator[bytes] = file_store.iter_bytes(target.sha256, start, end) if size else iter(())
+    return StreamingResponse(body, status_code=status_code, headers=headers, media_type=media_type)
@@ -0,0 +1,366 @@
+"""
+Content-addressed storage for chat and KYC attachments.
+
+A file is stored once per distinct content, keyed by its SHA-256, under a
+sharded path (ab/cd/abcd...) so no directory grows without bound. Rows that
+use a file (chat_files.sha256, kyc_requests.document_sha256) point at its
+file_blobs row, which counts them: the same PDF sent to ten chats is ten
+references to one blob. A blob whose count drops to zero is kept for
+FILE_BLOB_GC_GRACE seconds and then removed by the garbage collector.
+
+New bytes are stored before the caller commits, so a transaction that rolls
+back can leave a blob with no row. A daily sweep lists the storage and gives
+such blobs an unreferenced row dated from when they were written, which
+hands them to the collector like any other released blob; a blob still
+waiting on a commit in flight keeps the row that commit creates.
+
+The bytes live behind a StorageBackend: the local filesystem, or any
+S3-compatible service (MinIO stands in for it locally) through boto3.
+"""
+
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from app.celery import celery_app
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.database import SessionLocal, upsert
+from app.db_models import FileBlob
+
+logger = get_logger(__name__)
+
+GC_BATCH = 1000
+
+BLOB_KEY = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})$")
+
+
+def blob_key(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def key_sha256(key: str) -> Optional[str]:
+    """The hash a storage key holds, or None for anything that is not a blob."""
+    match = BLOB_KEY.match(key)
+    return match.group(3) if match else None
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StorageBackend:
+    """Interface shared by blob storage backends."""
+
+    def put(self, key: str, source_path: str) -> None:
+        """Store a local file under `key`; the source file is consumed."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def open(self, key: str, start: int = 0, end: Optional[int] = None) -> BinaryIO:
+        """Readable stream from byte `start`; reading past `end` (inclusive) is the caller's business."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        """Every stored key with its size and last-modified time."""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the blob, for backends that have one."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Blobs as files under a root directory. New blobs are renamed into place."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put(self, key: str, source_path: str) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def open(self, key: str, start: int = 0, end: Optional[int] = None) -> BinaryIO:
+        handle = open(self.local_path(key), "rb")
+        handle.seek(start)
+        return handle
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.local_path(key))
+
+    def delete(self, key: str) -> None:
+        _remove(self.local_path(key))
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        for directory, subdirs, files in os.walk(self.root):
+            # Skips the staging area, among others
+            subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+class S3Storage(StorageBackend):
+    """Blobs as objects in an S3-compatible bucket; `endpoint_url` points it at MinIO."""
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: Optional[str] = None,
+        prefix: str = "",
+    ):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put(self, key: str, source_path: str) -> None:
+        # upload_file switches to a multipart upload for large files
+        self.client.upload_file(source_path, self.bucket, self._key(key))
+        _remove(source_path)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def open(self, key: str, start: int = 0, end: Optional[int] = None) -> BinaryIO:
+        kwargs = {}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key), **kwargs)["Body"]
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def iter_keys(self) -> Iterator[Tuple[str, int, datetime]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["Size"], item["LastModified"]
+
+
+class FileStore:
+    """Reference-counted blobs on a storage backend."""
+
+    def __init__(self, backend: StorageBackend, staging_dir: str, grace_seconds: int, chunk_size: int):
+        self.backend = backend
+        self.staging_dir = staging_dir
+        self.grace_seconds = grace_seconds
+        self.chunk_size = chunk_size
+
+    def staging_path(self) -> str:
+        """A fresh path to write an upload to before it is added."""
+        os.makedirs(self.staging_dir, exist_ok=True)
+        return os.path.join(self.staging_dir, uuid4().hex)
+
+    def add(self, db: Session, path: str, sha256: str, size: int) -> str:
+        """Add one reference to the blob with this content, storing `path` only if it is new.
+
+        The reference is counted first, in the caller's transaction: that
+        locks the blob row, so the collector cannot delete the bytes between
+        the existence check and the caller's commit.
+        """
+        stmt = upsert(db, FileBlob)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[FileBlob.sha256],
+                set_={"ref_count": FileBlob.ref_count + 1, "released_at": None},
+            ),
+            [{"sha256": sha256, "size": size, "ref_count": 1}],
+        )
+        key = blob_key(sha256)
+        if self.backend.exists(key):
+            _remove(path)
+        else:
+            self.backend.put(key, path)
+        return sha256
+
+    def release(self, db: Session, hashes: Iterable[Optional[str]]) -> None:
+        """Drop one reference per hash given; runs in the caller's transaction."""
+        by_count: Dict[int, List[str]] = defaultdict(list)
+        for sha256, count in Counter(h for h in hashes if h).items():
+            by_count[count].append(sha256)
+        now = datetime.now(timezone.utc)
+        for count, shas in sorted(by_count.items()):
+            db.execute(
+                update(FileBlob)
+                .where(FileBlob.sha256.in_(sorted(shas)))
+                .values(
+                    ref_count=FileBlob.ref_count - count,
+                    released_at=case((FileBlob.ref_count - count <= 0, now), else_=FileBlob.released_at),
+                )
+            )
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        return self.backend.local_path(blob_key(sha256))
+
+    def size(self, sha256: str) -> int:
+        return self.backend.size(blob_key(sha256))
+
+    def iter_bytes(self, sha256: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """The blob's bytes from `start` through `end` (inclusive), in chunks."""
+        body = self.backend.open(blob_key(sha256), start, end)
+        remaining = None if end is None else end - start + 1
+        try:
+            while remaining is None or remaining > 0:
+                chunk = body.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            body.close()
+
+    def collect_garbage(self, db: Session, now: Optional[datetime] = None, limit: int = GC_BATCH) -> int:
+        """Delete blobs that have had no references for longer than the grace period."""
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=self.grace_seconds)
+        candidates = [
+            sha256 for sha256, in db.query(FileBlob.sha256)
+            .filter(FileBlob.ref_count <= 0, FileBlob.released_at < cutoff)
+            .order_by(FileBlob.released_at)
+            .limit(limit)
+        ]
+        collected = 0
+        for sha256 in candidates:
+            # Re-checked under a row lock: an upload of the same content may have revived it
+            blob = db.query(FileBlob).filter(
+                FileBlob.sha256 == sha256, FileBlob.ref_count <= 0
+            ).with_for_update(skip_locked=True).first()
+            if blob is None:
+                db.rollback()
+                continue
+            self.backend.delete(blob_key(sha256))
+            db.delete(blob)
+            db.commit()
+            collected += 1
+        if collected:
+            logger.info(f"Collected {collected} unreferenced file blobs")
+        return collected
+
+    def adopt_orphans(self, db: Session, batch_size: int = GC_BATCH) -> int:
+        """Give stored blobs that have no row an unreferenced one, so the collector removes them.
+
+        The row is dated from when the bytes were written, so the grace
+        period counts from then. An upload whose transaction is still open
+        holds the row it inserted; the insert here does nothing for it.
+        """
+        adopted = 0
+        batch: Dict[str, Dict[str, Any]] = {}
+
+        def adopt() -> int:
+            known = {sha256 for sha256, in db.query(FileBlob.sha256).filter(FileBlob.sha256.in_(sorted(batch)))}
+            rows = [row for sha256, row in sorted(batch.items()) if sha256 not in known]
+            if rows:
+                db.execute(upsert(db, FileBlob).on_conflict_do_nothing(index_elements=[FileBlob.sha256]), rows)
+            db.commit()
+            batch.clear()
+            return len(rows)
+
+        for key, size, modified in self.backend.iter_keys():
+            sha256 = key_sha256(key)
+            if sha256 is None:
+                continue
+            batch[sha256] = {"sha256": sha256, "size": size, "ref_count": 0, "released_at": modified}
+            if len(batch) >= batch_size:
+                adopted += adopt()
+        if batch:
+            adopted += adopt()
+        if adopted:
+            logger.warning(f"Found {adopted} stored file blobs with no row; handed them to the collector")
+        return adopted
+
+
+def create_storage_backend() -> StorageBackend:
+    if settings.FILE_STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=settings.FILE_STORAGE_S3_BUCKET,
+            endpoint_url=settings.FILE_STORAGE_S3_ENDPOINT_URL,
+            access_key=settings.FILE_STORAGE_S3_ACCESS_KEY,
+            secret_key=settings.FILE_STORAGE_S3_SECRET_KEY,
+            region=settings.FILE_STORAGE_S3_REGION,
+            prefix=settings.FILE_STORAGE_S3_PREFIX,
+        )
+    return LocalStorage(settings.FILE_STORAGE_DIR)
+
+
+def create_file_store() -> FileStore:
+    return FileStore(
+        backend=create_storage_backend(),
+        staging_dir=os.path.join(settings.FILE_STORAGE_DIR, ".staging"),
+        grace_seconds=settings.FILE_BLOB_GC_GRACE,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    )
+
+
+file_store = create_file_store()
+
+
+@celery_app.task(name="app.services.file_store.collect_file_blobs")
+def collect_file_blobs() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return {"collected": file_store.collect_garbage(db)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.services.file_store.adopt_orphan_blobs")
+def adopt_orphan_blobs() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return {"adopted": file_store.adopt_orphans(db)}
+    finally:
+        db.close()
@@ -0,0 +1,323 @@
+"""
+Background review queue for uploaded KYC documents.
+
+Jobs live only in memory, so the queue also sweeps the database: on start
+and every KYC_REVIEW_SWEEP_INTERVAL seconds it re-queues PENDING requests
+the AI has not looked at yet. That recovers jobs dropped by a full queue,
+left queued at shutdown, or submitted while the queue was not running.
+
+Every worker process sweeps, so a request is claimed before it is queued:
+review_claimed_at is set under a skip-locked row lock, and other processes
+leave the request alone for KYC_REVIEW_CLAIM_TTL seconds. An upload claims
+its own request for the process that queues it. A claim that runs out
+(the process died) lets the next sweep anywhere take the request over.
+"""
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, update
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import KYC_REVIEW_QUEUE_DEPTH, record_kyc_review
+from app.database import SessionLocal
+from app.db_models import KYCRequest, KYCStatus, User
+from app.services.ai_service import ai_service
+from app.websockets.notification_manager import notification_manager
+
+logger = get_logger(__name__)
+
+ReviewHandler = Callable[[Dict[str, Any]], Awaitable[str]]
+JobLoader = Callable[[int, Set[int]], List[Dict[str, Any]]]
+
+AI_NOTE = "[AI]:"
+
+
+class KYCReviewQueue:
+    """Bounded asyncio queue drained by a fixed pool of review workers."""
+
+    def __init__(
+        self,
+        handler: ReviewHandler,
+        concurrency: int = 4,
+        max_size: int = 1000,
+        load_pending: Optional[JobLoader] = None,
+        sweep_interval: float = 300.0,
+    ):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_size = max_size
+        self.load_pending = load_pending
+        self.sweep_interval = sweep_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        # Requests queued or under review in this process, so a sweep does not queue them twice
+        self._queued: Set[int] = set()
+        self._completed: Deque[float] = deque(maxlen=1000)
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Start the worker pool on the running event loop."""
+        if self.is_running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.started_at = time.monotonic()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.concurrency)
+        ]
+        if self.load_pending is not None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+        logger.info(f"KYC review queue started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs still queued stay PENDING and are swept up on the next start."""
+        tasks = self._workers + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+        self._queued.clear()
+        KYC_REVIEW_QUEUE_DEPTH.set(0)
+
+    def submit(self, job: Dict[str, Any]) -> None:
+        """Enqueue a review job. Safe to call from sync handlers running in the threadpool."""
+        if not self.is_running or self.loop is None:
+            logger.warning(f"KYC review queue is not running, request {job.get('kyc_id')} will be picked up when it starts")
+            return
+        job.setdefault("enqueued_at", time.monotonic())
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self._put(job)
+        else:
+            self.loop.call_soon_threadsafe(self._put, job)
+
+    def _put(self, job: Dict[str, Any]) -> bool:
+        if job.get("kyc_id") in self._queued:
+            return False
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            record_kyc_review("dropped", 0.0, 0.0)
+            logger.warning(f"KYC review queue is full, request {job.get('kyc_id')} left for the next sweep")
+            return False
+        finally:
+            KYC_REVIEW_QUEUE_DEPTH.set(self.queue.qsize())
+        self._queued.add(job.get("kyc_id"))
+        return True
+
+    async def sweep(self) -> int:
+        """Queue unreviewed PENDING requests, as many as there is room for."""
+        room = self.max_size - self.queue.qsize()
+        if room <= 0:
+            return 0
+        jobs = await run_in_threadpool(self.load_pending, room, set(self._queued))
+        recovered = 0
+        for job in jobs:
+            job.setdefault("enqueued_at", time.monotonic())
+            if self._put(job):
+                recovered += 1
+        if recovered:
+            self.recovered += recovered
+            logger.info(f"Re-queued {recovered} unreviewed KYC requests")
+        return recovered
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"KYC review sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def join(self) -> None:
+        """Wait until every queued job has been reviewed."""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self.queue.get()
+            KYC_REVIEW_QUEUE_DEPTH.set(self.queue.qsize())
+            started = time.monotonic()
+            wait = started - job.get("enqueued_at", started)
+            try:
+                outcome = await self.handler(job)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outcome = "error"
+                self.failed += 1
+                logger.error(f"KYC review worker {index} failed on request {job.get('kyc_id')}: {e}")
+            finally:
+                self._queued.discard(job.get("kyc_id"))
+                self.queue.task_done()
+            finished = time.monotonic()
+            self._completed.append(finished)
+            record_kyc_review(outcome, finished - started, wait)
+
+    def throughput(self, window: float = 60.0) -> float:
+        """Reviews completed per second over the trailing window."""
+        if not self._completed:
+            return 0.0
+        now = time.monotonic()
+        recent = sum(1 for finished in self._completed if now - finished <= window)
+        elapsed = min(window, now - self.started_at) if self.started_at else window
+        return recent / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "workers": self.concurrency,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_size": self.max_size,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "recovered": self.recovered,
+            "throughput_per_second": round(self.throughput(), 3),
+        }
+
+
+async def review_kyc_request(job: Dict[str, Any]) -> str:
+    """Run the AI review for one KYC request, persist the verdict and push it to the user."""
+    ai_result = None
+    try:
+        ai_result = await ai_service.review_kyc_document(
+            document_type=job["document_type"],
+            comment=job.get("comment", ""),
+            document_url=job.get("document_url"),
+            user_info=job.get("user_info"),
+        )
+    except Exception as e:
+        logger.error(f"AI KYC review failed for request {job['kyc_id']}: {e}")
+
+    if ai_result and ai_result.get("status") in ("APPROVED", "REJECTED"):
+        status_val = KYCStatus[ai_result["status"].upper()]
+        ai_reason = ai_result.get("reason", "")
+    else:
+        status_val = KYCStatus.PENDING
+        ai_reason = "AI недоступен или не дал ответа"
+
+    saved = await run_in_threadpool(_save_verdict, job["kyc_id"], status_val, ai_reason)
+    if isinstance(saved, str):
+        return saved
+    user_id, payload = saved
+    await notification_manager.send_personal_notification(user_id, payload)
+    return status_val.value
+
+
+def _save_verdict(kyc_id: int, status_val: KYCStatus, ai_reason: str) -> Union[str, Tuple[int, Dict[str, Any]]]:
+    """Write the AI verdict unless an admin decided first; blocking, run in the thread pool."""
+    db = SessionLocal()
+    try:
+        values = {
+            "status": status_val,
+            "comment": func.coalesce(KYCRequest.comment, "") + (f"\n{AI_NOTE} {ai_reason}" if ai_reason else ""),
+        }
+        if status_val != KYCStatus.PENDING:
+            values["reviewed_at"] = datetime.utcnow()
+        # Conditional on PENDING so a decision an admin made meanwhile is never overwritten
+        updated = db.execute(
+            update(KYCRequest)
+            .where(KYCRequest.id == kyc_id, KYCRequest.status == KYCStatus.PENDING)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        kyc = db.query(KYCRequest).filter(KYCRequest.id == kyc_id).first()
+        if kyc is None:
+            return "missing"
+        if not updated:
+            return "skipped"
+        payload = {
+            "type": "kyc_status",
+            "data": {
+                "id": kyc.id,
+                "status": status_val.value,
+                "document_type": kyc.document_type,
+                "reason": ai_reason,
+                "reviewed_at": kyc.reviewed_at.isoformat() if kyc.reviewed_at else None,
+            },
+        }
+        return kyc.user_id, payload
+    finally:
+        db.close()
+
+
+def claim_unreviewed_jobs(limit: int, exclude: Set[int]) -> List[Dict[str, Any]]:
+    """Claim PENDING requests without an AI note that no other process holds, oldest first.
+
+    Blocking, run in the thread pool. Rows another sweep has locked are
+    skipped rather than waited for.
+    """
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        query = db.query(KYCRequest).filter(
+            KYCRequest.status == KYCStatus.PENDING,
+            or_(KYCRequest.comment.is_(None), KYCRequest.comment.notlike(f"%{AI_NOTE}%")),
+            or_(
+                KYCRequest.review_claimed_at.is_(None),
+                KYCRequest.review_claimed_at < now - timedelta(seconds=settings.KYC_REVIEW_CLAIM_TTL),
+            ),
+        )
+        if exclude:
+            query = query.filter(KYCRequest.id.notin_(exclude))
+        claimed = query.order_by(KYCRequest.id).limit(limit).with_for_update(skip_locked=True).all()
+        if not claimed:
+            db.rollback()
+            return []
+        db.execute(
+            update(KYCRequest)
+            .where(KYCRequest.id.in_([kyc.id for kyc in claimed]))
+            .values(review_claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        emails = dict(db.query(User.id, User.email).filter(User.id.in_({kyc.user_id for kyc in claimed})))
+        jobs = [
+            {
+                "kyc_id": kyc.id,
+                "document_type": kyc.document_type,
+                "comment": kyc.comment or "",
+                "document_url": kyc.document_url,
+                "user_info": {"id": kyc.user_id, "email": emails.get(kyc.user_id)},
+            }
+            for kyc in claimed
+        ]
+        db.commit()
+        return jobs
+    finally:
+        db.close()
+
+
+kyc_review_queue = KYCReviewQueue(
+    review_kyc_request,
+    concurrency=settings.KYC_REVIEW_CONCURRENCY,
+    max_size=settings.KYC_REVIEW_QUEUE_SIZE,
+    load_pending=claim_unreviewed_jobs,
+    sweep_interval=settings.KYC_REVIEW_SWEEP_INTERVAL,
+)
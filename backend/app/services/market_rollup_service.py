@@ -0,0 +1,386 @@
+"""
+Market rollups: per-category and per-skill price percentiles, demand and time-to-hire.
+"""
+
+import math
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, or_, true
+from sqlalchemy.orm import Session
+
+from app.celery import celery_app
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.database import SessionLocal, upsert
+from app.db_models import (
+    Application, ApplicationStatus, MarketRollup, MarketRollupEvent, MarketRollupState,
+    Payment, PaymentStatus, Task, TaskStatus
+)
+
+logger = get_logger(__name__)
+
+STATE_NAME = "market"
+RollupKey = Tuple[str, str]
+EVENT_KINDS = ("completed", "hire", "payment")
+
+
+class QuantileSketch:
+    """Mergeable log-bucketed quantile sketch with bounded relative error.
+
+    Values are mapped to buckets of geometrically growing width, so any
+    reported quantile is within `relative_accuracy` of a real sample and the
+    sketch size depends on the value range, not on the number of samples.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        value = float(value)
+        if value <= 0:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def _collapse(self) -> None:
+        # Fold the lowest buckets together; precision is kept where prices are high
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins]
+        target = indexes[len(excess)]
+        self.bins[target] += sum(self.bins.pop(index) for index in excess)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None else min(self.min, bound)
+                self.max = bound if self.max is None else max(self.max, bound)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "alpha": self.relative_accuracy,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], relative_accuracy: Optional[float] = None) -> "QuantileSketch":
+        if not data:
+            return cls(relative_accuracy or settings.MARKET_ROLLUP_ACCURACY)
+        sketch = cls(data.get("alpha", relative_accuracy or settings.MARKET_ROLLUP_ACCURACY))
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+
+class RollupAccumulator:
+    """In-memory counters for one (dimension, key) while a batch is aggregated."""
+
+    def __init__(self, relative_accuracy: float):
+        self.tasks_posted = 0
+        self.tasks_completed = 0
+        self.bids_count = 0
+        self.hires_count = 0
+        self.payments_count = 0
+        self.payments_total = Decimal("0")
+        self.price = QuantileSketch(relative_accuracy)
+        self.hire_time = QuantileSketch(relative_accuracy)
+
+    def apply_to(self, row: MarketRollup) -> None:
+        row.tasks_posted = (row.tasks_posted or 0) + self.tasks_posted
+        row.tasks_completed = (row.tasks_completed or 0) + self.tasks_completed
+        row.bids_count = (row.bids_count or 0) + self.bids_count
+        row.hires_count = (row.hires_count or 0) + self.hires_count
+        row.payments_count = (row.payments_count or 0) + self.payments_count
+        row.payments_total = Decimal(str(row.payments_total or 0)) + self.payments_total
+
+        price = QuantileSketch.from_dict(row.price_sketch, self.price.relative_accuracy)
+        price.merge(self.price)
+        hire_time = QuantileSketch.from_dict(row.hire_time_sketch, self.hire_time.relative_accuracy)
+        hire_time.merge(self.hire_time)
+        row.price_sketch = price.to_dict()
+        row.hire_time_sketch = hire_time.to_dict()
+
+        # Percentiles are materialized so reads never decode a sketch
+        row.price_p25 = _money(price.quantile(0.25))
+        row.price_p50 = _money(price.quantile(0.5))
+        row.price_p75 = _money(price.quantile(0.75))
+        row.price_p90 = _money(price.quantile(0.9))
+        row.hire_hours_p50 = _round(hire_time.quantile(0.5))
+        row.hire_hours_p90 = _round(hire_time.quantile(0.9))
+
+
+def _money(value: Optional[float]) -> Optional[Decimal]:
+    return Decimal(str(round(value, 2))) if value is not None else None
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def normalize_key(value: Any) -> str:
+    return str(value or "").strip().lower()[:100]
+
+
+def task_keys(category: Optional[str], skills: Optional[Iterable[Any]]) -> List[RollupKey]:
+    keys = []
+    if normalize_key(category):
+        keys.append(("category", normalize_key(category)))
+    for skill in {normalize_key(skill) for skill in (skills or [])}:
+        if skill:
+            keys.append(("skill", skill))
+    return keys
+
+
+def _hours_between(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    return max((end - start).total_seconds() / 3600, 0.0)
+
+
+def _window(column, since: Optional[datetime], until: datetime):
+    if since is None:
+        return column <= until
+    return and_(column > since, column <= until)
+
+
+class MarketRollupService:
+    """Builds and reads the market rollup tables.
+
+    The nightly `rebuild` recomputes everything from scratch; `refresh` folds
+    rows touched since the last watermark into the existing rollups. Status
+    changes are picked up by their `updated_at`; the ids of the tasks,
+    applications and payments already counted are kept in
+    market_rollup_events, so editing such a row again does not count it twice.
+    """
+
+    def __init__(self, relative_accuracy: Optional[float] = None, batch_size: int = 1000):
+        self.relative_accuracy = relative_accuracy or settings.MARKET_ROLLUP_ACCURACY
+        self.batch_size = batch_size
+
+    def _collect(
+        self, db: Session, since: Optional[datetime], until: datetime
+    ) -> Tuple[Dict[RollupKey, RollupAccumulator], Dict[str, List[int]]]:
+        """Aggregate the window, returning the rollups and the status-change rows counted in it."""
+        acc: Dict[RollupKey, RollupAccumulator] = {}
+        counted: Dict[str, List[int]] = {kind: [] for kind in EVENT_KINDS}
+
+        def bucket(key: RollupKey) -> RollupAccumulator:
+            if key not in acc:
+                acc[key] = RollupAccumulator(self.relative_accuracy)
+            return acc[key]
+
+        def not_counted(kind: str, entity_id):
+            if since is None:
+                return true()
+            return ~exists().where(MarketRollupEvent.kind == kind, MarketRollupEvent.entity_id == entity_id)
+
+        posted = db.query(Task.category, Task.skills_required).filter(
+            _window(Task.created_at, since, until)
+        )
+        for category, skills in posted.yield_per(self.batch_size):
+            for key in task_keys(category, skills):
+                bucket(key).tasks_posted += 1
+
+        completed = db.query(Task.id, Task.category, Task.skills_required).filter(
+            Task.status == TaskStatus.COMPLETED,
+            _window(func.coalesce(Task.updated_at, Task.created_at), since, until),
+            not_counted("completed", Task.id),
+        )
+        for task_id, category, skills in completed.yield_per(self.batch_size):
+            counted["completed"].append(task_id)
+            for key in task_keys(category, skills):
+                bucket(key).tasks_completed += 1
+
+        bids = db.query(Task.category, Task.skills_required).join(
+            Application, Application.task_id == Task.id
+        ).filter(_window(Application.created_at, since, until))
+        for category, skills in bids.yield_per(self.batch_size):
+            for key in task_keys(category, skills):
+                bucket(key).bids_count += 1
+
+        hired_at = func.coalesce(Application.updated_at, Application.created_at)
+        hires = db.query(
+            Application.id, Task.category, Task.skills_required, Task.created_at, Application.bid_amount, hired_at
+        ).join(Application, Application.task_id == Task.id).filter(
+            Application.status == ApplicationStatus.ACCEPTED,
+            _window(hired_at, since, until),
+            not_counted("hire", Application.id),
+        )
+        for application_id, category, skills, posted_at, bid_amount, accepted_at in hires.yield_per(self.batch_size):
+            counted["hire"].append(application_id)
+            hours = _hours_between(posted_at, accepted_at)
+            for key in task_keys(category, skills):
+                item = bucket(key)
+                item.hires_count += 1
+                if bid_amount is not None:
+                    item.price.add(float(bid_amount))
+                if hours is not None:
+                    item.hire_time.add(hours)
+
+        payments = db.query(Payment.id, Task.category, Task.skills_required, Payment.amount).join(
+            Payment, Payment.task_id == Task.id
+        ).filter(
+            Payment.status == PaymentStatus.COMPLETED,
+            _window(func.coalesce(Payment.updated_at, Payment.created_at), since, until),
+            not_counted("payment", Payment.id),
+        )
+        for payment_id, category, skills, amount in payments.yield_per(self.batch_size):
+            counted["payment"].append(payment_id)
+            for key in task_keys(category, skills):
+                item = bucket(key)
+                item.payments_count += 1
+                item.payments_total += Decimal(str(amount or 0))
+
+        return acc, counted
+
+    def _record(self, db: Session, counted: Dict[str, List[int]]) -> None:
+        rows = [{"kind": kind, "entity_id": entity_id} for kind, ids in counted.items() for entity_id in ids]
+        for start in range(0, len(rows), self.batch_size):
+            db.execute(upsert(db, MarketRollupEvent).on_conflict_do_nothing(), rows[start:start + self.batch_size])
+
+    def _state(self, db: Session) -> MarketRollupState:
+        state = db.query(MarketRollupState).filter(MarketRollupState.name == STATE_NAME).first()
+        if state is None:
+            state = MarketRollupState(name=STATE_NAME)
+            db.add(state)
+        return state
+
+    def rebuild(self, db: Session) -> Dict[str, Any]:
+        """Recompute all rollups from the full history."""
+        until = datetime.now(timezone.utc)
+        acc, counted = self._collect(db, None, until)
+
+        db.query(MarketRollup).delete(synchronize_session=False)
+        db.query(MarketRollupEvent).delete(synchronize_session=False)
+        self._record(db, counted)
+        for (dimension, key), item in acc.items():
+            row = MarketRollup(dimension=dimension, key=key)
+            item.apply_to(row)
+            db.add(row)
+        state = self._state(db)
+        state.watermark = until
+        state.rebuilt_at = until
+        db.commit()
+        logger.info(f"Market rollups rebuilt: {len(acc)} keys")
+        return {"keys": len(acc), "watermark": until.isoformat()}
+
+    def refresh(self, db: Session) -> Dict[str, Any]:
+        """Fold activity since the last watermark into the existing rollups."""
+        state = self._state(db)
+        if state.watermark is None:
+            return self.rebuild(db)
+        until = datetime.now(timezone.utc)
+        since = state.watermark
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        acc, counted = self._collect(db, since, until)
+
+        self._record(db, counted)
+        if acc:
+            existing = {
+                (row.dimension, row.key): row
+                for row in db.query(MarketRollup).filter(self._keys_filter(acc.keys()))
+            }
+            for key, item in acc.items():
+                row = existing.get(key)
+                if row is None:
+                    row = MarketRollup(dimension=key[0], key=key[1])
+                    db.add(row)
+                item.apply_to(row)
+        state.watermark = until
+        db.commit()
+        return {"keys": len(acc), "watermark": until.isoformat()}
+
+    @staticmethod
+    def _keys_filter(keys: Iterable[RollupKey]):
+        by_dimension: Dict[str, List[str]] = {}
+        for dimension, key in keys:
+            by_dimension.setdefault(dimension, []).append(key)
+        return or_(*[
+            and_(MarketRollup.dimension == dimension, MarketRollup.key.in_(values))
+            for dimension, values in by_dimension.items()
+        ])
+
+    def lookup(self, db: Session, category: Optional[str], skills: Optional[Iterable[Any]]) -> Dict[RollupKey, MarketRollup]:
+        """Fetch the rollups for a category and its skills in one indexed query."""
+        keys = task_keys(category, skills)
+        if not keys:
+            return {}
+        rows = db.query(MarketRollup).filter(self._keys_filter(keys)).all()
+        return {(row.dimension, row.key): row for row in rows}
+
+
+market_rollup_service = MarketRollupService()
+
+
+@celery_app.task(name="app.services.market_rollup_service.rebuild_market_rollups")
+def rebuild_market_rollups() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return market_rollup_service.rebuild(db)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.services.market_rollup_service.refresh_market_rollups")
+def refresh_market_rollups() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return market_rollup_service.refresh(db)
+    finally:
+        db.close()
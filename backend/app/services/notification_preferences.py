@@ -0,0 +1,115 @@
+"""
+Compiled per-user notification preferences behind a bounded TTL cache.
+
+A user's notification_settings rows are folded into one UserPreferences object
+that answers "deliver this type on this channel?" with a dict lookup. Entries
+live for NOTIFICATION_PREFERENCES_TTL seconds, at most
+NOTIFICATION_PREFERENCES_CACHE_SIZE users are kept (least recently used go
+first), and the notification settings endpoints invalidate a user on every
+change. Other processes pick up a change when their entry expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.monitoring import record_preference_cache
+from app.db_models import NotificationSetting, NotificationType
+
+# Channels for types a user has no setting for; SMS is opt-in. In-app WebSocket
+# delivery is not a preference and always happens.
+DEFAULT_CHANNELS: FrozenSet[str] = frozenset({"email", "push"})
+
+
+class UserPreferences:
+    """Enabled channels per notification type for one user."""
+
+    __slots__ = ("user_id", "channels")
+
+    def __init__(self, user_id: int, channels: Optional[Dict[NotificationType, FrozenSet[str]]] = None):
+        self.user_id = user_id
+        self.channels = channels or {}
+
+    @classmethod
+    def compile(cls, user_id: int, rows: Iterable[NotificationSetting]) -> "UserPreferences":
+        channels = {}
+        for row in rows:
+            channels[row.notification_type] = frozenset(
+                channel for channel, enabled in (
+                    ("email", row.email_enabled is not False),
+                    ("push", row.push_enabled is not False),
+                    ("sms", bool(row.sms_enabled)),
+                ) if enabled
+            )
+        return cls(user_id, channels)
+
+    def allows(self, channel: str, notification_type: NotificationType) -> bool:
+        return channel in self.channels.get(notification_type, DEFAULT_CHANNELS)
+
+
+class PreferenceCache:
+    """Bounded LRU of compiled preferences, each valid for `ttl` seconds."""
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[float, UserPreferences]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate() so a load that raced with a settings change is not cached
+        self._generation = 0
+
+    def get(self, db: Session, user_id: int) -> UserPreferences:
+        return self.get_many(db, [user_id])[user_id]
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, UserPreferences]:
+        """Preferences for every user; misses are loaded together in one query."""
+        now = time.monotonic()
+        found: Dict[int, UserPreferences] = {}
+        missing = []
+        with self._lock:
+            generation = self._generation
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+        record_preference_cache("hit", len(found))
+        if not missing:
+            return found
+        record_preference_cache("miss", len(missing))
+
+        rows: Dict[int, list] = {user_id: [] for user_id in missing}
+        for row in db.query(NotificationSetting).filter(NotificationSetting.user_id.in_(missing)):
+            rows[row.user_id].append(row)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for user_id, user_rows in rows.items():
+                preferences = UserPreferences.compile(user_id, user_rows)
+                found[user_id] = preferences
+                if generation == self._generation:
+                    self._entries[user_id] = (expires, preferences)
+                    self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return found
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+notification_preferences = PreferenceCache(
+    ttl=settings.NOTIFICATION_PREFERENCES_TTL,
+    max_size=settings.NOTIFICATION_PREFERENCES_CACHE_SIZE,
+)
@@ -0,0 +1,269 @@
+"""
+Notification retention: expired notifications leave the live table in batches.
+
+A notification expires NOTIFICATION_RETENTION_DAYS after it was created, or
+after its type's entry in NOTIFICATION_RETENTION_DAYS_BY_TYPE. Expired rows are
+moved oldest first, one short transaction per batch: copied to
+notifications_archive (or appended to gzipped JSONL files), deleted together
+with their outbox rows, and unread ones are taken off the owner's unread
+counter. The job is throttled to a duty cycle, sleeping after every batch in
+proportion to how long the batch took, and stops when its time budget is spent;
+whatever is left waits for the next run.
+
+On Postgres the notifications table is range-partitioned by month on
+created_at, so queries bounded by created_at only touch recent partitions. The
+job creates partitions ahead of time and drops old ones once archival has
+emptied them.
+"""
+
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, insert, or_, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import record_notification_archive
+from app.database import SessionLocal
+from app.db_models import Notification, NotificationArchive, NotificationOutbox, NotificationType
+from app.services.unread_counters import unread_counters
+
+logger = get_logger(__name__)
+
+BACKENDS = ("table", "jsonl")
+PARTITION_PREFIX = "notifications_p"
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'notifications' AND pg_table_is_visible(c.oid)"
+    )).first() is not None
+
+
+def partitions(db: Session) -> List[str]:
+    return [row[0] for row in db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'notifications' AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+    ))]
+
+
+class JsonlArchive:
+    """Appends archived rows to one gzipped JSONL file per run."""
+
+    def __init__(self, directory: str, started: datetime):
+        self.path = os.path.join(directory, f"notifications-{started:%Y%m%dT%H%M%S}.jsonl.gz")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        """Append a batch as one gzip member and fsync it before the rows are deleted."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                for record in records:
+                    archive.write(json.dumps(record, default=_json_default, separators=(",", ":")).encode())
+                    archive.write(b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+class NotificationRetention:
+    """Moves expired notifications out of the live table and maintains its partitions."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        default_days: int = 365,
+        days_by_type: Optional[Dict[str, int]] = None,
+        backend: str = "table",
+        archive_dir: str = "archive/notifications",
+        batch_size: int = 1000,
+        duty_cycle: float = 0.25,
+        max_seconds: float = 600.0,
+        months_ahead: int = 3,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown notification archive backend {backend!r}, expected one of {BACKENDS}")
+        if not 0 < duty_cycle <= 1:
+            raise ValueError("duty_cycle must be in (0, 1]")
+        self.session_factory = session_factory
+        self.default_days = default_days
+        self.days_by_type = {
+            NotificationType(name.lower()): days for name, days in (days_by_type or {}).items()
+        }
+        self.backend = backend
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.max_seconds = max_seconds
+        self.months_ahead = months_ahead
+        self.sleep = sleep
+
+    def _expired(self, now: datetime):
+        """Filter for notifications past their retention; the overall bound keeps it on the created_at index."""
+        default_cutoff = now - timedelta(days=self.default_days)
+        if not self.days_by_type:
+            return Notification.created_at < default_cutoff
+        newest_cutoff = now - timedelta(days=min(self.default_days, *self.days_by_type.values()))
+        return and_(
+            Notification.created_at < newest_cutoff,
+            or_(
+                Notification.type.notin_(list(self.days_by_type)) & (Notification.created_at < default_cutoff),
+                *(
+                    (Notification.type == notification_type) & (Notification.created_at < now - timedelta(days=days))
+                    for notification_type, days in self.days_by_type.items()
+                ),
+            ),
+        )
+
+    def archive_batch(self, db: Session, now: datetime, jsonl: Optional[JsonlArchive] = None) -> int:
+        """Move up to batch_size expired notifications in one transaction."""
+        rows = db.execute(
+            select(Notification.__table__)
+            .where(self._expired(now))
+            .order_by(Notification.created_at, Notification.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).mappings().all()
+        if not rows:
+            db.rollback()
+            return 0
+
+        records = [{**row, "type": row["type"].name} for row in rows]
+        if jsonl is not None:
+            jsonl.write(records)
+        else:
+            db.execute(insert(NotificationArchive), records)
+
+        ids = [row["id"] for row in rows]
+        newest = max(row["created_at"] for row in rows)
+        db.execute(delete(NotificationOutbox).where(NotificationOutbox.notification_id.in_(ids)))
+        # The created_at bound lets Postgres skip partitions that cannot hold the rows
+        db.execute(delete(Notification).where(Notification.id.in_(ids), Notification.created_at <= newest))
+        unread: Dict[int, int] = defaultdict(int)
+        for row in rows:
+            if not row["is_read"]:
+                unread[row["user_id"]] -= 1
+        if unread:
+            unread_counters.increment(db, "notifications", unread)
+        db.commit()
+        return len(rows)
+
+    def ensure_partitions(self, db: Session, now: datetime) -> List[str]:
+        """Create the monthly partitions for this month and the next months_ahead."""
+        existing = set(partitions(db))
+        created = []
+        month = _month_start(now)
+        for _ in range(self.months_ahead + 1):
+            following = _add_months(month, 1)
+            name = f"{PARTITION_PREFIX}{month:%Y%m}"
+            if name not in existing:
+                try:
+                    db.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF notifications "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{following:%Y-%m-%d} 00:00:00+00')"
+                    ))
+                    db.commit()
+                    created.append(name)
+                except Exception as e:
+                    # Fails when the default partition already holds rows for that month
+                    db.rollback()
+                    logger.error(f"Could not create notification partition {name}: {e}")
+            month = following
+        return created
+
+    def drop_empty_partitions(self, db: Session, now: datetime) -> List[str]:
+        """Drop monthly partitions that are past every retention period and already archived."""
+        oldest_cutoff = now - timedelta(days=max([self.default_days, *self.days_by_type.values()]))
+        dropped = []
+        for name in partitions(db):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").replace(tzinfo=timezone.utc)
+            if _add_months(month, 1) > oldest_cutoff:
+                continue
+            if db.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is not None:
+                continue
+            db.execute(text(f"ALTER TABLE notifications DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            dropped.append(name)
+        return dropped
+
+    def run(self) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        deadline = time.monotonic() + self.max_seconds
+        jsonl = JsonlArchive(self.archive_dir, now) if self.backend == "jsonl" else None
+        archived = batches = 0
+        created: List[str] = []
+        dropped: List[str] = []
+        db = self.session_factory()
+        try:
+            partitioned = is_partitioned(db)
+            if partitioned:
+                created = self.ensure_partitions(db, now)
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                moved = self.archive_batch(db, now, jsonl)
+                if not moved:
+                    break
+                elapsed = time.monotonic() - started
+                record_notification_archive(self.backend, moved, elapsed)
+                archived += moved
+                batches += 1
+                if moved < self.batch_size:
+                    break
+                # Work for duty_cycle of the wall time, leave the rest to live traffic
+                self.sleep(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+            if partitioned:
+                dropped = self.drop_empty_partitions(db, now)
+        finally:
+            db.close()
+        logger.info(f"Archived {archived} notifications in {batches} batches to {self.backend}")
+        return {
+            "archived": archived,
+            "batches": batches,
+            "partitions_created": created,
+            "partitions_dropped": dropped,
+        }
+
+
+def create_notification_retention() -> NotificationRetention:
+    return NotificationRetention(
+        default_days=settings.NOTIFICATION_RETENTION_DAYS,
+        days_by_type=settings.NOTIFICATION_RETENTION_DAYS_BY_TYPE,
+        backend=settings.NOTIFICATION_ARCHIVE_BACKEND,
+        archive_dir=settings.NOTIFICATION_ARCHIVE_DIR,
+        batch_size=settings.NOTIFICATION_ARCHIVE_BATCH_SIZE,
+        duty_cycle=settings.NOTIFICATION_ARCHIVE_DUTY_CYCLE,
+        max_seconds=settings.NOTIFICATION_ARCHIVE_MAX_SECONDS,
+        months_ahead=settings.NOTIFICATION_PARTITION_MONTHS_AHEAD,
+    )
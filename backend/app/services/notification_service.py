@@ -1,34 +1,63 @@
 import asyncio
 import json
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app.db_models import User
-from app.schemas import Notification, NotificationCreate, NotificationType
-from app.crud_utils import create_notification
-from app.crud import notification_settings as notification_settings_crud
+from app.celery import celery_app
+from app.core.config import settings as app_settings
+from app.core.monitoring import record_bulk_notifications
+from app.database import SessionLocal
+from app.db_models import (
+    User, Notification as DBNotification, NotificationOutbox,
+    NotificationType as DBNotificationType
+)
+from app.schemas import Notification, NotificationType
+from app.services.digest_service import create_digest_builder
+from app.services.email_service import create_email_service
+from app.services.notification_preferences import PreferenceCache, UserPreferences, notification_preferences
+from app.services.notification_retention import create_notification_retention
+from app.services.outbox_dispatcher import create_outbox_dispatcher, outbox_row
+from app.services.unread_counters import unread_counters
+from app.websockets.notification_manager import notification_manager
+
+EMAIL_TYPES = {
+    "task_created": "task_created",
+    "application_received": "application_received",
+    "application_accepted": "application_accepted",
+    "application_rejected": "application_rejected",
+    "task_completed": "task_completed",
+    "payment_received": "payment_received",
+    "review_received": "review_received",
+    "system_message": "system_alert",
+}
+
+
+def _websocket_payload(notification, category: str, priority: str) -> dict:
+    return {
+        "type": "notification",
+        "data": {
+            "id": notification.id,
+            "title": notification.title,
+            "message": notification.message,
+            "notification_type": getattr(notification.type, "value", notification.type),
+            "category": category,
+            "priority": priority,
+            "created_at": notification.created_at.isoformat() if notification.created_at else None,
+            "data": notification.data,
+        },
+    }
+
 
 class NotificationService:
-    def __init__(self, email_service=None):
-        self.websocket_connections: Dict[int, List[Any]] = {}
+    def __init__(self, email_service=None, preferences: Optional[PreferenceCache] = None):
         self.email_service = email_service
+        self.preferences = preferences or notification_preferences
 
     async def send_websocket_notification(self, user_id: int, notification_data: dict):
         """Send notification via WebSocket"""
-        if user_id in self.websocket_connections:
-            disconnected = []
-            for websocket in self.websocket_connections[user_id]:
-                try:
-                    await websocket.send_text(json.dumps(notification_data))
-                except Exception:
-                    disconnected.append(websocket)
-            for websocket in disconnected:
-                self.remove_websocket_connection(user_id, websocket)
-
-    def remove_websocket_connection(self, user_id: int, websocket: Any):
-        if user_id in self.websocket_connections:
-            self.websocket_connections[user_id] = [ws for ws in self.websocket_connections[user_id] if ws != websocket]
-            if not self.websocket_connections[user_id]:
-                del self.websocket_connections[user_id]
+        # Always logged, even when offline, so a quick reconnect can replay it
+        await notification_manager.send_personal_notification(user_id, notification_data)
 
     def send_notification(
         self,
@@ -43,48 +72,28 @@ class NotificationService:
         send_email: bool = True,
         send_push: bool = True
     ) -> Optional[Notification]:
-        """Send a notification to a user"""
-        # Check user's notification settings
-        settings = notification_settings_crud.get_notification_settings(db, user_id=user_id)
-        # If settings exist, check notification type and quiet hours
-        if settings:
-            # Check if this notification type is enabled
-            # (Assume all enabled for now, as is_notification_enabled is not implemented)
-            pass
-        # Create notification in database
-        notification_create = NotificationCreate(
+        """Send a notification to a user; delivery goes through the outbox"""
+        db_type = DBNotificationType[self._safe_notification_type(notification_type).name]
+        preferences = self.preferences.get_many(db, [user_id])
+        notification = DBNotification(
             user_id=user_id,
             title=title,
             message=message,
-            type=self._safe_notification_type(notification_type),
+            type=db_type,
             data=data or {}
         )
-        notification = create_notification(db, notification_create, user_id)
-        # Send via WebSocket (in-app notification)
-        asyncio.create_task(
-            self.send_websocket_notification(
-                user_id,
-                {
-                    "type": "notification",
-                    "data": {
-                        "id": notification.id,
-                        "title": notification.title,
-                        "message": notification.message,
-                        "notification_type": notification.type,
-                        "category": category,
-                        "priority": priority,
-                        "created_at": notification.created_at.isoformat(),
-                        "data": notification.data,
-                    },
-                },
-            )
+        db.add(notification)
+        db.flush()
+        # Same transaction as the notification: either both exist or neither does
+        db.execute(
+            insert(NotificationOutbox),
+            self._outbox_rows([notification], category, priority, preferences, send_email, send_push)
         )
-        # Send email notification
-        if send_email and self.email_service is not None:
-            self._send_email_notification(db, user_id, notification)
-        # Send push notification (for desktop app)
-        if send_push:
-            self._send_push_notification(user_id, notification)
+        unread_counters.increment(db, "notifications", {user_id: 1})
+        db.commit()
+        db.refresh(notification)
+        notification_outbox.wake()
+        unread_counters.publish(db, [user_id])
         return notification
 
     def _safe_notification_type(self, notification_type: str) -> NotificationType:
@@ -93,47 +102,76 @@ class NotificationService:
         except Exception:
             return NotificationType.SYSTEM_MESSAGE
 
-    def _send_email_notification(self, db: Session, user_id: int, notification: Notification):
-        """Send email notification"""
-        try:
-            user = db.query(User).filter(User.id == user_id).first()
-            if user is None or getattr(user, "email", None) is None:
-                return
-            email_type_mapping = {
-                NotificationType.TASK_CREATED: "task_created",
-                NotificationType.APPLICATION_RECEIVED: "application_received",
-                NotificationType.APPLICATION_ACCEPTED: "application_accepted",
-                NotificationType.APPLICATION_REJECTED: "application_rejected",
-                NotificationType.TASK_COMPLETED: "task_completed",
-                NotificationType.PAYMENT_RECEIVED: "payment_received",
-                NotificationType.REVIEW_RECEIVED: "review_received",
-                NotificationType.SYSTEM_MESSAGE: "system_alert",
-            }
-            email_type = email_type_mapping.get(notification.type, "system_alert")
-            email_data = {
-                "title": notification.title,
-                "message": notification.message,
-                "notification_type": notification.type,
-                "category": notification.data.get("category", "general") if notification.data else "general",
-                "priority": notification.data.get("priority", "normal") if notification.data else "normal",
-                **(notification.data or {}),
-            }
-            if self.email_service is not None:
-                self.email_service.send_notification_email(
-                    to_email=user.email,
-                    to_name=getattr(user, 'username', None),
-                    notification_type=email_type,
-                    notification_data=email_data,
-                )
-        except Exception as e:
-            print(f"Failed to send email notification: {e}")
+    def _outbox_rows(
+        self,
+        notifications: List[DBNotification],
+        category: str,
+        priority: str,
+        preferences: Dict[int, UserPreferences],
+        send_email: bool,
+        send_push: bool
+    ) -> List[Dict[str, Any]]:
+        rows = []
+        for notification in notifications:
+            user_preferences = preferences[notification.user_id]
+            rows.append(outbox_row(
+                notification.id, notification.user_id, "websocket",
+                _websocket_payload(notification, category, priority)
+            ))
+            if send_email and self.email_service is not None and user_preferences.allows("email", notification.type):
+                rows.append(outbox_row(notification.id, notification.user_id, "email"))
+            if send_push and user_preferences.allows("push", notification.type):
+                rows.append(outbox_row(notification.id, notification.user_id, "push", {"title": notification.title}))
+        return rows
+
+    def _email_content(self, notification: DBNotification) -> Tuple[str, Dict[str, Any]]:
+        email_type = EMAIL_TYPES.get(getattr(notification.type, "value", notification.type), "system_alert")
+        email_data = {
+            "title": notification.title,
+            "message": notification.message,
+            "notification_type": getattr(notification.type, "value", notification.type),
+            "category": notification.data.get("category", "general") if notification.data else "general",
+            "priority": notification.data.get("priority", "normal") if notification.data else "normal",
+            **(notification.data or {}),
+        }
+        return email_type, email_data
 
-    def _send_push_notification(self, user_id: int, notification: Notification):
+    def _send_push_notification(self, user_id: int, title: str):
         """Send push notification for desktop app"""
+        print(f"Push notification for user {user_id}: {title}")
+
+    async def deliver_websocket(self, entry: Dict[str, Any]) -> None:
+        await self.send_websocket_notification(entry["user_id"], entry["payload"])
+
+    async def deliver_email(self, entry: Dict[str, Any]) -> None:
+        await run_in_threadpool(self._deliver_email, entry["notification_id"])
+
+    def _deliver_email(self, notification_id: int) -> None:
+        db = SessionLocal()
         try:
-            print(f"Push notification for user {user_id}: {notification.title}")
-        except Exception as e:
-            print(f"Failed to send push notification: {e}")
+            row = db.query(DBNotification, User.email, User.username).join(
+                User, User.id == DBNotification.user_id
+            ).filter(DBNotification.id == notification_id).first()
+            if row is None or not row.email or self.email_service is None:
+                return
+            email_type, email_data = self._email_content(row[0])
+        finally:
+            db.close()
+        sent = self.email_service.send_notification_email(
+            to_email=row.email,
+            to_name=row.username,
+            notification_type=email_type,
+            notification_data=email_data,
+        )
+        if not sent:
+            # The outbox retries with backoff
+            raise RuntimeError(f"Email for notification {notification_id} was not sent")
+
+    async def deliver_push(self, entry: Dict[str, Any]) -> None:
+        # Only needed when the in-app socket can't show it
+        if notification_manager.is_online(entry["user_id"]):
+            return
+        await run_in_threadpool(self._send_push_notification, entry["user_id"], entry["payload"].get("title", ""))
 
     def send_bulk_notifications(
         self,
@@ -144,23 +182,44 @@ class NotificationService:
         notification_type: str = "system",
         category: str = "general",
         priority: str = "normal",
-        data: Optional[Dict[str, Any]] = None
+        data: Optional[Dict[str, Any]] = None,
+        send_email: bool = True,
+        send_push: bool = True
     ) -> List[Notification]:
-        """Send notifications to multiple users"""
+        """Send notifications to multiple users with chunked multi-row INSERTs; delivery goes through the outbox"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        notification_type_value = DBNotificationType[self._safe_notification_type(notification_type).name]
+        chunk_size = max(1, app_settings.NOTIFICATION_BULK_CHUNK_SIZE)
         notifications = []
-        for user_id in user_ids:
-            notification = self.send_notification(
-                db=db,
-                user_id=user_id,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                category=category,
-                priority=priority,
-                data=data,
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            created = db.scalars(
+                insert(DBNotification).returning(DBNotification, sort_by_parameter_order=True),
+                [
+                    {
+                        "user_id": user_id,
+                        "title": title,
+                        "message": message,
+                        "type": notification_type_value,
+                        "data": data or {},
+                    }
+                    for user_id in chunk
+                ],
+            ).all()
+            db.execute(
+                insert(NotificationOutbox),
+                self._outbox_rows(
+                    created, category, priority, self.preferences.get_many(db, chunk), send_email, send_push
+                )
             )
-            if notification:
-                notifications.append(notification)
+            unread_counters.increment(db, "notifications", {user_id: 1 for user_id in chunk})
+            db.commit()
+            notifications.extend(created)
+            record_bulk_notifications(len(created))
+            notification_outbox.wake()
+            unread_counters.publish(db, chunk)
         return notifications
 
     def send_task_notification(
@@ -336,3 +395,30 @@ class NotificationService:
         )
 
 notification_service = NotificationService()
+notification_outbox = create_outbox_dispatcher({
+    "websocket": notification_service.deliver_websocket,
+    "email": notification_service.deliver_email,
+    "push": notification_service.deliver_push,
+})
+
+
+@celery_app.task(name="app.services.notification_service.send_daily_digest")
+def send_daily_digest() -> Dict[str, Any]:
+    email_service = notification_service.email_service or create_email_service()
+    if email_service is None:
+        return {"users": 0, "sent": 0, "skipped": "email is not configured"}
+    return create_digest_builder(email_service).run()
+
+
+@celery_app.task(name="app.services.notification_service.reconcile_unread_counters")
+def reconcile_unread_counters() -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        return unread_counters.reconcile(db)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.services.notification_service.archive_expired_notifications")
+def archive_expired_notifications() -> Dict[str, Any]:
+    return create_notification_retention().run()
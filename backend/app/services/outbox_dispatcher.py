@@ -0,0 +1,245 @@
+"""
+Dispatcher for the notification outbox.
+
+Rows are written in the same transaction as their notification. The dispatcher
+claims due rows in batches and delivers them through per-channel handlers, with
+separate concurrency limits. Failures are retried with exponential backoff.
+Each (notification, channel) pair has a unique dedup key, so enqueueing twice is
+a no-op. A sent row is never claimed again; it is only re-sent if a dispatcher
+dies between delivering it and marking it sent.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import record_outbox_delivery
+from app.database import SessionLocal
+from app.db_models import NotificationOutbox
+
+logger = get_logger(__name__)
+
+PENDING = "pending"
+PROCESSING = "processing"
+SENT = "sent"
+FAILED = "failed"
+
+OutboxHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def outbox_row(notification_id: int, user_id: int, channel: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Values for one outbox INSERT; the dedup key makes enqueueing idempotent."""
+    return {
+        "notification_id": notification_id,
+        "user_id": user_id,
+        "channel": channel,
+        "dedup_key": f"{notification_id}:{channel}",
+        "payload": payload or {},
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": datetime.utcnow(),
+    }
+
+
+class OutboxDispatcher:
+    """Drains the notification outbox with a bounded number of deliveries per channel."""
+
+    def __init__(
+        self,
+        handlers: Dict[str, OutboxHandler],
+        concurrency: Optional[Dict[str, int]] = None,
+        session_factory: Callable = SessionLocal,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        claim_timeout: float = 300.0,
+    ):
+        self.handlers = handlers
+        self.concurrency = {channel: 1 for channel in handlers}
+        self.concurrency.update(concurrency or {})
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_timeout = claim_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Notification outbox dispatcher started: {self.concurrency}")
+
+    async def stop(self) -> None:
+        """Stop claiming; rows left pending or mid-delivery are picked up again on the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        """Check the outbox now instead of at the next poll. Safe from any thread."""
+        if self.loop is None or self._wakeup is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delivered = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification outbox dispatch failed: {e}")
+                delivered = 0
+            if delivered:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        """Claim and deliver one batch; returns how many rows were claimed."""
+        claimed = await run_in_threadpool(self._claim)
+        if not claimed:
+            return 0
+        results = await asyncio.gather(*(self._deliver(entry) for entry in claimed))
+        await run_in_threadpool(self._finish, list(zip(claimed, results)))
+        return len(claimed)
+
+    async def _deliver(self, entry: Dict[str, Any]) -> Optional[str]:
+        """None on success, else the error text."""
+        handler = self.handlers.get(entry["channel"])
+        if handler is None:
+            return f"No handler for channel {entry['channel']}"
+        limit = self._limits.get(entry["channel"])
+        if limit is None:
+            limit = self._limits[entry["channel"]] = asyncio.Semaphore(max(1, self.concurrency.get(entry["channel"], 1)))
+        started = time.monotonic()
+        async with limit:
+            try:
+                await handler(entry)
+            except Exception as e:
+                record_outbox_delivery(entry["channel"], "error", time.monotonic() - started)
+                return str(e) or e.__class__.__name__
+        record_outbox_delivery(entry["channel"], "sent", time.monotonic() - started)
+        return None
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            rows = db.query(NotificationOutbox).filter(or_(
+                and_(NotificationOutbox.status == PENDING, NotificationOutbox.next_attempt_at <= now),
+                # A dispatcher died mid-delivery
+                and_(
+                    NotificationOutbox.status == PROCESSING,
+                    NotificationOutbox.claimed_at <= now - timedelta(seconds=self.claim_timeout),
+                ),
+            )).order_by(NotificationOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            claimed = []
+            for row in rows:
+                row.status = PROCESSING
+                row.claimed_at = now
+                claimed.append({
+                    "id": row.id,
+                    "notification_id": row.notification_id,
+                    "user_id": row.user_id,
+                    "channel": row.channel,
+                    "payload": row.payload or {},
+                    "attempts": row.attempts,
+                })
+            db.commit()
+            return claimed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base ** attempts)
+
+    def _finish(self, results: List[Tuple[Dict[str, Any], Optional[str]]]) -> None:
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            rows = {
+                row.id: row for row in
+                db.query(NotificationOutbox).filter(NotificationOutbox.id.in_([entry["id"] for entry, _ in results]))
+            }
+            for entry, error in results:
+                row = rows.get(entry["id"])
+                if row is None:
+                    continue
+                if error is None:
+                    row.status = SENT
+                    row.sent_at = now
+                    row.last_error = None
+                    continue
+                row.attempts = (row.attempts or 0) + 1
+                row.last_error = error[:1000]
+                if row.attempts >= self.max_attempts:
+                    row.status = FAILED
+                    record_outbox_delivery(row.channel, "failed", 0.0)
+                    logger.error(f"Giving up on {row.channel} delivery {row.dedup_key}: {error}")
+                else:
+                    row.status = PENDING
+                    row.next_attempt_at = now + timedelta(seconds=self.backoff(row.attempts))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self, db) -> Dict[str, int]:
+        """Row counts per status, for the admin view and alerts."""
+        return dict(
+            db.query(NotificationOutbox.status, func.count(NotificationOutbox.id))
+            .group_by(NotificationOutbox.status).all()
+        )
+
+
+def create_outbox_dispatcher(handlers: Dict[str, OutboxHandler]) -> OutboxDispatcher:
+    return OutboxDispatcher(
+        handlers,
+        concurrency={
+            "websocket": settings.OUTBOX_WEBSOCKET_CONCURRENCY,
+            "email": settings.OUTBOX_EMAIL_CONCURRENCY,
+            "push": settings.OUTBOX_PUSH_CONCURRENCY,
+        },
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+        poll_interval=settings.OUTBOX_POLL_INTERVAL,
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+        backoff_base=settings.OUTBOX_BACKOFF_BASE,
+        backoff_max=settings.OUTBOX_BACKOFF_MAX,
+    )
@@ -0,0 +1,117 @@
+"""
+Per-chat read watermarks.
+
+A member's progress through a chat is one chat_reads row holding the id of the
+last message they have read; every message at or below it is read. Marking
+read is a single upsert that only moves the watermark forward, so a late or
+repeated request cannot un-read anything. A member's unread messages are the
+ones above their watermark that they did not send, an index range scan on
+messages (chat_id, id). Reading a whole chat moves the watermark to its newest
+message, however many messages that covers.
+"""
+
+from typing import Dict, Iterable
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Query, Session
+
+from app.database import upsert
+from app.db_models import ChatRead, Message
+from app.services.unread_counters import unread_counters
+
+
+class ReadReceipts:
+    """Reads and advances chat read watermarks, keeping unread counters in step."""
+
+    def watermarks(self, db: Session, chat_id: int) -> Dict[int, int]:
+        return dict(
+            db.query(ChatRead.user_id, ChatRead.last_read_message_id).filter(ChatRead.chat_id == chat_id)
+        )
+
+    def watermark(self, db: Session, chat_id: int, user_id: int) -> int:
+        return db.query(ChatRead.last_read_message_id).filter(
+            ChatRead.chat_id == chat_id, ChatRead.user_id == user_id
+        ).scalar() or 0
+
+    def _advance(self, db: Session, user_id: int, marks: Dict[int, int]) -> None:
+        """Upsert watermarks for {chat_id: message_id}, never moving one backwards."""
+        rows = [
+            {"chat_id": chat_id, "user_id": user_id, "last_read_message_id": message_id}
+            for chat_id, message_id in sorted(marks.items())
+        ]
+        if not rows:
+            return
+        stmt = upsert(db, ChatRead)
+        current = ChatRead.last_read_message_id
+        proposed = stmt.excluded.last_read_message_id
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ChatRead.chat_id, ChatRead.user_id],
+                set_={
+                    "last_read_message_id": case((proposed > current, proposed), else_=current),
+                    "read_at": func.now(),
+                },
+            ),
+            rows,
+        )
+
+    def mark_read(self, db: Session, user_id: int, chat_id: int, message_id: int) -> int:
+        """Read the chat up to message_id; returns how many messages became read."""
+        current = self.watermark(db, chat_id, user_id)
+        if message_id <= current:
+            return 0
+        newly_read = db.query(func.count(Message.id)).filter(
+            Message.chat_id == chat_id,
+            Message.id > current,
+            Message.id <= message_id,
+            Message.sender_id != user_id,
+        ).scalar()
+        self._advance(db, user_id, {chat_id: message_id})
+        if newly_read:
+            unread_counters.increment(db, "messages", {user_id: -newly_read})
+        return newly_read
+
+    def mark_chat_read(self, db: Session, user_id: int, chat_id: int) -> int:
+        latest = db.query(func.max(Message.id)).filter(Message.chat_id == chat_id).scalar()
+        return self.mark_read(db, user_id, chat_id, latest) if latest else 0
+
+    def mark_all_read(self, db: Session, user_id: int, chat_ids) -> int:
+        """Read every given chat up to its newest message; returns the unread count that was cleared."""
+        latest = dict(
+            db.query(Message.chat_id, func.max(Message.id))
+            .filter(Message.chat_id.in_(chat_ids))
+            .group_by(Message.chat_id)
+        )
+        cleared = unread_counters.get(db, user_id)["messages"]
+        self._advance(db, user_id, latest)
+        unread_counters.reset(db, "messages", user_id)
+        return cleared
+
+    def unread(self, db: Session, user_id: int, chat_ids) -> Query:
+        """Messages in the given chats above the user's watermark, not sent by the user."""
+        return (
+            db.query(Message)
+            .outerjoin(ChatRead, and_(ChatRead.chat_id == Message.chat_id, ChatRead.user_id == user_id))
+            .filter(
+                Message.chat_id.in_(chat_ids),
+                Message.sender_id != user_id,
+                Message.id > func.coalesce(ChatRead.last_read_message_id, 0),
+            )
+        )
+
+    def read_flags(self, db: Session, user_id: int, chat_id: int, messages: Iterable[Message]) -> Dict[int, bool]:
+        """Per-message read ticks as `user_id` sees them.
+
+        Another member's message is read once the user has read it. The user's
+        own message is read once any other member has.
+        """
+        marks = self.watermarks(db, chat_id)
+        mine = marks.get(user_id, 0)
+        others = max((mark for member, mark in marks.items() if member != user_id), default=0)
+        return {
+            message.id: message.id <= (others if message.sender_id == user_id else mine)
+            for message in messages
+        }
+
+
+read_receipts = ReadReceipts()
@@ -0,0 +1,280 @@
+"""
+Pooled SMTP connections shared by every EmailService that talks to the same provider.
+
+Each connection does STARTTLS and login once and then carries many messages.
+A token bucket caps the send rate per provider. Use a local debugging server
+to try it out, for example `python -m aiosmtpd -n -l localhost:1025` with
+SMTP_USE_TLS=false and no credentials.
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.message import Message
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import record_email_send, record_smtp_connection
+
+logger = get_logger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token bucket; `rate` messages per second, 0 for no limit."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PooledConnection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Up to `size` authenticated SMTP sessions, reused across messages and threads."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = True,
+        size: int = 4,
+        rate_limit: float = 0.0,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 60.0,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = max(1, size)
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._sent_at: Deque[float] = deque(maxlen=10000)
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+
+    def _open(self) -> PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._quit(smtp)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        record_smtp_connection("opened")
+        return PooledConnection(smtp)
+
+    @staticmethod
+    def _quit(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _usable(self, connection: PooledConnection) -> bool:
+        if connection.messages >= self.max_messages_per_connection:
+            return False
+        if time.monotonic() - connection.last_used < self.idle_timeout:
+            return True
+        # Idle long enough that the server may have dropped it
+        try:
+            return connection.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Check out a live session; it goes back to the pool unless it broke."""
+        self._slots.acquire()
+        connection = None
+        try:
+            while connection is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = self._open()
+                    break
+                if self._usable(candidate):
+                    connection = candidate
+                    record_smtp_connection("reused")
+                else:
+                    self._quit(candidate.smtp)
+                    record_smtp_connection("retired")
+            yield connection
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+            if connection is not None:
+                self._quit(connection.smtp)
+                record_smtp_connection("dropped")
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                connection.last_used = time.monotonic()
+                self._idle.put(connection)
+            self._slots.release()
+
+    def _send_on(self, connection: PooledConnection, message: Message) -> None:
+        self.limiter.acquire()
+        started = time.monotonic()
+        connection.smtp.send_message(message)
+        connection.messages += 1
+        record_email_send("sent", time.monotonic() - started)
+        with self._lock:
+            self.sent += 1
+            self._sent_at.append(time.monotonic())
+
+    def send(self, message: Message) -> bool:
+        """Send one message, reconnecting once if the pooled session was dropped."""
+        for attempt in range(2):
+            try:
+                with self.connection() as connection:
+                    self._send_on(connection, message)
+                return True
+            except smtplib.SMTPServerDisconnected:
+                if attempt == 0:
+                    continue
+                self._failed(message, "disconnected")
+            except Exception as e:
+                self._failed(message, e)
+                return False
+        return False
+
+    def send_many(self, messages: Iterable[Message]) -> int:
+        """Send a batch over as few sessions as possible; returns how many were accepted."""
+        pending: List[Message] = list(messages)
+        sent = 0
+        # A dropped session is reopened once; a second drop with no send in between gives up
+        retried = False
+        while pending:
+            try:
+                with self.connection() as connection:
+                    while pending and connection.messages < self.max_messages_per_connection:
+                        try:
+                            self._send_on(connection, pending[0])
+                            sent += 1
+                            retried = False
+                        except smtplib.SMTPRecipientsRefused as e:
+                            # The session is fine; only this message is rejected
+                            self._failed(pending[0], e)
+                        pending.pop(0)
+            except smtplib.SMTPServerDisconnected:
+                if retried:
+                    for message in pending:
+                        self._failed(message, "disconnected")
+                    break
+                retried = True
+            except Exception as e:
+                if pending:
+                    self._failed(pending.pop(0), e)
+        return sent
+
+    async def send_async(self, message: Message) -> bool:
+        return await run_in_threadpool(self.send, message)
+
+    async def send_many_async(self, messages: Iterable[Message]) -> int:
+        return await run_in_threadpool(self.send_many, list(messages))
+
+    def _failed(self, message: Message, error: Any) -> None:
+        with self._lock:
+            self.failed += 1
+        record_email_send("failed", 0.0)
+        logger.error(f"Failed to send email to {message.get('To')}: {error}")
+
+    def throughput(self, window: float = 60.0) -> float:
+        """Messages accepted per second over the trailing window."""
+        now = time.monotonic()
+        with self._lock:
+            recent = [sent_at for sent_at in self._sent_at if now - sent_at <= window]
+        if len(recent) < 2:
+            return float(len(recent)) / window if recent else 0.0
+        return len(recent) / max(now - recent[0], 1e-6)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "pool_size": self.size,
+            "idle_connections": self._idle.qsize(),
+            "connections_opened": self.connections_opened,
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limit_per_second": self.limiter.rate,
+            "throughput_per_second": round(self.throughput(), 3),
+        }
+
+    def close(self) -> None:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(connection.smtp)
+
+
+_pools: Dict[Tuple[str, int, str], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: str = "", password: str = "") -> SMTPConnectionPool:
+    """One pool per provider account, so its rate limit holds across services."""
+    key = (host, port, username)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SMTPConnectionPool(
+                host,
+                port,
+                username,
+                password,
+                use_tls=settings.SMTP_USE_TLS,
+                size=settings.SMTP_POOL_SIZE,
+                rate_limit=settings.SMTP_RATE_LIMIT,
+                max_messages_per_connection=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+                idle_timeout=settings.SMTP_IDLE_TIMEOUT,
+            )
+        return _pools[key]
@@ -0,0 +1,194 @@
+"""
+Per-user unread counters for notifications and chat messages.
+
+Counts live in unread_counters and are adjusted in the same transaction as the
+write that changes them: notification and message inserts, mark-read,
+mark-all-read and deletes. Reading a count is a primary key lookup. Increments
+are upserts in user id order, so concurrent writers do not deadlock. A periodic
+reconcile recomputes the true counts and fixes any drift. It uses
+compare-and-set, so it never overwrites a change that landed while it ran.
+Changed counts are pushed to online users as an `unread_counts` event.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, update
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.core.monitoring import record_unread_drift
+from app.database import upsert
+from app.db_models import ChatMember, ChatRead, Message, Notification, UnreadCounter
+from app.services.chat_membership import chat_recipients
+from app.websockets.notification_manager import notification_manager
+
+logger = get_logger(__name__)
+
+KINDS = ("notifications", "messages")
+
+
+def message_deltas(db: Session, messages: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Unread increments caused by new (chat_id, sender_id) messages."""
+    messages = list(messages)
+    recipients = chat_recipients(db, (chat_id for chat_id, _ in messages))
+    deltas: Dict[int, int] = defaultdict(int)
+    for chat_id, sender_id in messages:
+        for user_id in recipients.get(chat_id, ()):
+            if user_id != sender_id:
+                deltas[user_id] += 1
+    return deltas
+
+
+def _unread_messages(db: Session):
+    """Per member: messages above their read watermark that someone else sent."""
+    return (
+        db.query(ChatMember.user_id, func.count(Message.id))
+        .outerjoin(ChatRead, and_(ChatRead.chat_id == ChatMember.chat_id, ChatRead.user_id == ChatMember.user_id))
+        .join(Message, and_(
+            Message.chat_id == ChatMember.chat_id,
+            Message.id > func.coalesce(ChatRead.last_read_message_id, 0),
+            Message.sender_id != ChatMember.user_id,
+        ))
+    )
+
+
+def removed_message_deltas(db: Session, chat_id: int, message_id: Optional[int] = None) -> Dict[int, int]:
+    """Unread decrements for deleting one message of a chat, or all of them. Call before the delete."""
+    query = _unread_messages(db).filter(ChatMember.chat_id == chat_id)
+    if message_id is not None:
+        query = query.filter(Message.id == message_id)
+    return {user_id: -count for user_id, count in query.group_by(ChatMember.user_id)}
+
+
+class UnreadCounterService:
+    """Maintains, reads, reconciles and pushes per-user unread counts."""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        """Remember the event loop so sync handlers can push count changes."""
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self.loop = None
+
+    def increment(self, db: Session, kind: str, deltas: Dict[int, int]) -> None:
+        """Apply per-user deltas inside the caller's transaction; counts never go below zero."""
+        column = getattr(UnreadCounter, kind)
+        rows = [
+            {"user_id": user_id, "notifications": 0, "messages": 0, kind: delta}
+            for user_id, delta in sorted(deltas.items()) if delta > 0
+        ]
+        if rows:
+            stmt = upsert(db, UnreadCounter)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[UnreadCounter.user_id],
+                    set_={kind: column + stmt.excluded[kind], "updated_at": func.now()},
+                ),
+                rows,
+            )
+        for user_id, delta in sorted(deltas.items()):
+            if delta < 0:
+                db.execute(
+                    update(UnreadCounter)
+                    .where(UnreadCounter.user_id == user_id)
+                    .values({kind: case((column + delta < 0, 0), else_=column + delta)})
+                )
+
+    def reset(self, db: Session, kind: str, user_id: int) -> None:
+        db.execute(update(UnreadCounter).where(UnreadCounter.user_id == user_id).values({kind: 0}))
+
+    def counts(self, db: Session, user_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+        user_ids = list(user_ids)
+        found = {
+            row.user_id: {"notifications": row.notifications, "messages": row.messages}
+            for row in db.query(UnreadCounter).filter(UnreadCounter.user_id.in_(user_ids))
+        }
+        return {user_id: found.get(user_id, {"notifications": 0, "messages": 0}) for user_id in user_ids}
+
+    def get(self, db: Session, user_id: int) -> Dict[str, int]:
+        return self.counts(db, [user_id])[user_id]
+
+    def publish(self, db: Session, user_ids: Iterable[int]) -> None:
+        """Push current counts to the given users that are online. Call after commit, from any thread."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        online = notification_manager.online_users(set(user_ids))
+        if not online:
+            return
+        for user_id, counts in self.counts(db, online).items():
+            self._schedule(notification_manager.send_personal_notification(
+                user_id, {"type": "unread_counts", **counts}
+            ))
+
+    def _schedule(self, coroutine) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def _true_counts(self, db: Session) -> Dict[int, Dict[str, int]]:
+        truth: Dict[int, Dict[str, int]] = defaultdict(lambda: {"notifications": 0, "messages": 0})
+        for user_id, count in (
+            db.query(Notification.user_id, func.count(Notification.id))
+            .filter(Notification.is_read.is_(False))
+            .group_by(Notification.user_id)
+        ):
+            truth[user_id]["notifications"] = count
+
+        for user_id, count in _unread_messages(db).group_by(ChatMember.user_id):
+            truth[user_id]["messages"] = count
+        return truth
+
+    def reconcile(self, db: Session) -> Dict[str, int]:
+        """Recompute every count and correct the ones that drifted."""
+        # Snapshot first: a counter that moves after this is left for the next run
+        snapshot = {
+            row.user_id: {"notifications": row.notifications, "messages": row.messages}
+            for row in db.query(UnreadCounter.user_id, UnreadCounter.notifications, UnreadCounter.messages)
+        }
+        truth = self._true_counts(db)
+        corrected: List[int] = []
+        missing = []
+        for user_id in sorted(set(snapshot) | set(truth)):
+            actual = truth.get(user_id, {"notifications": 0, "messages": 0})
+            stored = snapshot.get(user_id)
+            if stored is None:
+                if any(actual.values()):
+                    missing.append({"user_id": user_id, **actual})
+                continue
+            if stored == actual:
+                continue
+            for kind in KINDS:
+                if stored[kind] != actual[kind]:
+                    record_unread_drift(kind, abs(stored[kind] - actual[kind]))
+            result = db.execute(
+                update(UnreadCounter)
+                .where(
+                    UnreadCounter.user_id == user_id,
+                    UnreadCounter.notifications == stored["notifications"],
+                    UnreadCounter.messages == stored["messages"],
+                )
+                .values(**actual)
+            )
+            if result.rowcount:
+                corrected.append(user_id)
+        if missing:
+            # Users never counted before; a row written meanwhile wins until the next run
+            db.execute(upsert(db, UnreadCounter).on_conflict_do_nothing(index_elements=[UnreadCounter.user_id]), missing)
+        db.commit()
+        if corrected:
+            logger.warning(f"Corrected drifted unread counters for {len(corrected)} users")
+            self.publish(db, corrected)
+        return {"checked": len(set(snapshot) | set(truth)), "corrected": len(corrected), "created": len(missing)}
+
+
+unread_counters = UnreadCounterService()
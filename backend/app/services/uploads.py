@@ -0,0 +1,388 @@
+"""
+Streaming file uploads.
+
+Uploaded bytes are never held in memory as a whole. They are copied in
+UPLOAD_CHUNK_SIZE pieces into a temporary file next to the destination, with
+the write and the SHA-256 update run in the thread pool so the event loop
+keeps serving other requests. The copy stops as soon as the size limit is
+passed, and the temporary file is renamed into place only once everything
+has arrived, so a failed or oversized upload never leaves a partial file
+under the real name.
+
+Multipart uploads are spooled to disk by the framework before the endpoint
+runs, so the limit there is enforced while copying. Large files should go
+through an upload session instead: the client declares name and size, PUTs
+the bytes in chunks at increasing offsets straight from the request stream,
+asks for the current offset after a dropped connection, and completes the
+session, which checks the size (and the client's hash, if given) before the
+file is moved into place. Each chunk is streamed to a file of its own and
+spliced into the partial file only by the request whose compare-and-set on
+the session's offset wins, so a retry racing the original cannot overwrite
+bytes that are already committed.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db_models import UploadSession
+
+logger = get_logger(__name__)
+
+EXPIRE_BATCH = 100
+
+
+class UploadError(Exception):
+    """An upload the client has to fix; `status_code` is the HTTP status to answer with."""
+
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+    def __init__(self, limit: int, detail: Optional[str] = None):
+        super().__init__(detail or f"File too large (max {_human_size(limit)})")
+        self.limit = limit
+
+
+class UploadOffsetMismatch(UploadError):
+    status_code = 409
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload continues at offset {offset}")
+        self.offset = offset
+
+
+class UploadGone(UploadError):
+    status_code = 410
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    sha256: str
+
+
+def _human_size(size: int) -> str:
+    for unit, scale in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024)):
+        if size >= scale:
+            return f"{size / scale:g}{unit}"
+    return f"{size}B"
+
+
+def unique_name(filename: str) -> str:
+    """Storage name for an uploaded file; directory parts of the client's name are dropped."""
+    return f"{uuid4().hex}_{os.path.basename(filename)}"
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def read_upload(file: UploadFile, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """The multipart file in fixed-size chunks."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def rechunk(chunks: AsyncIterator[bytes], chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Regroup a request body stream, which arrives in small pieces, into fixed-size chunks."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    buffer = bytearray()
+    async for piece in chunks:
+        buffer += piece
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _write(handle, digest, chunk: bytes) -> None:
+    handle.write(chunk)
+    if digest is not None:
+        digest.update(chunk)
+
+
+def _finish(handle) -> None:
+    handle.flush()
+    os.fsync(handle.fileno())
+    handle.close()
+
+
+async def _copy(chunks: AsyncIterator[bytes], handle, digest, limit: int) -> int:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(limit)
+        await run_in_threadpool(_write, handle, digest, chunk)
+    return size
+
+
+async def save_stream(chunks: AsyncIterator[bytes], destination: str, max_size: int) -> StoredFile:
+    """Copy a byte stream to `destination`, hashing as it goes; nothing is left behind on failure."""
+    directory = os.path.dirname(destination) or "."
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    handle = open(temp_path, "wb")
+    try:
+        size = await _copy(chunks, handle, digest, max_size)
+        await run_in_threadpool(_finish, handle)
+        os.replace(temp_path, destination)
+    except BaseException:
+        handle.close()
+        _remove(temp_path)
+        raise
+    return StoredFile(destination, size, digest.hexdigest())
+
+
+async def save_upload(file: UploadFile, destination: str, max_size: int) -> StoredFile:
+    """Store a multipart upload without reading it into memory."""
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLarge(max_size)
+    return await save_stream(read_upload(file), destination, max_size)
+
+
+def _hash_file(path: str, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadSessions:
+    """Resumable uploads: partial files on disk, progress in upload_sessions.
+
+    The running hash of each session is kept in memory while its chunks keep
+    arriving at this process; if a chunk went to another worker, or the
+    process restarted, the file is hashed once on completion instead.
+    """
+
+    def __init__(self, directory: str, chunk_size: int, ttl_seconds: int):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.ttl_seconds = ttl_seconds
+        self._digests: Dict[str, Tuple[int, Any]] = {}
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def chunk_path(self, upload_id: str) -> str:
+        """A fresh path for one incoming chunk of the upload."""
+        return os.path.join(self.directory, f"{upload_id}.{uuid4().hex}.chunk")
+
+    def _remove_files(self, upload_id: str) -> None:
+        _remove(self.part_path(upload_id))
+        # Chunks left by a worker that died mid-request
+        for path in glob.glob(os.path.join(self.directory, f"{upload_id}.*.chunk")):
+            _remove(path)
+
+    def create(
+        self,
+        db: Session,
+        user_id: int,
+        purpose: str,
+        filename: str,
+        size: int,
+        max_size: int,
+        content_type: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> UploadSession:
+        if size <= 0:
+            raise UploadError("Upload size must be positive")
+        if size > max_size:
+            raise UploadTooLarge(max_size)
+        self.expire(db)
+        os.makedirs(self.directory, exist_ok=True)
+        session = UploadSession(
+            id=uuid4().hex,
+            user_id=user_id,
+            purpose=purpose,
+            filename=os.path.basename(filename),
+            content_type=content_type,
+            size=size,
+            received=0,
+            params=params or {},
+        )
+        open(self.part_path(session.id), "wb").close()
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+        return session
+
+    def get(self, db: Session, upload_id: str, user_id: int, purpose: str) -> Optional[UploadSession]:
+        return db.query(UploadSession).filter(
+            UploadSession.id == upload_id,
+            UploadSession.user_id == user_id,
+            UploadSession.purpose == purpose,
+        ).first()
+
+    def _digest(self, upload_id: str, offset: int):
+        entry = self._digests.pop(upload_id, None)
+        if offset == 0:
+            return hashlib.sha256()
+        if entry is not None and entry[0] == offset:
+            return entry[1]
+        return None
+
+    def _splice(self, upload_id: str, offset: int, chunk_path: str) -> None:
+        try:
+            handle = open(self.part_path(upload_id), "r+b")
+        except FileNotFoundError:
+            raise UploadGone("Upload data is no longer available; start a new upload")
+        try:
+            # Drop whatever an interrupted splice left past the committed offset
+            handle.truncate(offset)
+            handle.seek(offset)
+            with open(chunk_path, "rb") as chunk:
+                shutil.copyfileobj(chunk, handle, self.chunk_size)
+        except BaseException:
+            handle.close()
+            raise
+        _finish(handle)
+
+    def status(self, session: UploadSession) -> Dict[str, Any]:
+        return {
+            "upload_id": session.id,
+            "filename": session.filename,
+            "size": session.size,
+            "offset": session.received,
+            "chunk_size": self.chunk_size,
+        }
+
+    async def append(
+        self,
+        db: Session,
+        session: UploadSession,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        length: Optional[int] = None,
+    ) -> int:
+        """Write the next chunk at `offset`, which must be where the upload stands; returns the new offset.
+
+        `length` is the request's Content-Length, if sent, so an oversized
+        chunk is refused before any of it is read.
+        """
+        if offset != session.received:
+            raise UploadOffsetMismatch(session.received)
+        if length is not None and offset + length > session.size:
+            raise UploadTooLarge(session.size, f"Upload is larger than the declared {session.size} bytes")
+        digest = self._digest(session.id, offset)
+        chunk_path = self.chunk_path(session.id)
+        handle = await run_in_threadpool(open, chunk_path, "wb")
+        try:
+            try:
+                written = await _copy(chunks, handle, digest, session.size - offset)
+                await run_in_threadpool(_finish, handle)
+            except UploadTooLarge:
+                handle.close()
+                raise UploadTooLarge(session.size, f"Upload is larger than the declared {session.size} bytes")
+            except BaseException:
+                handle.close()
+                raise
+            moved = await run_in_threadpool(self._advance, db, session, offset, written, chunk_path)
+        finally:
+            await run_in_threadpool(_remove, chunk_path)
+        if not moved:
+            raise UploadOffsetMismatch(session.received)
+        if digest is not None:
+            self._digests[session.id] = (session.received, digest)
+        return session.received
+
+    def _advance(self, db: Session, session: UploadSession, offset: int, written: int, chunk_path: str) -> bool:
+        # Compare-and-set, so of two requests racing for the same offset only one advances it.
+        # The updated row stays locked until the commit, so the winner splices its chunk alone.
+        moved = db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == session.id, UploadSession.received == offset)
+            .values(received=offset + written)
+        ).rowcount
+        if moved:
+            try:
+                self._splice(session.id, offset, chunk_path)
+            except BaseException:
+                db.rollback()
+                raise
+        db.commit()
+        db.refresh(session)
+        return bool(moved)
+
+    async def complete(
+        self, db: Session, session: UploadSession, destination: str, sha256: Optional[str] = None
+    ) -> StoredFile:
+        """Move the finished file to `destination`; the session row is deleted in the caller's transaction."""
+        if session.received != session.size:
+            raise UploadError(f"Upload incomplete: {session.received} of {session.size} bytes received")
+        part_path = self.part_path(session.id)
+        if not os.path.exists(part_path):
+            raise UploadGone("Upload data is no longer available; start a new upload")
+        entry = self._digests.pop(session.id, None)
+        if entry is not None and entry[0] == session.size:
+            digest = entry[1].hexdigest()
+        else:
+            digest = await run_in_threadpool(_hash_file, part_path, self.chunk_size)
+        if sha256 and sha256.lower() != digest:
+            raise UploadError("Checksum mismatch; the upload is corrupt")
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        os.replace(part_path, destination)
+        db.delete(session)
+        return StoredFile(destination, session.size, digest)
+
+    def discard(self, db: Session, session: UploadSession) -> None:
+        self._digests.pop(session.id, None)
+        self._remove_files(session.id)
+        db.delete(session)
+        db.commit()
+
+    def expire(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Drop sessions idle for longer than the TTL, with their partial files."""
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=self.ttl_seconds)
+        stale = [
+            upload_id for upload_id, in db.query(UploadSession.id)
+            .filter(UploadSession.updated_at < cutoff)
+            .limit(EXPIRE_BATCH)
+        ]
+        if not stale:
+            return 0
+        for upload_id in stale:
+            self._digests.pop(upload_id, None)
+            self._remove_files(upload_id)
+        db.query(UploadSession).filter(UploadSession.id.in_(stale)).delete(synchronize_session=False)
+        db.commit()
+        logger.info(f"Expired {len(stale)} idle upload sessions")
+        return len(stale)
+
+
+def create_upload_sessions() -> UploadSessions:
+    return UploadSessions(
+        directory=settings.UPLOAD_SESSION_DIR,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        ttl_seconds=settings.UPLOAD_SESSION_TTL,
+    )
+
+
+upload_sessions = create_upload_sessions()
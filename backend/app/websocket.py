@@ -1,177 +1,27 @@
-import json
+import time
 from typing import List
-from fastapi import WebSocket, WebSocketDisconnect, HTTPException
-from sqlalchemy.orm import Session
-from app.db_models import User
-# from app.utils.jwt import verify_token, JWTError  # TODO: Uncomment and use real JWT verification
-from app.database import get_db
+from app.websockets.notification_manager import notification_manager
 
-def verify_token(token):
-    # TODO: Replace with real JWT verification
-    return {"sub": token}
-class JWTError(Exception):
-    pass
+# Connections are owned by the gateway in app/websockets/gateway.py; these helpers push through it
+manager = notification_manager
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections = {}
-        self.groups = {}
-
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        await self.add_to_group(user_id, "all")
-        await self.add_to_group(user_id, f"user_{user_id}")
-        await self.send_personal_message(
-            {
-                "type": "connection",
-                "message": "Connected to notification service",
-                "user_id": user_id,
-            },
-            user_id,
-        )
-
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        for group_name in list(self.groups.keys()):
-            if user_id in self.groups[group_name]:
-                self.groups[group_name].discard(user_id)
-                if not self.groups[group_name]:
-                    del self.groups[group_name]
-
-    async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(json.dumps(message))
-            except Exception as e:
-                print(f"Error sending message to user {user_id}: {e}")
-                self.disconnect(user_id)
-
-    async def broadcast(self, message: dict, group_name: str = "all"):
-        if group_name not in self.groups:
-            return
-        disconnected_users = []
-        for user_id in self.groups[group_name]:
-            if user_id in self.active_connections:
-                try:
-                    await self.active_connections[user_id].send_text(json.dumps(message))
-                except Exception as e:
-                    print(f"Error broadcasting to user {user_id}: {e}")
-                    disconnected_users.append(user_id)
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
-
-    async def add_to_group(self, user_id: int, group_name: str):
-        if group_name not in self.groups:
-            self.groups[group_name] = set()
-        self.groups[group_name].add(user_id)
-
-    async def remove_from_group(self, user_id: int, group_name: str):
-        if group_name in self.groups and user_id in self.groups[group_name]:
-            self.groups[group_name].discard(user_id)
-            if not self.groups[group_name]:
-                del self.groups[group_name]
-
-manager = ConnectionManager()
-
-def get_user_id(user):
-    # Handles both SQLAlchemy Column and int
-    try:
-        # Try direct int conversion
-        return int(user.id)
-    except Exception:
-        try:
-            # Try .value for SQLAlchemy Column
-            return int(user.id.value)
-        except Exception:
-            try:
-                return int(getattr(user, 'id', 0))
-            except Exception:
-                return 0
-
-async def get_user_from_token(token: str, db: Session) -> User:
-    try:
-        print(f"Verifying token: {token[:20]}...")
-        payload = verify_token(token)
-        print(f"Token payload: {payload}")
-        email = payload.get("sub")
-        if email is None:
-            print("No email found in token payload")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        print(f"Looking for user with email: {email}")
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            print(f"User not found for email: {email}")
-            raise HTTPException(status_code=401, detail="User not found")
-        print(f"User found: {user.username} (ID: {user.id})")
-        return user
-    except JWTError as e:
-        print(f"JWTError in get_user_from_token: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception as e:
-        print(f"Error in get_user_from_token: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-async def websocket_endpoint(websocket: WebSocket, token: str):
-    print(f"WebSocket connection attempt with token: {token[:20]}...")
-    db = next(get_db())
-    user = None
-    try:
-        user = await get_user_from_token(token, db)
-        user_id = get_user_id(user)
-        print(f"Token verified for user: {user.username} (ID: {user_id})")
-        await manager.connect(websocket, user_id)
-        print(f"User {user.username} connected to WebSocket")
-        while True:
-            try:
-                data = await websocket.receive_text()
-                message = json.loads(data)
-                await handle_websocket_message(message, user, db)
-            except WebSocketDisconnect:
-                print(f"User {user.username} disconnected")
-                break
-            except Exception as e:
-                print(f"Error handling message from user {user.username}: {e}")
-                await manager.send_personal_message({"type": "error", "message": "Internal server error"}, get_user_id(user))
-    except HTTPException as e:
-        print(f"HTTPException in WebSocket: {e.detail}")
-        await websocket.close(code=1008, reason="Authentication failed")
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        await websocket.close(code=1011, reason="Internal server error")
-    finally:
-        if user is not None:
-            manager.disconnect(get_user_id(user))
-        db.close()
+async def send_notification_to_user(user_id: int, notification_data: dict):
+    await manager.send_personal_notification(user_id, {"type": "notification", "data": notification_data})
 
-async def handle_websocket_message(message: dict, user: User, db: Session):
-    message_type = message.get("type")
-    user_id = get_user_id(user)
-    if message_type == "join_group":
-        group_name = message.get("group_name")
-        if group_name:
-            await manager.add_to_group(user_id, group_name)
-            await manager.send_personal_message({"type": "group_joined", "group_name": group_name}, user_id)
-    elif message_type == "leave_group":
-        group_name = message.get("group_name")
-        if group_name:
-            await manager.remove_from_group(user_id, group_name)
-            await manager.send_personal_message({"type": "group_left", "group_name": group_name}, user_id)
-    elif message_type == "ping":
-        await manager.send_personal_message({"type": "pong", "timestamp": message.get("timestamp")}, user_id)
+async def _send_to_group(group_name: str, message: dict):
+    if group_name == "all":
+        await manager.broadcast(message)
     else:
-        await manager.send_personal_message({"type": "error", "message": f"Unknown message type: {message_type}"}, user_id)
-
-async def send_notification_to_user(user_id: int, notification_data: dict):
-    await manager.send_personal_message({"type": "notification", "data": notification_data}, user_id)
+        await manager.send_to_group(group_name, message)
 
 async def send_notification_to_group(group_name: str, notification_data: dict):
-    await manager.broadcast({"type": "notification", "data": notification_data}, group_name)
+    await _send_to_group(group_name, {"type": "notification", "data": notification_data})
 
 async def send_system_notification(message: str, group_name: str = "all"):
-    import asyncio
-    await manager.broadcast({"type": "system_notification", "message": message, "timestamp": asyncio.get_event_loop().time()}, group_name)
+    await _send_to_group(group_name, {"type": "system_notification", "message": message, "timestamp": time.time()})
+
+def is_user_online(user_id: int) -> bool:
+    return manager.is_online(user_id)
 
 async def notify_new_task(task_data: dict, target_users: List[int]):
     for user_id in target_users:
@@ -0,0 +1,109 @@
+"""
+Pub/sub backplane that carries WebSocket events between worker processes.
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Backplane:
+    """Interface shared by backplane implementations."""
+
+    async def start(self, handler: MessageHandler) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane; several managers may share one to simulate workers in tests."""
+
+    def __init__(self):
+        self.handlers: List[MessageHandler] = []
+
+    async def start(self, handler: MessageHandler) -> None:
+        self.handlers.append(handler)
+
+    async def stop(self) -> None:
+        self.handlers.clear()
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        for handler in list(self.handlers):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Backplane handler failed: {e}")
+
+
+class RedisBackplane(Backplane):
+    """Redis pub/sub backplane. Each worker holds a single subscription."""
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self.redis = None
+        self.pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        import redis.asyncio as aioredis
+
+        self.redis = aioredis.from_url(self.url)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+        self._reader = asyncio.create_task(self._read(handler))
+        logger.info(f"Subscribed to WebSocket backplane channel {self.channel}")
+
+    async def _read(self, handler: MessageHandler) -> None:
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        await handler(json.loads(item["data"]))
+                    except Exception as e:
+                        logger.error(f"Backplane handler failed: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane subscription lost, resubscribing: {e}")
+                await asyncio.sleep(1)
+                await self.pubsub.subscribe(self.channel)
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def publish(self, message: Dict[str, Any]) -> None:
+        await self.redis.publish(self.channel, json.dumps(message, default=str))
+
+
+def create_backplane() -> Backplane:
+    if settings.WEBSOCKET_BACKPLANE == "redis":
+        return RedisBackplane(settings.REDIS_URL, settings.WEBSOCKET_BACKPLANE_CHANNEL)
+    return InMemoryBackplane()
+
+
+def worker_id() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
@@ -0,0 +1,55 @@
+"""
+Chat frames on the WebSocket gateway.
+
+A client sends {"type": "chat_message", "chat_id", "client_msg_id", "content"}
+and gets a `chat_ack` right away. The stored message comes back as a
+`chat_message` event carrying the server id. Until that event arrives, the
+client keeps the message and resends it with the same `client_msg_id` after a
+reconnect. Resends are never stored twice. A `chat_error` with the same
+`client_msg_id` means the message was given up on and will not arrive.
+"""
+
+from typing import Any, Dict
+
+from app.websockets.connection import ClientConnection
+from app.websockets.gateway import register_handler
+from app.services.chat_message_writer import chat_message_writer, chat_participants
+
+MAX_CONTENT_LENGTH = 2000  # same limit as MessageCreate
+MAX_CLIENT_MSG_ID_LENGTH = 64
+
+
+def _reject(connection: ClientConnection, message: Dict[str, Any], detail: str) -> None:
+    connection.enqueue({"type": "chat_error", "client_msg_id": message.get("client_msg_id"), "detail": detail})
+
+
+async def handle_chat_message(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    chat_id = message.get("chat_id")
+    client_msg_id = message.get("client_msg_id")
+    content = message.get("content")
+    if not isinstance(client_msg_id, str) or not 0 < len(client_msg_id) <= MAX_CLIENT_MSG_ID_LENGTH:
+        _reject(connection, message, "client_msg_id is required")
+        return
+    if not isinstance(chat_id, int):
+        _reject(connection, message, "chat_id is required")
+        return
+    if not isinstance(content, str) or not content.strip() or len(content) > MAX_CONTENT_LENGTH:
+        _reject(connection, message, f"content must be 1-{MAX_CONTENT_LENGTH} characters")
+        return
+
+    participants = await chat_participants(chat_id)
+    if participants is None or connection.user_id not in participants:
+        _reject(connection, message, "Not authorized to send messages in this chat")
+        return
+
+    accepted, duplicate = chat_message_writer.submit(chat_id, connection.user_id, client_msg_id, content)
+    connection.enqueue({
+        "type": "chat_ack",
+        "chat_id": chat_id,
+        "client_msg_id": client_msg_id,
+        "status": "duplicate" if duplicate else "accepted",
+        "created_at": accepted["created_at"].isoformat(),
+    })
+
+
+register_handler("chat_message", handle_chat_message)
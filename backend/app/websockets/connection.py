@@ -0,0 +1,177 @@
+"""
+Per-connection outbound queue drained by a dedicated writer task.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.monitoring import (
+    record_websocket_drop,
+    record_websocket_eviction,
+    record_websocket_frame,
+    WEBSOCKET_SEND_QUEUE_DEPTH,
+)
+from app.websockets.framing import Framer
+
+logger = get_logger(__name__)
+
+# What to do when a client's queue is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+
+# 1013 "Try Again Later": the client fell too far behind
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientConnection:
+    """One WebSocket with a bounded send queue, so a slow client only delays itself."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        max_queue: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        policy: Optional[str] = None,
+        on_close: Optional[Callable[["ClientConnection"], Awaitable[None]]] = None,
+        framer: Optional[Framer] = None,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.send_timeout = send_timeout or settings.WEBSOCKET_SEND_TIMEOUT
+        self.policy = policy or settings.WEBSOCKET_SLOW_CONSUMER_POLICY
+        self.on_close = on_close
+        self.framer = framer or Framer()
+        self.coalesce_window = settings.WEBSOCKET_COALESCE_WINDOW_MS / 1000
+        self.coalesce_max = settings.WEBSOCKET_COALESCE_MAX_EVENTS
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue or settings.WEBSOCKET_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self._held: Optional[List[Any]] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def touch(self) -> None:
+        """Mark inbound activity; used for idle reaping."""
+        self.last_seen = time.monotonic()
+
+    def hold(self) -> None:
+        """Buffer live messages while missed events are being replayed."""
+        self._held = []
+
+    def resume(self, replayed: Iterable[dict], last_event_id: int) -> None:
+        """Send replayed events, then the held live ones not already covered by the replay."""
+        held, self._held = self._held or [], None
+        for event in replayed:
+            self.enqueue(event)
+            last_event_id = max(last_event_id, event.get("event_id", 0))
+        for data in held:
+            if isinstance(data, dict) and data.get("event_id", last_event_id + 1) <= last_event_id:
+                continue
+            self.enqueue(data)
+
+    def enqueue(self, data: Any) -> bool:
+        """Queue a message without waiting; returns False if it was not queued."""
+        if self.closed:
+            return False
+        if self._held is not None:
+            self._held.append(data)
+            return True
+        try:
+            self.queue.put_nowait(data)
+            WEBSOCKET_SEND_QUEUE_DEPTH.inc()
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(data)
+            self._drop("queue_full")
+            return True
+        if self.policy == DROP_NEWEST:
+            self._drop("queue_full")
+            return False
+        self._drop("evicted")
+        asyncio.create_task(self.close(SLOW_CONSUMER_CLOSE_CODE, "slow_consumer"))
+        return False
+
+    def _drop(self, reason: str) -> None:
+        self.dropped += 1
+        record_websocket_drop(reason)
+
+    def _take(self, batch: List[Any]) -> None:
+        while len(batch) < self.coalesce_max and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+            WEBSOCKET_SEND_QUEUE_DEPTH.dec()
+
+    async def _next_batch(self) -> List[Any]:
+        """Wait for a message, then gather whatever else arrives within the coalescing window."""
+        batch = [await self.queue.get()]
+        WEBSOCKET_SEND_QUEUE_DEPTH.dec()
+        if self.framer.batching:
+            if self.coalesce_window > 0 and len(batch) < self.coalesce_max:
+                await asyncio.sleep(self.coalesce_window)
+            self._take(batch)
+        return batch
+
+    async def _send(self, batch: List[Any]) -> None:
+        frame = self.framer.encode(batch)
+        if isinstance(frame, bytes):
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+        record_websocket_frame(self.framer.codec, len(batch), frame)
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await asyncio.wait_for(self._send(batch), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._drop("send_timeout")
+                asyncio.create_task(self.close(SLOW_CONSUMER_CLOSE_CODE, "send_timeout"))
+                return
+            except Exception:
+                self._drop("send_error")
+                asyncio.create_task(self.close(reason="send_error"))
+                return
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def drain(self) -> None:
+        """Wait until everything queued so far has been written."""
+        await self.queue.join()
+
+    async def close(self, code: int = 1000, reason: str = "closed") -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if reason in ("slow_consumer", "send_timeout", "idle"):
+            record_websocket_eviction(reason)
+            logger.warning(f"Evicting WebSocket of user {self.user_id}: {reason}")
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        pending = self.queue.qsize()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+        WEBSOCKET_SEND_QUEUE_DEPTH.dec(pending)
+        if code != 1000:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+        if self.on_close is not None:
+            await self.on_close(self)
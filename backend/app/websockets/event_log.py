@@ -0,0 +1,95 @@
+"""
+Per-user log of pushed events so reconnecting clients can resume from `last_event_id`.
+"""
+
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from app.core.config import settings
+
+
+def _replay(events: List[Dict[str, Any]], latest: int, last_event_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """Events after `last_event_id` and whether they fully cover the gap."""
+    if last_event_id > latest:
+        # The sequence was reset (e.g. the log expired); the client must resync
+        return events, False
+    missed = [event for event in events if event["event_id"] > last_event_id]
+    complete = last_event_id == latest or bool(events and events[0]["event_id"] <= last_event_id + 1)
+    return missed, complete
+
+
+class EventLog:
+    """Interface shared by event log implementations."""
+
+    async def append(self, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Store an event and return it stamped with the user's next `event_id`."""
+        raise NotImplementedError
+
+    async def since(self, user_id: int, last_event_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events after `last_event_id`, and False if older ones were already evicted."""
+        raise NotImplementedError
+
+
+class InMemoryEventLog(EventLog):
+    """Bounded ring buffer per user, for single-worker deployments and tests."""
+
+    def __init__(self, max_events: int = 200):
+        self.max_events = max_events
+        self.events: Dict[int, Deque[Dict[str, Any]]] = {}
+        self.sequences: Dict[int, int] = {}
+
+    async def append(self, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        self.sequences[user_id] = self.sequences.get(user_id, 0) + 1
+        event = {"event_id": self.sequences[user_id], **data}
+        self.events.setdefault(user_id, deque(maxlen=self.max_events)).append(event)
+        return event
+
+    async def since(self, user_id: int, last_event_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+        return _replay(list(self.events.get(user_id, ())), self.sequences.get(user_id, 0), last_event_id)
+
+
+class RedisEventLog(EventLog):
+    """Ring buffer in a capped Redis list, shared by all workers."""
+
+    def __init__(self, url: str, max_events: int = 200, ttl: int = 86400, prefix: str = "ws"):
+        self.url = url
+        self.max_events = max_events
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.url)
+        return self._redis
+
+    def _keys(self, user_id: int) -> Tuple[str, str]:
+        return f"{self.prefix}:events:{user_id}", f"{self.prefix}:seq:{user_id}"
+
+    async def append(self, user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        events_key, seq_key = self._keys(user_id)
+        event = {"event_id": await self.redis.incr(seq_key), **data}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(events_key, json.dumps(event, default=str))
+            pipe.ltrim(events_key, -self.max_events, -1)
+            pipe.expire(events_key, self.ttl)
+            await pipe.execute()
+        return event
+
+    async def since(self, user_id: int, last_event_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+        events_key, seq_key = self._keys(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(events_key, 0, -1)
+            pipe.get(seq_key)
+            raw, latest = await pipe.execute()
+        events = sorted((json.loads(item) for item in raw), key=lambda event: event["event_id"])
+        return _replay(events, int(latest or 0), last_event_id)
+
+
+def create_event_log() -> EventLog:
+    if settings.WEBSOCKET_EVENT_LOG == "redis":
+        return RedisEventLog(settings.REDIS_URL, settings.WEBSOCKET_EVENT_LOG_SIZE, settings.WEBSOCKET_EVENT_LOG_TTL)
+    return InMemoryEventLog(settings.WEBSOCKET_EVENT_LOG_SIZE)
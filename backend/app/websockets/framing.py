@@ -0,0 +1,69 @@
+"""
+Wire formats for outbound WebSocket frames, negotiated through the subprotocol.
+
+Clients that offer no subprotocol get one JSON text frame per event, as before.
+Clients offering `freelance.json` or `freelance.msgpack` also understand batch
+frames (`{"type": "batch", "events": [...]}`), so bursts can be coalesced.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+JSON_SUBPROTOCOL = "freelance.json"
+MSGPACK_SUBPROTOCOL = "freelance.msgpack"
+
+Frame = Union[str, bytes]
+
+
+def supported_subprotocols() -> List[str]:
+    """Subprotocols this server can speak, in order of preference."""
+    protocols = [JSON_SUBPROTOCOL]
+    if msgpack is not None:
+        protocols.insert(0, MSGPACK_SUBPROTOCOL)
+    return protocols
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """Pick the preferred subprotocol the client offered, or None for legacy JSON."""
+    offered = list(offered or ())
+    return next((protocol for protocol in supported_subprotocols() if protocol in offered), None)
+
+
+class Framer:
+    """Encodes queued events into frames for one connection."""
+
+    def __init__(self, subprotocol: Optional[str] = None):
+        if subprotocol == MSGPACK_SUBPROTOCOL and msgpack is None:
+            subprotocol = None
+        self.subprotocol = subprotocol
+        self.codec = "msgpack" if subprotocol == MSGPACK_SUBPROTOCOL else "json"
+        # Legacy clients parse one event per frame
+        self.batching = subprotocol is not None
+
+    def encode(self, events: List[Any]) -> Frame:
+        payload = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        if self.codec == "msgpack":
+            return msgpack.packb(payload, default=str, use_bin_type=True)
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def decode(self, text: Optional[str] = None, data: Optional[bytes] = None) -> Any:
+        """Parse an inbound frame; msgpack clients may still send JSON text."""
+        if data is not None and self.codec == "msgpack":
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(text if text is not None else data)
+
+
+def frame_size(frame: Frame) -> int:
+    return len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+
+
+def batch_events(frame: Dict[str, Any]) -> List[Any]:
+    """Events carried by a decoded frame, whether batched or not."""
+    if isinstance(frame, dict) and frame.get("type") == "batch":
+        return list(frame.get("events", []))
+    return [frame]
@@ -0,0 +1,164 @@
+"""
+Single authenticated WebSocket entry point with heartbeats and idle reaping.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.websockets.connection import ClientConnection
+from app.websockets.framing import negotiate
+from app.websockets.notification_manager import notification_manager
+
+logger = get_logger(__name__)
+
+# 4000-4999 are application codes; the client should reconnect
+IDLE_CLOSE_CODE = 4000
+POLICY_VIOLATION_CLOSE_CODE = 1008
+
+MessageHandler = Callable[[ClientConnection, Dict[str, Any]], Awaitable[None]]
+message_handlers: Dict[str, MessageHandler] = {}
+
+# Tokens issued before the "uid" claim existed: email -> (expires, user id). Bounded, and
+# short-lived so a deactivated account stops connecting once its entry expires.
+LEGACY_USER_CACHE_TTL = 300.0
+LEGACY_USER_CACHE_SIZE = 10000
+_legacy_user_ids: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+
+def register_handler(message_type: str, handler: MessageHandler) -> None:
+    """Route inbound frames of `message_type` to `handler`."""
+    message_handlers[message_type] = handler
+
+
+def _lookup_user_id(email: str) -> Optional[int]:
+    from app.database import SessionLocal
+    from app.db_models import User
+
+    db = SessionLocal()
+    try:
+        user = db.query(User.id, User.is_active).filter(User.email == email).first()
+        return user.id if user is not None and user.is_active else None
+    finally:
+        db.close()
+
+
+async def authenticate(token: str) -> Optional[int]:
+    """Resolve an access token to a user id from its claims, without a database query."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("type") == "refresh":
+        return None
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        return user_id
+
+    email = payload.get("sub")
+    if not isinstance(email, str) or not email:
+        return None
+    entry = _legacy_user_ids.get(email)
+    if entry is not None and entry[0] > time.monotonic():
+        _legacy_user_ids.move_to_end(email)
+        return entry[1]
+    user_id = await run_in_threadpool(_lookup_user_id, email)
+    if user_id is None:
+        _legacy_user_ids.pop(email, None)
+        return None
+    _legacy_user_ids[email] = (time.monotonic() + LEGACY_USER_CACHE_TTL, user_id)
+    _legacy_user_ids.move_to_end(email)
+    while len(_legacy_user_ids) > LEGACY_USER_CACHE_SIZE:
+        _legacy_user_ids.popitem(last=False)
+    return user_id
+
+
+async def _heartbeat(connection: ClientConnection) -> None:
+    while not connection.closed:
+        await asyncio.sleep(settings.WEBSOCKET_HEARTBEAT_INTERVAL)
+        if time.monotonic() - connection.last_seen > settings.WEBSOCKET_IDLE_TIMEOUT:
+            await connection.close(IDLE_CLOSE_CODE, "idle")
+            return
+        connection.enqueue({"type": "ping", "timestamp": time.time()})
+
+
+async def _handle_ping(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    connection.enqueue({"type": "pong", "timestamp": message.get("timestamp")})
+
+
+async def _handle_pong(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    # Receiving it already refreshed last_seen
+    pass
+
+
+async def _handle_join_group(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    group_name = message.get("group_name")
+    if group_name:
+        await notification_manager.join_group(connection.user_id, group_name)
+        connection.enqueue({"type": "group_joined", "group_name": group_name})
+
+
+async def _handle_leave_group(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    group_name = message.get("group_name")
+    if group_name:
+        await notification_manager.leave_group(connection.user_id, group_name)
+        connection.enqueue({"type": "group_left", "group_name": group_name})
+
+
+register_handler("ping", _handle_ping)
+register_handler("pong", _handle_pong)
+register_handler("join_group", _handle_join_group)
+register_handler("leave_group", _handle_leave_group)
+
+
+async def dispatch(connection: ClientConnection, message: Dict[str, Any]) -> None:
+    handler = message_handlers.get(message.get("type"))
+    if handler is None:
+        connection.enqueue({"type": "error", "message": f"Unknown message type: {message.get('type')}"})
+        return
+    try:
+        await handler(connection, message)
+    except Exception as e:
+        logger.error(f"WebSocket handler {message.get('type')} failed for user {connection.user_id}: {e}")
+        connection.enqueue({"type": "error", "message": "Internal server error"})
+
+
+async def websocket_endpoint(websocket: WebSocket, token: str, last_event_id: Optional[int] = None) -> None:
+    user_id = await authenticate(token)
+    if user_id is None:
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE)
+        return
+
+    subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    connection = await notification_manager.connect(
+        user_id, websocket, last_event_id=last_event_id, subprotocol=subprotocol
+    )
+    connection.enqueue({"type": "connection", "message": "Connected to notification service", "user_id": user_id})
+    heartbeat = asyncio.create_task(_heartbeat(connection))
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            connection.touch()
+            notification_manager.presence.touch(user_id)
+            try:
+                message = connection.framer.decode(frame.get("text"), frame.get("bytes"))
+            except Exception:
+                connection.enqueue({"type": "error", "message": "Invalid JSON"})
+                continue
+            if isinstance(message, dict):
+                await dispatch(connection, message)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the socket was closed by the heartbeat or an eviction
+        pass
+    finally:
+        heartbeat.cancel()
+        await notification_manager.disconnect(user_id, websocket)
@@ -1,43 +1,185 @@
 import asyncio
-from typing import Dict, Set
+import time
+from typing import Dict, Iterable, Optional, Set
 from fastapi import WebSocket
 
+from app.core.monitoring import record_backplane_message
+from app.websockets.backplane import Backplane, create_backplane, worker_id
+from app.websockets.connection import ClientConnection
+from app.websockets.event_log import EventLog, create_event_log
+from app.websockets.framing import Framer
+from app.websockets.presence import PresenceRegistry
+
 class NotificationConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+    def __init__(self, backplane: Optional[Backplane] = None, event_log: Optional[EventLog] = None):
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self.groups: Dict[str, Set[int]] = {}
         self.lock = asyncio.Lock()
+        self.backplane = backplane or create_backplane()
+        self.event_log = event_log or create_event_log()
+        self.presence = PresenceRegistry()
+        self.worker_id = worker_id()
+        self.started = False
+
+    async def start(self):
+        if not self.started:
+            await self.backplane.start(self._on_backplane_message)
+            self.started = True
+            # Learn who is already connected to the other workers
+            await self._publish({"kind": "presence_sync"})
+
+    async def stop(self):
+        if self.started:
+            await self._publish({"kind": "worker_stopped"})
+            await self.backplane.stop()
+            self.started = False
 
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
+    async def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        last_event_id: Optional[int] = None,
+        subprotocol: Optional[str] = None,
+    ) -> ClientConnection:
+        if subprotocol is not None:
+            await websocket.accept(subprotocol=subprotocol)
+        else:
+            await websocket.accept()
+        connection = ClientConnection(websocket, user_id, on_close=self._remove, framer=Framer(subprotocol))
+        connection.start()
+        if last_event_id is not None:
+            # Register first so nothing published during the replay is lost
+            connection.hold()
         async with self.lock:
             if user_id not in self.active_connections:
                 self.active_connections[user_id] = set()
-            self.active_connections[user_id].add(websocket)
+            self.active_connections[user_id].add(connection)
+            came_online = self.presence.add_local(user_id)
+        if came_online:
+            await self._publish({"kind": "presence", "user_id": user_id, "online": True})
+        if last_event_id is not None:
+            await self._replay(connection, last_event_id)
+        return connection
+
+    async def _replay(self, connection: ClientConnection, last_event_id: int):
+        try:
+            missed, complete = await self.event_log.since(connection.user_id, last_event_id)
+        except Exception:
+            missed, complete = [], False
+        if not complete:
+            # Older events were evicted: the client has to re-fetch once
+            missed = [{"type": "resync_required", "last_event_id": last_event_id}] + missed
+        connection.resume(missed, last_event_id)
 
     async def disconnect(self, user_id: int, websocket: WebSocket):
         async with self.lock:
-            if user_id in self.active_connections:
-                self.active_connections[user_id].discard(websocket)
+            connection = next(
+                (conn for conn in self.active_connections.get(user_id, ()) if conn.websocket is websocket),
+                None
+            )
+        if connection is not None:
+            await connection.close()
+
+    async def _remove(self, connection: ClientConnection):
+        went_offline = False
+        async with self.lock:
+            user_id = connection.user_id
+            if connection in self.active_connections.get(user_id, ()):
+                self.active_connections[user_id].discard(connection)
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
+                    for members in self.groups.values():
+                        members.discard(user_id)
+                    self.groups = {name: members for name, members in self.groups.items() if members}
+                went_offline = self.presence.remove_local(user_id)
+        if went_offline:
+            await self._publish({"kind": "presence", "user_id": user_id, "online": False})
+
+    def is_online(self, user_id: int) -> bool:
+        """Whether the user has an open socket on any worker. No database query."""
+        return self.presence.is_online(user_id)
+
+    def online_users(self, user_ids: Iterable[int]) -> Set[int]:
+        return self.presence.online(user_ids)
+
+    async def join_group(self, user_id: int, group_name: str):
+        self.groups.setdefault(group_name, set()).add(user_id)
+
+    async def leave_group(self, user_id: int, group_name: str):
+        members = self.groups.get(group_name)
+        if members is not None:
+            members.discard(user_id)
+            if not members:
+                del self.groups[group_name]
 
     async def send_personal_notification(self, user_id: int, data: dict):
-        async with self.lock:
-            connections = self.active_connections.get(user_id, set()).copy()
-        for connection in connections:
-            try:
-                await connection.send_json(data)
-            except Exception:
-                await self.disconnect(user_id, connection)
+        try:
+            data = await self.event_log.append(user_id, data)
+        except Exception:
+            # Deliver live even if the log is unavailable; a reconnect will then resync
+            pass
+        await self._deliver_local(user_id, data)
+        await self._publish({"kind": "user", "user_id": user_id, "data": data})
 
     async def broadcast(self, data: dict):
-        async with self.lock:
-            all_connections = [ws for conns in self.active_connections.values() for ws in conns]
-        for connection in all_connections:
-            try:
-                await connection.send_json(data)
-            except Exception:
-                # Unknown user_id, disconnect
-                pass
+        await self._broadcast_local(data)
+        await self._publish({"kind": "broadcast", "data": data})
+
+    async def send_to_group(self, group_name: str, data: dict):
+        await self._group_local(group_name, data)
+        await self._publish({"kind": "group", "group_name": group_name, "data": data})
+
+    async def _publish(self, envelope: dict):
+        # Local sockets are served directly; the backplane only reaches other workers
+        if not self.started:
+            return
+        envelope["origin"] = self.worker_id
+        envelope["sent_at"] = time.time()
+        try:
+            await self.backplane.publish(envelope)
+            record_backplane_message("published")
+        except Exception:
+            record_backplane_message("publish_failed")
+
+    async def _on_backplane_message(self, envelope: dict):
+        origin = envelope.get("origin")
+        if origin == self.worker_id:
+            return
+        kind = envelope.get("kind")
+        latency = time.time() - envelope.get("sent_at", time.time())
+        if kind == "broadcast":
+            record_backplane_message("received", latency)
+            await self._broadcast_local(envelope["data"])
+        elif kind == "group" and envelope.get("group_name") in self.groups:
+            record_backplane_message("received", latency)
+            await self._group_local(envelope["group_name"], envelope["data"])
+        elif kind == "user" and envelope.get("user_id") in self.active_connections:
+            record_backplane_message("received", latency)
+            await self._deliver_local(envelope["user_id"], envelope["data"])
+        elif kind == "presence":
+            record_backplane_message("presence")
+            self.presence.set_remote(envelope["user_id"], origin, envelope["online"])
+        elif kind == "presence_sync":
+            await self._publish({"kind": "presence_snapshot", "users": self.presence.local_users()})
+        elif kind == "presence_snapshot":
+            for user_id in envelope.get("users", []):
+                self.presence.set_remote(user_id, origin, True)
+        elif kind == "worker_stopped":
+            self.presence.drop_worker(origin)
+        else:
+            record_backplane_message("ignored")
+
+    async def _deliver_local(self, user_id: int, data: dict):
+        # Enqueue only; each connection's writer task does the actual send
+        for connection in list(self.active_connections.get(user_id, ())):
+            connection.enqueue(data)
+
+    async def _broadcast_local(self, data: dict):
+        for connection in [conn for conns in list(self.active_connections.values()) for conn in conns]:
+            connection.enqueue(data)
+
+    async def _group_local(self, group_name: str, data: dict):
+        for user_id in list(self.groups.get(group_name, ())):
+            await self._deliver_local(user_id, data)
 
 notification_manager = NotificationConnectionManager()
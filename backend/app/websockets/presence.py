@@ -0,0 +1,60 @@
+"""
+In-memory presence map kept in sync across workers through the backplane.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class PresenceRegistry:
+    """Tracks which users have at least one open socket, here or on another worker."""
+
+    def __init__(self):
+        self.local: Dict[int, int] = {}  # user_id -> sockets on this worker
+        self.remote: Dict[int, Set[str]] = {}  # user_id -> other workers holding a socket
+        self.last_seen: Dict[int, float] = {}
+
+    def add_local(self, user_id: int) -> bool:
+        """Count a new local socket; True if the user just came online on this worker."""
+        self.local[user_id] = self.local.get(user_id, 0) + 1
+        self.last_seen[user_id] = time.time()
+        return self.local[user_id] == 1
+
+    def remove_local(self, user_id: int) -> bool:
+        """Forget a local socket; True if it was the user's last one on this worker."""
+        count = self.local.get(user_id, 0) - 1
+        self.last_seen[user_id] = time.time()
+        if count > 0:
+            self.local[user_id] = count
+            return False
+        self.local.pop(user_id, None)
+        return True
+
+    def set_remote(self, user_id: int, worker: str, online: bool) -> None:
+        workers = self.remote.setdefault(user_id, set())
+        if online:
+            workers.add(worker)
+        else:
+            workers.discard(worker)
+            if not workers:
+                del self.remote[user_id]
+        self.last_seen[user_id] = time.time()
+
+    def drop_worker(self, worker: str) -> None:
+        for user_id in [user_id for user_id, workers in self.remote.items() if worker in workers]:
+            self.set_remote(user_id, worker, False)
+
+    def touch(self, user_id: int) -> None:
+        self.last_seen[user_id] = time.time()
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.local or user_id in self.remote
+
+    def online(self, user_ids: Iterable[int]) -> Set[int]:
+        return {user_id for user_id in user_ids if self.is_online(user_id)}
+
+    def local_users(self) -> List[int]:
+        return list(self.local)
+
+    def seen_at(self, user_id: int) -> Optional[float]:
+        return self.last_seen.get(user_id)
@@ -0,0 +1,99 @@
+"""
+"Which chats is this user in?" with chat_members versus JSON participant lists.
+
+Builds an SQLite database with --chats chats, each with a creator and
+--members - 1 other participants, stored both ways: the chats.participant_ids
+JSON list the membership queries used to scan, and chat_members rows. Then
+times the lookup for random users both ways.
+
+    python benchmarks/chat_membership.py --chats 1000000 --users 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db_models import Base, Chat, ChatMember, User  # noqa: E402
+from app.services.chat_membership import is_member, user_chat_ids  # noqa: E402
+
+BATCH = 50000
+
+
+def build(engine, chats: int, users: int, members: int) -> None:
+    Base.metadata.create_all(engine, tables=[User.__table__, Chat.__table__, ChatMember.__table__])
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chats_json (id INTEGER PRIMARY KEY, participant_ids JSON)"))
+        conn.execute(insert(User.__table__), [
+            {"id": i, "email": f"u{i}@example.com", "username": f"u{i}", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ])
+    rng = random.Random(7)
+    for start in range(1, chats + 1, BATCH):
+        chat_rows, member_rows, json_rows = [], [], []
+        for chat_id in range(start, min(start + BATCH, chats + 1)):
+            people = rng.sample(range(1, users + 1), members)
+            chat_rows.append({"id": chat_id, "creator_id": people[0], "is_group": members > 2})
+            member_rows.extend({"chat_id": chat_id, "user_id": user_id} for user_id in people)
+            json_rows.append({"id": chat_id, "participant_ids": str(people)})
+        with engine.begin() as conn:
+            conn.execute(insert(Chat.__table__), chat_rows)
+            conn.execute(insert(ChatMember.__table__), member_rows)
+            conn.execute(text("INSERT INTO chats_json (id, participant_ids) VALUES (:id, :participant_ids)"), json_rows)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def measure(name: str, lookup, user_ids) -> None:
+    lookup(user_ids[0])  # compile and warm the cache outside the timing
+    started = time.perf_counter()
+    found = sum(len(lookup(user_id)) for user_id in user_ids)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {elapsed / len(user_ids) * 1e3:10.3f} ms/lookup  ({found} chats found)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--members", type=int, default=2, help="members per chat, creator included")
+    parser.add_argument("--lookups", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'chats.db')}")
+        started = time.perf_counter()
+        build(engine, args.chats, args.users, args.members)
+        print(f"built {args.chats} chats in {time.perf_counter() - started:.1f}s")
+
+        db = sessionmaker(bind=engine)()
+        user_ids = random.Random(11).sample(range(1, args.users + 1), args.lookups)
+        json_contains = text(
+            "SELECT id FROM chats_json WHERE EXISTS "
+            "(SELECT 1 FROM json_each(chats_json.participant_ids) WHERE value = :user_id)"
+        )
+        measure("JSON participant_ids scan", lambda user_id: db.execute(json_contains, {"user_id": user_id}).all(), user_ids)
+        measure(
+            "chat_members (user_id, chat_id)",
+            lambda user_id: db.query(Chat.id).filter(Chat.id.in_(user_chat_ids(user_id))).all(),
+            user_ids,
+        )
+        chat_ids = random.Random(13).sample(range(1, args.chats + 1), args.lookups)
+        is_member(db, chat_ids[0], user_ids[0])
+        started = time.perf_counter()
+        for chat_id, user_id in zip(chat_ids, user_ids):
+            is_member(db, chat_id, user_id)
+        print(f"{'is_member (primary key)':<34} {(time.perf_counter() - started) / len(chat_ids) * 1e3:10.3f} ms/lookup")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Render time per email for the digest and notification templates.
+
+Compares parsing the template source on every send (what EmailService did before)
+with rendering from the compiled registry.
+
+    python benchmarks/email_render.py --emails 2000 --items 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape  # noqa: E402
+
+from app.services.email_templates import TEMPLATE_DIR, EmailTemplateRegistry  # noqa: E402
+
+
+def digest_context(i: int, items: int) -> dict:
+    return {
+        "to_name": f"User {i}",
+        "digest_type": "daily",
+        "notifications": [
+            {"title": f"Application #{n}", "message": "A freelancer applied to your task", "created_at": "2024-01-01"}
+            for n in range(items)
+        ],
+    }
+
+
+def task_context(i: int) -> dict:
+    return {
+        "user_name": f"User {i}",
+        "current_date": "January 01, 2024",
+        "unsubscribe_url": "https://freelanceai.com/unsubscribe",
+        "data": {
+            "task_id": i, "task_title": "Landing page", "task_description": "Build a landing page " * 20,
+            "budget_min": 100, "budget_max": 500, "category": "web", "max_applications": 10,
+        },
+    }
+
+
+def measure(name: str, render, count: int) -> None:
+    started = time.perf_counter()
+    for i in range(count):
+        render(i)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {elapsed / count * 1e6:9.1f} us/email")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=10, help="notifications per digest")
+    args = parser.parse_args()
+
+    registry = EmailTemplateRegistry()
+    registry.preload()
+
+    def uncached(name, context):
+        # A fresh environment has no compiled templates, like Template(source) per send
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+        return env.get_template(name).render(**context)
+
+    measure("digest, parsed per send", lambda i: uncached("digest.html", digest_context(i, args.items)), args.emails)
+    measure("digest, compiled", lambda i: registry.render("digest.html", digest_context(i, args.items)), args.emails)
+    measure("task_created, parsed per send", lambda i: uncached("task_created.html", task_context(i)), args.emails)
+    measure("task_created, compiled", lambda i: registry.render("task_created.html", task_context(i)), args.emails)
+
+
+if __name__ == "__main__":
+    main()
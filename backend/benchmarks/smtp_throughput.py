@@ -0,0 +1,85 @@
+"""
+Email throughput with one SMTP session per message versus the pooled sender.
+
+Point it at a local debugging server so nothing is delivered, e.g.
+
+    python -m aiosmtpd -n -l localhost:1025
+    python benchmarks/smtp_throughput.py --port 1025 --messages 500 --threads 4
+
+Against a real provider pass --tls and credentials; --rate applies the same
+per-provider cap the application uses.
+"""
+
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.email_service import EmailService  # noqa: E402
+from app.services.smtp_pool import SMTPConnectionPool  # noqa: E402
+
+
+def emails(count: int):
+    return [
+        {
+            "to_email": f"user{i}@example.com",
+            "subject": "Your Daily FreelanceAI Digest",
+            "html_content": f"<p>You have {i % 7} new notifications</p>" * 20,
+        }
+        for i in range(count)
+    ]
+
+
+def unpooled(service: EmailService, args, batch) -> int:
+    """The old path: connect, STARTTLS and login for every message."""
+    sent = 0
+    for email in batch:
+        with smtplib.SMTP(args.host, args.port) as server:
+            if args.tls:
+                server.starttls()
+            if args.user:
+                server.login(args.user, args.password)
+            server.send_message(service._build_message(**email))
+        sent += 1
+    return sent
+
+
+def run(name: str, send, batches) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(batches)) as executor:
+        sent = sum(executor.map(send, batches))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} {sent:>7} sent  {elapsed:8.2f}s  {sent / elapsed:9.1f} msg/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--user", default="")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4, help="concurrent senders, also the pool size")
+    parser.add_argument("--rate", type=float, default=0.0, help="messages per second, 0 for no cap")
+    args = parser.parse_args()
+
+    pool = SMTPConnectionPool(
+        args.host, args.port, args.user, args.password,
+        use_tls=args.tls, size=args.threads, rate_limit=args.rate,
+    )
+    service = EmailService(args.host, args.port, args.user, args.password, "bench@freelanceai.com", pool=pool)
+    batches = [emails(args.messages)[i::args.threads] for i in range(args.threads)]
+
+    run("unpooled", lambda batch: unpooled(service, args, batch), batches)
+    run("pooled", service.send_bulk_emails, batches)
+    pool.close()
+    print(pool.stats())
+
+
+if __name__ == "__main__":
+    main()
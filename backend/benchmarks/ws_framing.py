@@ -0,0 +1,102 @@
+"""
+Bytes-per-event and frames-per-second for the WebSocket wire formats.
+
+Encodes bursts of notification events the way ClientConnection would send them
+and compares the legacy format (one JSON frame per event) with coalesced JSON and
+MessagePack frames, each with and without permessage-deflate.
+
+    python benchmarks/ws_framing.py --events 20000 --burst 20
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.websockets.framing import Framer, JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, frame_size, msgpack  # noqa: E402
+
+
+def make_event(i: int) -> dict:
+    """Same shape NotificationService pushes."""
+    return {
+        "event_id": i,
+        "type": "notification",
+        "data": {
+            "id": 100000 + i,
+            "title": "New application received",
+            "message": f"Freelancer #{i % 500} applied to your task",
+            "notification_type": "application",
+            "category": "tasks",
+            "priority": "normal",
+            "created_at": datetime(2024, 1, 1, 12, 0, i % 60).isoformat(),
+            "data": {"task_id": i % 1000, "application_id": i},
+        },
+    }
+
+
+class Deflater:
+    """permessage-deflate with context takeover, as negotiated by default."""
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+    def __call__(self, frame) -> int:
+        data = frame if isinstance(frame, bytes) else frame.encode("utf-8")
+        out = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return len(out) - 4  # the trailing 00 00 ff ff is not sent
+
+
+def run(subprotocol, deflate: bool, events: list, burst: int):
+    framer = Framer(subprotocol)
+    step = burst if framer.batching else 1
+    deflater = Deflater() if deflate else None
+    frames = total = 0
+    started = time.perf_counter()
+    for i in range(0, len(events), step):
+        frame = framer.encode(events[i:i + step])
+        total += deflater(frame) if deflater else frame_size(frame)
+        frames += 1
+    elapsed = time.perf_counter() - started
+    return frames, total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=20, help="events coalesced into one frame")
+    args = parser.parse_args()
+
+    events = [make_event(i) for i in range(args.events)]
+    modes = [
+        ("legacy json (before)", None, False),
+        ("legacy json + deflate", None, True),
+        ("batched json", JSON_SUBPROTOCOL, False),
+        ("batched json + deflate", JSON_SUBPROTOCOL, True),
+    ]
+    if msgpack is not None:
+        modes += [
+            ("batched msgpack", MSGPACK_SUBPROTOCOL, False),
+            ("batched msgpack + deflate", MSGPACK_SUBPROTOCOL, True),
+        ]
+    else:
+        print("msgpack is not installed; skipping the MessagePack subprotocol\n")
+
+    print(f"{args.events} events, bursts of {args.burst}\n")
+    print(f"{'mode':<28}{'frames':>8}{'bytes/event':>13}{'frames/s':>12}{'events/s':>12}")
+    baseline = None
+    for name, subprotocol, deflate in modes:
+        frames, total, elapsed = run(subprotocol, deflate, events, args.burst)
+        per_event = total / len(events)
+        baseline = baseline or per_event
+        print(
+            f"{name:<28}{frames:>8}{per_event:>13.1f}{frames / elapsed:>12.0f}{len(events) / elapsed:>12.0f}"
+            f"   ({per_event / baseline:.0%} of before)"
+        )
+
+
+if __name__ == "__main__":
+    main()
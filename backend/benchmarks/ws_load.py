@@ -0,0 +1,489 @@
+"""
+Load test for the WebSocket gateway: how many sockets and messages per second
+one worker sustains before delivery latency collapses.
+
+Opens N simulated clients against /ws/{token}, drives notifications and/or chat
+messages at a fixed rate and reports connect rate, delivery latency percentiles,
+memory per connection and event-loop lag.
+
+In-process (default) the real gateway, connection manager and chat writer run on
+this event loop behind a raw ASGI transport, so loop lag is the server's own.
+Chat messages are stored in a throwaway SQLite database.
+
+    python benchmarks/ws_load.py --clients 2000 --rate 5000 --duration 20
+    python benchmarks/ws_load.py --scenario chat --clients 1000 --rate 2000
+
+Against a running uvicorn (`--url ws://localhost:8000`), notifications are
+published through the Redis backplane (WEBSOCKET_BACKPLANE=redis) and chat needs
+users 1..N in the server's database; chats are created for consecutive pairs.
+Pass `--server-pid` to sample the server's memory.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jose import jwt  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.websockets.framing import Framer, JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, batch_events  # noqa: E402
+
+TICK = 0.01
+
+
+def make_token(user_id: int) -> str:
+    claims = {"sub": f"bench{user_id}@example.com", "uid": user_id, "exp": datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size from /proc; None where that is not available."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class ASGIWebSocket:
+    """WebSocket client speaking raw ASGI to an app on the same event loop."""
+
+    def __init__(self, app, path: str, subprotocols: List[str]):
+        self.app = app
+        self.path = path
+        self.subprotocols = subprotocols
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        path, _, query = self.path.partition("?")
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": self.subprotocols,
+        }
+        self.task = asyncio.create_task(self.app(scope, self.to_app.get, self.from_app.put))
+        await self.to_app.put({"type": "websocket.connect"})
+        message = await self.from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"rejected: {message}")
+
+    async def recv(self):
+        message = await self.from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"closed with {message.get('code')}")
+        return message.get("text") if message.get("text") is not None else message.get("bytes")
+
+    async def send(self, text: str) -> None:
+        await self.to_app.put({"type": "websocket.receive", "text": text})
+
+    async def close(self) -> None:
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
+
+
+class RemoteWebSocket:
+    """Same interface over a real socket to a running server."""
+
+    def __init__(self, url: str, subprotocols: List[str]):
+        self.url = url
+        self.subprotocols = subprotocols
+        self.socket = None
+
+    async def connect(self) -> None:
+        import websockets
+
+        self.socket = await websockets.connect(
+            self.url, subprotocols=self.subprotocols or None, compression="deflate", max_queue=None
+        )
+
+    async def recv(self):
+        return await self.socket.recv()
+
+    async def send(self, text: str) -> None:
+        await self.socket.send(text)
+
+    async def close(self) -> None:
+        await self.socket.close()
+
+
+class Client:
+    """One simulated user: answers heartbeats and timestamps what it receives."""
+
+    def __init__(self, user_id: int, transport, framer: Framer, stats: "Stats"):
+        self.user_id = user_id
+        self.transport = transport
+        self.framer = framer
+        self.stats = stats
+        self.chat_id: Optional[int] = None
+        self.sent = 0
+        self.reader: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        await self.transport.connect()
+        # Wait for the gateway's greeting so connect time covers authentication
+        while True:
+            events = self._decode(await self.transport.recv())
+            if any(event.get("type") == "connection" for event in events):
+                break
+        self.reader = asyncio.create_task(self._read())
+
+    def _decode(self, frame) -> List[Dict[str, Any]]:
+        if isinstance(frame, bytes):
+            return batch_events(self.framer.decode(data=frame))
+        return batch_events(self.framer.decode(text=frame))
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                frame = await self.transport.recv()
+                received = time.time()
+                self.stats.frames += 1
+                for event in self._decode(frame):
+                    self._on_event(event, received)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            self.stats.errors.append(str(e))
+
+    def _on_event(self, event: Dict[str, Any], received: float) -> None:
+        kind = event.get("type")
+        if kind == "ping":
+            asyncio.create_task(self.transport.send(json.dumps({"type": "pong", "timestamp": event.get("timestamp")})))
+        elif kind == "bench":
+            self.stats.delivered("notification", received - event["sent_at"])
+        elif kind == "chat_message" and event.get("sender_id") != self.user_id:
+            self.stats.delivered("chat", received - json.loads(event["content"])["sent_at"])
+        elif kind == "chat_ack":
+            self.stats.acks += 1
+        elif kind in ("error", "chat_error"):
+            self.stats.errors.append(event.get("detail") or event.get("message"))
+
+    async def send_chat(self) -> None:
+        self.sent += 1
+        await self.transport.send(json.dumps({
+            "type": "chat_message",
+            "chat_id": self.chat_id,
+            "client_msg_id": f"{self.user_id}-{self.sent}",
+            "content": json.dumps({"sent_at": time.time()}),
+        }))
+
+    async def close(self) -> None:
+        if self.reader is not None:
+            self.reader.cancel()
+        try:
+            await self.transport.close()
+        except Exception:
+            pass
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {"notification": [], "chat": []}
+        self.published: Dict[str, int] = {"notification": 0, "chat": 0}
+        self.frames = 0
+        self.acks = 0
+        self.errors: List[str] = []
+        self.loop_lag: List[float] = []
+
+    def delivered(self, kind: str, latency: float) -> None:
+        self.latencies[kind].append(max(latency, 0.0))
+
+
+async def monitor_loop_lag(stats: Stats, stop: asyncio.Event, interval: float = 0.01) -> None:
+    """Measure how late the loop wakes a sleeper; the server's lag when run in-process."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(time.perf_counter() - started - interval, 0.0))
+
+
+async def drive(rate: float, duration: float, publish) -> None:
+    """Call `publish()` `rate` times per second, catching up if a tick runs late."""
+    started = time.perf_counter()
+    done = 0
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            return
+        for _ in range(int(elapsed * rate) - done):
+            await publish()
+            done += 1
+        await asyncio.sleep(TICK)
+
+
+class InProcessTarget:
+    """The real gateway stack mounted on a minimal app in this process."""
+
+    def __init__(self, scenario: str):
+        from fastapi import FastAPI, WebSocket
+
+        from app.websockets import chat as websocket_chat  # noqa: F401 - registers the chat handler
+        from app.websockets import gateway
+        from app.websockets.notification_manager import notification_manager
+
+        self.manager = notification_manager
+        self.scenario = scenario
+        self.app = FastAPI()
+
+        @self.app.websocket("/ws/{token}")
+        async def websocket_route(websocket: WebSocket, token: str):
+            await gateway.websocket_endpoint(websocket, token)
+
+        self.tmpdir = None
+
+    def transport(self, path: str, subprotocols: List[str]):
+        return ASGIWebSocket(self.app, path, subprotocols)
+
+    async def setup(self, clients: List[Client]) -> None:
+        await self.manager.start()
+        if self.scenario in ("chat", "mixed"):
+            await self._setup_chat(clients)
+
+    async def _setup_chat(self, clients: List[Client]) -> None:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        from app.db_models import Base, Chat, Message, User
+        from app.services import chat_message_writer as writer_module
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/chat.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine, tables=[User.__table__, Chat.__table__, Message.__table__])
+        writer = writer_module.chat_message_writer
+        writer.session_factory = sessionmaker(bind=engine)
+        for chat_id, (a, b) in enumerate(pairs(clients), start=1):
+            a.chat_id = b.chat_id = chat_id
+            writer_module._participants[chat_id] = (float("inf"), {a.user_id, b.user_id})
+        await writer.start()
+
+    async def publish_notification(self, user_id: int, payload: Dict[str, Any]) -> None:
+        await self.manager.send_personal_notification(user_id, payload)
+
+    async def teardown(self) -> None:
+        from app.services.chat_message_writer import chat_message_writer
+
+        await chat_message_writer.stop()
+        await self.manager.stop()
+        if self.tmpdir is not None:
+            self.tmpdir.cleanup()
+
+
+class RemoteTarget:
+    """A running server; notifications go through its Redis backplane."""
+
+    def __init__(self, url: str, scenario: str):
+        self.url = url.rstrip("/")
+        self.scenario = scenario
+        self.backplane = None
+
+    def transport(self, path: str, subprotocols: List[str]):
+        return RemoteWebSocket(self.url + path, subprotocols)
+
+    async def setup(self, clients: List[Client]) -> None:
+        if self.scenario in ("notifications", "mixed"):
+            from app.websockets.backplane import RedisBackplane
+
+            self.backplane = RedisBackplane(settings.REDIS_URL, settings.WEBSOCKET_BACKPLANE_CHANNEL)
+
+            async def ignore(envelope):
+                pass
+
+            await self.backplane.start(ignore)
+        if self.scenario in ("chat", "mixed"):
+            from app.database import SessionLocal
+            from app.db_models import Chat
+
+            db = SessionLocal()
+            try:
+                for a, b in pairs(clients):
+                    chat = Chat(title="ws_load", creator_id=a.user_id, participant_ids=[a.user_id, b.user_id])
+                    db.add(chat)
+                    db.flush()
+                    a.chat_id = b.chat_id = chat.id
+                db.commit()
+            finally:
+                db.close()
+
+    async def publish_notification(self, user_id: int, payload: Dict[str, Any]) -> None:
+        await self.backplane.publish({
+            "kind": "user", "user_id": user_id, "data": payload, "origin": "ws_load", "sent_at": time.time()
+        })
+
+    async def teardown(self) -> None:
+        if self.backplane is not None:
+            await self.backplane.stop()
+
+
+def pairs(clients: List[Client]):
+    return [(clients[i], clients[i + 1]) for i in range(0, len(clients) - 1, 2)]
+
+
+async def run(args) -> Dict[str, Any]:
+    target = RemoteTarget(args.url, args.scenario) if args.url else InProcessTarget(args.scenario)
+    subprotocols = {"legacy": [], "json": [JSON_SUBPROTOCOL], "msgpack": [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]}[args.protocol]
+    framer = Framer(subprotocols[0] if subprotocols else None)
+    stats = Stats()
+    user_ids = range(args.first_user_id, args.first_user_id + args.clients)
+    clients = [
+        Client(user_id, target.transport(f"/ws/{make_token(user_id)}", subprotocols), framer, stats)
+        for user_id in user_ids
+    ]
+
+    server_pid = args.server_pid if args.url else None
+    rss_before = rss_bytes(server_pid)
+    gate = asyncio.Semaphore(args.connect_concurrency)
+    failed: List[str] = []
+
+    async def connect(client: Client) -> None:
+        async with gate:
+            try:
+                await client.connect()
+            except Exception as e:
+                failed.append(str(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in clients))
+    connect_seconds = time.perf_counter() - started
+    connected = [client for client in clients if client.reader is not None]
+    rss_after = rss_bytes(server_pid)
+
+    await target.setup(connected)
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stats, stop))
+
+    async def publish_notification() -> None:
+        client = random.choice(connected)
+        stats.published["notification"] += 1
+        await target.publish_notification(client.user_id, {
+            "type": "bench",
+            "sent_at": time.time(),
+            "data": {"title": "Load test", "message": "x" * args.payload_bytes},
+        })
+
+    async def publish_chat() -> None:
+        client = random.choice([client for client in connected if client.chat_id is not None])
+        stats.published["chat"] += 1
+        await client.send_chat()
+
+    drivers = []
+    if connected and args.scenario in ("notifications", "mixed"):
+        drivers.append(drive(args.rate, args.duration, publish_notification))
+    if len(connected) > 1 and args.scenario in ("chat", "mixed"):
+        drivers.append(drive(args.chat_rate or args.rate, args.duration, publish_chat))
+    run_started = time.perf_counter()
+    await asyncio.gather(*drivers)
+    run_seconds = time.perf_counter() - run_started
+    # Let in-flight deliveries land before counting
+    await asyncio.sleep(args.settle)
+    stop.set()
+    await lag_task
+
+    await asyncio.gather(*(client.close() for client in clients))
+    await target.teardown()
+
+    report: Dict[str, Any] = {
+        "mode": "remote" if args.url else "in-process",
+        "scenario": args.scenario,
+        "protocol": args.protocol,
+        "clients": args.clients,
+        "connected": len(connected),
+        "connect_failures": len(failed),
+        "connect_seconds": round(connect_seconds, 3),
+        "connects_per_second": round(len(connected) / connect_seconds, 1) if connect_seconds else None,
+        "memory_per_connection_bytes": (
+            round((rss_after - rss_before) / len(connected)) if connected and rss_before and rss_after else None
+        ),
+        "frames_received": stats.frames,
+        "frames_per_second": round(stats.frames / run_seconds, 1) if run_seconds else None,
+        "chat_acks": stats.acks,
+        "errors": len(stats.errors),
+        "loop_lag_ms": {
+            "p50": _ms(percentile(stats.loop_lag, 50)),
+            "p99": _ms(percentile(stats.loop_lag, 99)),
+            "max": _ms(max(stats.loop_lag, default=None)),
+        },
+    }
+    for kind, latencies in stats.latencies.items():
+        if stats.published[kind]:
+            # Chat counts the peer's copy only, so expect one delivery per publish
+            report[kind] = {
+                "published": stats.published[kind],
+                "delivered": len(latencies),
+                "delivered_per_second": round(len(latencies) / run_seconds, 1),
+                "latency_ms": {q: _ms(percentile(latencies, int(q[1:]))) for q in ("p50", "p90", "p99")},
+                "latency_max_ms": _ms(max(latencies, default=None)),
+            }
+    if failed:
+        report["first_connect_failure"] = failed[0]
+    if stats.errors:
+        report["first_error"] = stats.errors[0]
+    return report
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="ws://host:port of a running server; in-process when omitted")
+    parser.add_argument("--scenario", choices=["notifications", "chat", "mixed"], default="notifications")
+    parser.add_argument("--protocol", choices=["legacy", "json", "msgpack"], default="legacy")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=1000, help="notifications per second")
+    parser.add_argument("--chat-rate", type=float, help="chat messages per second (defaults to --rate)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait for stragglers")
+    parser.add_argument("--payload-bytes", type=int, default=200)
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--server-pid", type=int, help="sample this process's RSS in remote mode")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        if isinstance(value, dict):
+            print(f"{key}:")
+            for inner_key, inner_value in value.items():
+                print(f"  {inner_key:<24}{inner_value}")
+        else:
+            print(f"{key:<28}{value}")
+
+
+if __name__ == "__main__":
+    main()
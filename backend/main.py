@@ -3,4 +3,13 @@ from app.main import app
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.core.config import settings
+
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        ws_ping_interval=settings.WEBSOCKET_PING_INTERVAL,
+        ws_ping_timeout=settings.WEBSOCKET_PING_TIMEOUT,
+        ws_per_message_deflate=settings.WEBSOCKET_PER_MESSAGE_DEFLATE,
+    )
@@ -0,0 +1,38 @@
+"""
+Shared fixtures for the unit tests.
+
+Only the models are imported here, not app.main, so these fixtures work
+without building the application.
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db_models import Base
+
+
+@pytest.fixture
+def db_tables():
+    """Models whose tables the in-memory database gets; override per test module."""
+    return []
+
+
+@pytest.fixture
+def session_factory(db_tables):
+    """Session factory bound to a fresh in-memory SQLite database shared across threads."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine, tables=[model.__table__ for model in db_tables])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    """A session on the in-memory database."""
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,102 @@
+"""
+Unit tests for AI call instrumentation.
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from app.core.monitoring import AICallWindow, AI_CACHE_COUNT, AI_CALL_COUNT, AI_FALLBACK_COUNT
+from app.services import ai_service as ai_module
+from app.services.ai_service import AIService, MistralMessage
+
+
+class TestAICallWindow:
+    """Test the sliding-window usage report."""
+
+    def test_summary_ranks_calls_and_rates(self):
+        """Test per-feature rates and slowest/most expensive ordering."""
+        window = AICallWindow(window_seconds=3600)
+        window.add({"feature": "assistant", "outcome": "success", "latency": 2.0, "cost": 0.01, "prompt_tokens": 100})
+        window.add({"feature": "assistant", "outcome": "cache_hit", "latency": 0.0, "cost": 0.0})
+        window.add({"feature": "kyc_review", "outcome": "success", "latency": 5.0, "cost": 0.002})
+        window.add({"feature": "kyc_review", "outcome": "fallback", "latency": 30.0, "cost": 0.0})
+
+        summary = window.summary(limit=2)
+        assert summary["features"]["assistant"]["cache_hit_rate"] == 0.5
+        assert summary["features"]["kyc_review"]["fallback_rate"] == 0.5
+        assert summary["features"]["kyc_review"]["avg_latency"] == 5.0
+        assert [call["latency"] for call in summary["slowest"]] == [30.0, 5.0]
+        assert summary["most_expensive"][0]["feature"] == "assistant"
+
+    def test_old_calls_leave_the_window(self):
+        """Test calls older than the window are pruned."""
+        window = AICallWindow(window_seconds=60)
+        window.add({"feature": "assistant", "outcome": "success", "latency": 1.0, "timestamp": 0})
+        assert window.summary()["total_calls"] == 0
+
+
+class TestAIServiceInstrumentation:
+    """Test metrics recorded by the Mistral client."""
+
+    @pytest.mark.asyncio
+    async def test_missing_key_counts_as_fallback(self):
+        """Test calls without an API key are recorded as fallbacks."""
+        service = AIService()
+        service.api_key = None
+        before = AI_FALLBACK_COUNT.labels(feature="unit_test", reason="not_configured")._value.get()
+
+        result = await service._call_mistral_api([MistralMessage(role="user", content="hi")], feature="unit_test")
+
+        assert result is None
+        assert AI_FALLBACK_COUNT.labels(feature="unit_test", reason="not_configured")._value.get() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_identical_prompts_hit_the_cache(self):
+        """Test a cached response is served without calling the API."""
+        service = AIService()
+        service.api_key = "test"
+        service.cacheable_features = {"unit_test"}
+        messages = [MistralMessage(role="user", content="cached prompt")]
+        payload = {"model": service.model, "messages": [m.dict() for m in messages], "temperature": 0.3, "max_tokens": 2000}
+        service._cache_put(hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest(), "cached answer")
+        before = AI_CALL_COUNT.labels(feature="unit_test", outcome="cache_hit")._value.get()
+
+        assert await service._call_mistral_api(messages, feature="unit_test") == "cached answer"
+        assert AI_CALL_COUNT.labels(feature="unit_test", outcome="cache_hit")._value.get() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_features_without_opt_in_bypass_the_cache(self, monkeypatch):
+        """Test a feature that is not cacheable asks the model every time."""
+        calls = []
+
+        class FakeResponse:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return {"choices": [{"message": {"content": f"answer {len(calls)}"}}], "usage": {}}
+
+        class FakeClient:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def post(self, url, **kwargs):
+                calls.append(kwargs["json"])
+                return FakeResponse()
+
+        monkeypatch.setattr(ai_module.httpx, "AsyncClient", FakeClient)
+        service = AIService()
+        service.api_key = "test"
+        messages = [MistralMessage(role="user", content="same prompt")]
+        before = AI_CACHE_COUNT.labels(feature="uncached_test", result="bypass")._value.get()
+
+        assert await service._call_mistral_api(messages, feature="uncached_test") == "answer 1"
+        assert await service._call_mistral_api(messages, feature="uncached_test") == "answer 2"
+        assert len(service.cache) == 0
+        assert AI_CACHE_COUNT.labels(feature="uncached_test", result="bypass")._value.get() == before + 2
+
@@ -0,0 +1,87 @@
+"""
+Unit tests for the bulk notification path.
+"""
+
+import pytest
+
+from app.db_models import (
+    Notification, NotificationOutbox, NotificationSetting, NotificationType, UnreadCounter, User
+)
+from app.services import notification_service as notification_module
+from app.services.notification_preferences import notification_preferences
+from app.services.notification_service import NotificationService
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Notification, NotificationSetting, NotificationOutbox, UnreadCounter]
+
+
+@pytest.fixture
+def db(db):
+    # User ids repeat across tests; start each one with cold preferences
+    notification_preferences.clear()
+    return db
+
+
+def _outbox(db, channel):
+    return {row.user_id for row in db.query(NotificationOutbox).filter(NotificationOutbox.channel == channel)}
+
+
+class TestSendBulkNotifications:
+    """Test chunked inserts and the outbox rows written with them."""
+
+    def test_inserts_one_row_per_recipient_in_chunks(self, db, monkeypatch):
+        """Test duplicates are collapsed and every notification gets its outbox rows."""
+        monkeypatch.setattr(notification_module.app_settings, "NOTIFICATION_BULK_CHUNK_SIZE", 2)
+        service = NotificationService()
+
+        created = service.send_bulk_notifications(db, [1, 2, 3, 2, 4, 5], "Hello", "Announcement")
+
+        assert [n.user_id for n in created] == [1, 2, 3, 4, 5]
+        assert db.query(Notification).count() == 5
+        assert _outbox(db, "websocket") == {1, 2, 3, 4, 5}
+        assert _outbox(db, "push") == {1, 2, 3, 4, 5}
+        # No email service configured, so nothing to send
+        assert _outbox(db, "email") == set()
+
+    def test_respects_preferences(self, db):
+        """Test channels a user disabled get no outbox row."""
+        db.add_all([
+            NotificationSetting(
+                user_id=1, notification_type=NotificationType.SYSTEM_MESSAGE,
+                email_enabled=False, push_enabled=True,
+            ),
+            NotificationSetting(
+                user_id=2, notification_type=NotificationType.SYSTEM_MESSAGE,
+                email_enabled=True, push_enabled=False,
+            ),
+        ])
+        db.commit()
+
+        NotificationService(email_service=object()).send_bulk_notifications(db, [1, 2, 3], "Hi", "There")
+
+        assert _outbox(db, "email") == {2, 3}
+        assert _outbox(db, "push") == {1, 3}
+
+    def test_payload_is_ready_to_push(self, db):
+        """Test the WebSocket row carries the full payload so dispatch needs no query."""
+        created = NotificationService().send_bulk_notifications(db, [7], "Hi", "There", category="task")
+        row = db.query(NotificationOutbox).filter(NotificationOutbox.channel == "websocket").one()
+
+        assert row.payload["type"] == "notification"
+        assert row.payload["data"]["id"] == created[0].id
+        assert row.payload["data"]["category"] == "task"
+        assert row.dedup_key == f"{created[0].id}:websocket"
+
+
+class TestSendNotification:
+    """Test the single-recipient path writes through the outbox."""
+
+    def test_notification_and_outbox_commit_together(self, db):
+        """Test one call stores the notification and its deliveries, without a running loop."""
+        notification = NotificationService().send_notification(db, 3, "Paid", "Payment received", send_email=False)
+
+        assert notification.id is not None
+        rows = db.query(NotificationOutbox).filter(NotificationOutbox.notification_id == notification.id).all()
+        assert sorted(row.channel for row in rows) == ["push", "websocket"]
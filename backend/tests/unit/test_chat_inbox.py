@@ -0,0 +1,95 @@
+"""
+Unit tests for the single-query chat inbox.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.db_models import Chat, ChatFile, ChatMember, ChatRead, Message, User
+from app.services.chat_inbox import SNIPPET_LENGTH, inbox, refresh_last_message, touch_chat
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Chat, ChatMember, ChatRead, Message, ChatFile]
+
+
+@pytest.fixture
+def db(db):
+    for user_id, name in ((1, "Ann"), (2, "Bob"), (3, "Cid")):
+        db.add(User(
+            id=user_id, username=name.lower(), email=f"{name.lower()}@example.com",
+            hashed_password="x", full_name=name,
+        ))
+    db.add(Chat(id=1, title="Logo", creator_id=1, participant_ids=[2]))
+    db.add(Chat(id=2, title="Site", creator_id=3, participant_ids=[1]))
+    db.add(Chat(id=3, title="Empty", creator_id=1, participant_ids=[3]))
+    db.commit()
+    return db
+
+
+def _send(db, chat_id, sender_id, content, at):
+    message = Message(chat_id=chat_id, sender_id=sender_id, content=content, created_at=at)
+    db.add(message)
+    db.flush()
+    touch_chat(db, chat_id, message.id, at)
+    return message
+
+
+class TestInbox:
+    """Test the inbox rows and the denormalized last message."""
+
+    def test_rows(self, db):
+        """Test order, previews and per-chat unread counts for one user."""
+        start = datetime(2026, 1, 1)
+        _send(db, 1, 2, "hi", start)
+        read = _send(db, 2, 3, "first", start + timedelta(minutes=1))
+        _send(db, 2, 3, "second", start + timedelta(minutes=2))
+        _send(db, 2, 1, "x" * 500, start + timedelta(minutes=3))
+        db.add(ChatRead(chat_id=2, user_id=1, last_read_message_id=read.id))
+        db.commit()
+
+        rows = inbox(db, 1)
+
+        assert [row["chat_id"] for row in rows] == [2, 1, 3]
+        assert [row["unread_count"] for row in rows] == [1, 1, 0]
+        site = rows[0]["last_message"]
+        assert site["is_own"] and site["sender_name"] == "Ann"
+        assert len(site["snippet"]) == SNIPPET_LENGTH and site["snippet"].endswith("…")
+        assert rows[1]["last_message"]["snippet"] == "hi"
+        assert rows[2]["last_message"] is None
+        assert [row["chat_id"] for row in inbox(db, 2)] == [1]
+
+    def test_one_query(self, db):
+        """Test the whole list is read in a single statement."""
+        for chat_id in (1, 2, 3):
+            _send(db, chat_id, 1, "hello", datetime(2026, 1, chat_id))
+        db.commit()
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.get_bind(), "before_cursor_execute", listener)
+        try:
+            assert len(inbox(db, 1)) == 3
+        finally:
+            event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+
+    def test_last_message_only_moves_forward(self, db):
+        """Test a writer that commits late cannot move the chat back, and deletes fall back."""
+        older = _send(db, 1, 2, "older", datetime(2026, 1, 1))
+        newer = _send(db, 1, 1, "newer", datetime(2026, 1, 2))
+        touch_chat(db, 1, older.id, datetime(2026, 1, 1))
+        db.commit()
+        chat = db.get(Chat, 1)
+        db.refresh(chat)
+        assert chat.last_message_id == newer.id
+
+        db.delete(newer)
+        db.flush()
+        refresh_last_message(db, 1)
+        db.commit()
+        db.refresh(chat)
+        assert (chat.last_message_id, chat.last_message_at.replace(tzinfo=None)) == (older.id, datetime(2026, 1, 1))
@@ -0,0 +1,53 @@
+"""
+Unit tests for chat membership.
+"""
+
+import pytest
+
+from app.db_models import Chat, ChatMember, User
+from app.services.chat_membership import chat_recipients, find_direct_chat, is_member, user_chat_ids
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Chat, ChatMember]
+
+
+@pytest.fixture
+def db(db):
+    db.add(Chat(id=1, title="Direct", creator_id=1, participant_ids=[2]))
+    db.add(Chat(id=2, title="Group", is_group=True, creator_id=2, participant_ids=[1, 3]))
+    db.add(Chat(id=3, title="Other", creator_id=3, participant_ids=[4]))
+    db.commit()
+    return db
+
+
+class TestChatMembers:
+    """Test membership rows and lookups."""
+
+    def test_creator_is_a_member(self, db):
+        """Test participant_ids is backed by chat_members, creator included."""
+        assert db.get(Chat, 1).participant_ids == [1, 2]
+        assert db.query(ChatMember).filter_by(chat_id=2).count() == 3
+        assert Chat(participant_ids=[2, 3], creator_id=1).participant_ids == [1, 2, 3]
+
+    def test_updating_participants_replaces_rows(self, db):
+        """Test removed members lose their row and new ones get one."""
+        chat = db.get(Chat, 2)
+        chat.participant_ids = [4]
+        db.commit()
+
+        assert chat_recipients(db, [2]) == {2: {2, 4}}
+
+    def test_lookups(self, db):
+        """Test member checks and a user's chats."""
+        assert is_member(db, 1, 2)
+        assert not is_member(db, 3, 1)
+        assert chat_recipients(db, [1, 3, 99]) == {1: {1, 2}, 3: {3, 4}}
+        chat_ids = [chat_id for chat_id, in db.query(Chat.id).filter(Chat.id.in_(user_chat_ids(1))).order_by(Chat.id)]
+        assert chat_ids == [1, 2]
+
+    def test_find_direct_chat(self, db):
+        """Test the one-to-one chat is found from either side and group chats are skipped."""
+        assert find_direct_chat(db, 2, 1).id == 1
+        assert find_direct_chat(db, 1, 3) is None
@@ -0,0 +1,213 @@
+"""
+Unit tests for realtime chat and write-behind message persistence.
+"""
+
+import asyncio
+import pytest
+
+from app.db_models import Chat, ChatMember, Message, UnreadCounter, User
+from app.services.chat_message_writer import ChatMessageWriter
+from app.websockets import chat as websocket_chat
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Chat, ChatMember, Message, UnreadCounter]
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(Chat(id=1, title="Task 1", creator_id=1, participant_ids=[1, 2]))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+class Recorder:
+    """Collects delivered batches."""
+
+    def __init__(self):
+        self.delivered = []
+
+    async def __call__(self, messages):
+        self.delivered.extend(messages)
+
+
+class FakeConnection:
+    """Connection stand-in that records enqueued frames."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.sent = []
+
+    def enqueue(self, data):
+        self.sent.append(data)
+        return True
+
+
+class TestChatMessageWriter:
+    """Test batching, ordering and de-duplication."""
+
+    @pytest.mark.asyncio
+    async def test_flush_stores_batch_in_acceptance_order(self, session_factory):
+        """Test one flush bulk-inserts the buffer and delivers it in id order."""
+        recorder = Recorder()
+        writer = ChatMessageWriter(recorder, session_factory=session_factory)
+        for i in range(5):
+            writer.submit(1, 1 + i % 2, f"m{i}", f"hello {i}")
+        await writer.flush()
+
+        db = session_factory()
+        rows = db.query(Message).order_by(Message.id).all()
+        assert [row.client_msg_id for row in rows] == [f"m{i}" for i in range(5)]
+        assert db.get(Chat, 1).last_message_at is not None
+        db.close()
+        assert [message["id"] for message in recorder.delivered] == [row.id for row in rows]
+        assert writer.pending == [] and writer.inflight == {}
+        # Each participant counts the messages the other one sent
+        db = session_factory()
+        assert {row.user_id: row.messages for row in db.query(UnreadCounter)} == {1: 2, 2: 3}
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_resend_before_flush_is_a_duplicate(self, session_factory):
+        """Test resending a buffered message does not buffer it twice."""
+        writer = ChatMessageWriter(Recorder(), session_factory=session_factory)
+        first, duplicate = writer.submit(1, 1, "abc", "hi")
+        again, duplicate_again = writer.submit(1, 1, "abc", "hi")
+        await writer.flush()
+
+        assert not duplicate and duplicate_again and again is first
+        db = session_factory()
+        assert db.query(Message).count() == 1
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_resend_after_reconnect_is_stored_once(self, session_factory):
+        """Test a message already stored by another writer is skipped and not redelivered."""
+        await _send(ChatMessageWriter(Recorder(), session_factory=session_factory), "abc")
+        recorder = Recorder()
+        await _send(ChatMessageWriter(recorder, session_factory=session_factory), "abc")
+
+        db = session_factory()
+        assert db.query(Message).count() == 1
+        db.close()
+        assert recorder.delivered == []
+
+    @pytest.mark.asyncio
+    async def test_flush_loop_runs_in_background(self, session_factory):
+        """Test started writers flush on their own within the interval."""
+        recorder = Recorder()
+        writer = ChatMessageWriter(recorder, session_factory=session_factory, flush_interval=0.005)
+        await writer.start()
+        writer.submit(1, 2, "x", "ping")
+        for _ in range(100):
+            if recorder.delivered:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+        assert [message["client_msg_id"] for message in recorder.delivered] == ["x"]
+
+    @pytest.mark.asyncio
+    async def test_poison_message_is_isolated_and_dropped(self, session_factory):
+        """Test a message that cannot be stored is retried, then dropped without holding up the others."""
+        delivered, rejected = Recorder(), Recorder()
+        writer = ChatMessageWriter(
+            delivered, session_factory=session_factory, reject=rejected, max_attempts=2, retry_backoff=0
+        )
+        persist = writer._persist
+
+        def failing_persist(batch):
+            if any(message["client_msg_id"] == "bad" for message in batch):
+                raise RuntimeError("chat is gone")
+            return persist(batch)
+
+        writer._persist = failing_persist
+        for client_msg_id in ("a", "bad", "b"):
+            writer.submit(1, 1, client_msg_id, "hi")
+        await writer.flush()
+        assert [message["client_msg_id"] for message in delivered.delivered] == ["a", "b"]
+        assert [message["client_msg_id"] for message in writer.pending] == ["bad"]
+        assert rejected.delivered == []
+
+        await writer.flush()
+        assert writer.pending == [] and writer.inflight == {}
+        assert [message["client_msg_id"] for message in rejected.delivered] == ["bad"]
+        db = session_factory()
+        assert db.query(Message).count() == 2
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_backoff_holds_back_only_the_failing_chat(self, session_factory):
+        """Test other chats keep flushing while a failed message waits out its backoff."""
+        delivered, rejected = Recorder(), Recorder()
+        writer = ChatMessageWriter(
+            delivered, session_factory=session_factory, reject=rejected, max_attempts=3, retry_backoff=60
+        )
+        persist = writer._persist
+
+        def failing_persist(batch):
+            if any(message["chat_id"] == 2 for message in batch):
+                raise RuntimeError("chat is gone")
+            return persist(batch)
+
+        writer._persist = failing_persist
+        writer.submit(2, 1, "bad", "hi")
+        writer.submit(2, 1, "after-bad", "hi")
+        await writer.flush()
+        writer.submit(1, 1, "good", "hi")
+        await writer.flush()
+
+        assert [message["client_msg_id"] for message in delivered.delivered] == ["good"]
+        assert [message["client_msg_id"] for message in writer.pending] == ["bad", "after-bad"]
+
+        await writer.stop()
+        assert writer.pending == []
+        assert [message["client_msg_id"] for message in rejected.delivered] == ["bad", "after-bad"]
+
+
+async def _send(writer, client_msg_id):
+    writer.submit(1, 1, client_msg_id, "hi")
+    await writer.flush()
+
+
+class TestChatHandler:
+    """Test the gateway's chat_message frame handler."""
+
+    @pytest.mark.asyncio
+    async def test_ack_is_immediate(self, monkeypatch):
+        """Test a participant gets an ack before the message is stored."""
+        writer = ChatMessageWriter()
+
+        async def participants(chat_id):
+            return {1, 2}
+
+        monkeypatch.setattr(websocket_chat, "chat_message_writer", writer)
+        monkeypatch.setattr(websocket_chat, "chat_participants", participants)
+        connection = FakeConnection(1)
+        await websocket_chat.handle_chat_message(
+            connection, {"type": "chat_message", "chat_id": 1, "client_msg_id": "c1", "content": "hi"}
+        )
+
+        assert connection.sent[0]["type"] == "chat_ack"
+        assert connection.sent[0]["status"] == "accepted"
+        assert len(writer.pending) == 1
+
+    @pytest.mark.asyncio
+    async def test_non_participant_is_rejected(self, monkeypatch):
+        """Test users outside the chat cannot post to it."""
+        writer = ChatMessageWriter()
+
+        async def participants(chat_id):
+            return {1, 2}
+
+        monkeypatch.setattr(websocket_chat, "chat_message_writer", writer)
+        monkeypatch.setattr(websocket_chat, "chat_participants", participants)
+        connection = FakeConnection(3)
+        await websocket_chat.handle_chat_message(
+            connection, {"type": "chat_message", "chat_id": 1, "client_msg_id": "c1", "content": "hi"}
+        )
+
+        assert connection.sent[0]["type"] == "chat_error"
+        assert writer.pending == []
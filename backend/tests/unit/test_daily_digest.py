@@ -0,0 +1,99 @@
+"""
+Unit tests for the streaming daily digest job.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db_models import DigestState, Notification, NotificationType, User
+from app.services.digest_service import DigestBuilder
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Notification, DigestState]
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    now = datetime.utcnow()
+    for user_id in range(1, 6):
+        db.add(User(
+            id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+            hashed_password="x", full_name=f"User {user_id}",
+        ))
+        for n in range(user_id):
+            db.add(Notification(
+                user_id=user_id, title=f"n{n}", message="hi", type=NotificationType.SYSTEM_MESSAGE,
+                is_read=False, created_at=now - timedelta(hours=1),
+            ))
+    # Outside the digest: already read, or older than a day
+    db.add(Notification(user_id=1, title="read", message="", type=NotificationType.SYSTEM_MESSAGE,
+                        is_read=True, created_at=now - timedelta(hours=1)))
+    db.add(Notification(user_id=1, title="old", message="", type=NotificationType.SYSTEM_MESSAGE,
+                        is_read=False, created_at=now - timedelta(days=2)))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+class FakeEmailService:
+    """Records digests; raises a hard crash for one user if asked."""
+
+    def __init__(self, crash_on=None):
+        self.sent = {}
+        self.crash_on = crash_on
+
+    def send_digest_email(self, to_email, to_name, notifications, digest_type="daily"):
+        if to_email == self.crash_on:
+            raise SystemExit("worker killed")
+        self.sent[to_email] = [item["title"] for item in notifications]
+        return True
+
+
+class TestDigestBuilder:
+    """Test grouping, limits and checkpointed resume."""
+
+    def test_one_digest_per_user_with_unread_items(self, session_factory):
+        """Test each user gets one email listing only unread notifications from the window."""
+        email = FakeEmailService()
+        result = DigestBuilder(email, session_factory=session_factory, batch_size=2).run()
+
+        assert result == {"users": 5, "sent": 5, "resumed_after": 0}
+        assert email.sent["user1@example.com"] == ["n0"]
+        assert len(email.sent["user5@example.com"]) == 5
+        db = session_factory()
+        state = db.get(DigestState, "daily")
+        assert state.last_user_id == 5 and state.users_sent == 5 and state.completed_at is not None
+        db.close()
+
+    def test_long_digests_are_capped(self, session_factory):
+        """Test the item cap lists the first items and a remainder line."""
+        email = FakeEmailService()
+        DigestBuilder(email, session_factory=session_factory, max_items=2).run()
+
+        assert email.sent["user5@example.com"] == ["n0", "n1", "and 3 more"]
+
+    def test_crashed_run_resumes_after_checkpoint(self, session_factory):
+        """Test a rerun after a crash only emails users the first run had not finished."""
+        with pytest.raises(SystemExit):
+            DigestBuilder(
+                FakeEmailService(crash_on="user3@example.com"), session_factory=session_factory, batch_size=1
+            ).run()
+
+        email = FakeEmailService()
+        result = DigestBuilder(email, session_factory=session_factory, batch_size=1).run()
+
+        assert result["resumed_after"] == 2
+        assert sorted(email.sent) == ["user3@example.com", "user4@example.com", "user5@example.com"]
+
+    def test_completed_run_starts_a_new_window(self, session_factory):
+        """Test the next scheduled run does not treat a finished run as in progress."""
+        DigestBuilder(FakeEmailService(), session_factory=session_factory).run()
+        email = FakeEmailService()
+        result = DigestBuilder(email, session_factory=session_factory).run()
+
+        assert result["resumed_after"] == 0
+        assert len(email.sent) == 5
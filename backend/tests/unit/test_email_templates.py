@@ -0,0 +1,48 @@
+"""
+Unit tests for the compiled email template registry.
+"""
+
+from app.services.email_templates import EmailTemplateRegistry
+
+
+class TestEmailTemplateRegistry:
+    """Test compile-once caching and rendering."""
+
+    def test_templates_compile_once(self):
+        """Test repeated renders reuse the compiled template."""
+        registry = EmailTemplateRegistry()
+        first = registry.get("digest.html")
+        registry.render("digest.html", {"to_name": "Ann", "notifications": [], "digest_type": "daily"})
+
+        assert registry.get("digest.html") is first
+
+    def test_preload_compiles_every_template(self):
+        """Test startup compiles the layout and all email templates."""
+        registry = EmailTemplateRegistry()
+
+        assert registry.preload() >= 4
+        assert {"_layout.html", "digest.html", "fallback.html", "task_created.html"} <= set(registry._templates)
+
+    def test_digest_renders_items_escaped(self):
+        """Test digest items are rendered inside the shared layout, with HTML escaped."""
+        html = EmailTemplateRegistry().render("digest.html", {
+            "to_name": "Ann",
+            "digest_type": "weekly",
+            "notifications": [
+                {"title": "Payment received", "message": "<b>$50</b>", "created_at": "2024-01-01"},
+                {"message": "No title"},
+            ],
+        })
+
+        assert "Your Weekly Digest" in html
+        assert "Payment received" in html and "Notification" in html
+        assert "&lt;b&gt;$50&lt;/b&gt;" in html
+        assert ".footer" in html
+
+    def test_unknown_template_uses_fallback(self):
+        """Test a missing template renders the generic notification."""
+        registry = EmailTemplateRegistry()
+        html = registry.render("level_up.html", {"user_name": "Ann", "unsubscribe_url": "https://x/u"})
+
+        assert "Hello Ann!" in html and 'href="https://x/u"' in html
+        assert "level_up.html" in registry._missing
@@ -0,0 +1,111 @@
+"""
+Unit tests for the local embedding index.
+"""
+
+import numpy as np
+import pytest
+
+from app.db_models import Task, User
+from app.services.embedding_service import EmbeddingIndex, EmbeddingService, HashingEmbedder
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Task]
+
+
+class TestHashingEmbedder:
+    """Test hashed n-gram embeddings."""
+
+    @pytest.fixture
+    def embedder(self):
+        return HashingEmbedder(dim=256)
+
+    def test_vectors_are_normalized_and_stable(self, embedder):
+        """Test vectors are unit length and deterministic across instances."""
+        vector = embedder.embed_one("Python FastAPI developer")
+        assert vector.dtype == np.float32
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        assert np.array_equal(vector, HashingEmbedder(dim=256).embed_one("Python FastAPI developer"))
+
+    def test_skill_spelling_variants_are_close(self, embedder):
+        """Test "React" is closer to "ReactJS" than to an unrelated skill."""
+        react = embedder.embed_one("React")
+        assert react @ embedder.embed_one("ReactJS") > react @ embedder.embed_one("Accounting")
+
+
+class TestEmbeddingIndex:
+    """Test memory-mapped vector index."""
+
+    @pytest.fixture
+    def embedder(self):
+        return HashingEmbedder(dim=64)
+
+    def test_upsert_search_and_remove(self, tmp_path, embedder):
+        """Test top-k search reflects upserts and removals."""
+        index = EmbeddingIndex(str(tmp_path), "tasks", dim=64, initial_capacity=2)
+        texts = {1: "react frontend", 2: "django backend", 3: "logo design", 4: "reactjs web app"}
+        index.upsert(list(texts), embedder.embed(list(texts.values())))
+
+        results = index.search(embedder.embed_one("React"), k=2)
+        assert {item_id for item_id, _ in results} == {1, 4}
+        assert results[0][1] >= results[1][1]
+
+        index.remove(1)
+        assert 1 not in [item_id for item_id, _ in index.search(embedder.embed_one("React"), k=4)]
+        assert len(index) == 3
+
+    def test_index_is_persisted(self, tmp_path, embedder):
+        """Test vectors survive reopening the memory-mapped files."""
+        index = EmbeddingIndex(str(tmp_path), "freelancers", dim=64)
+        index.upsert([7], embedder.embed(["python data science"]))
+        index.upsert([7], embedder.embed(["golang kubernetes"]))
+
+        reopened = EmbeddingIndex(str(tmp_path), "freelancers", dim=64)
+        assert len(reopened) == 1
+        assert reopened.search(embedder.embed_one("kubernetes"), k=1)[0][0] == 7
+
+    def test_writers_sharing_files_do_not_overwrite_each_other(self, tmp_path, embedder):
+        """Test two handles on the same files, as two workers hold, see and keep each other's rows."""
+        first = EmbeddingIndex(str(tmp_path), "tasks", dim=64, initial_capacity=2)
+        second = EmbeddingIndex(str(tmp_path), "tasks", dim=64, initial_capacity=2)
+        first.upsert([1], embedder.embed(["react frontend"]))
+        second.upsert([2], embedder.embed(["django backend"]))
+        # Grows the files underneath the first handle
+        second.upsert([3, 4, 5], embedder.embed(["logo design", "ios app", "copywriting"]))
+        first.upsert([6], embedder.embed(["kubernetes"]))
+        second.remove(3)
+
+        assert len(first) == len(second) == 5
+        assert first.search(embedder.embed_one("django"), k=1)[0][0] == 2
+        assert second.search(embedder.embed_one("kubernetes"), k=1)[0][0] == 6
+        assert len(EmbeddingIndex(str(tmp_path), "tasks", dim=64)) == 5
+
+    def test_ivf_search_finds_nearest(self, tmp_path):
+        """Test IVF-partitioned search still returns the exact nearest vector."""
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(400, 32)).astype(np.float32)
+        index = EmbeddingIndex(str(tmp_path), "ivf", dim=32, ivf_lists=8, ivf_probes=8)
+        index.upsert(list(range(400)), vectors)
+
+        assert index.centroids is not None
+        assert index.search(vectors[123], k=1)[0][0] == 123
+
+
+class TestEmbeddingService:
+    """Test backfilling the indexes from the database."""
+
+    def test_each_empty_index_is_backfilled(self, tmp_path, db):
+        """Test an empty freelancer index is rebuilt even when the task index has rows."""
+        db.add(User(id=1, username="ann", email="ann@example.com", hashed_password="x",
+                    is_freelancer=True, skills=["python"]))
+        db.add(Task(id=5, title="API", description="FastAPI service", category="dev", creator_id=1))
+        db.commit()
+        service = EmbeddingService(str(tmp_path), dim=64)
+        service.upsert_task(db.get(Task, 5))
+
+        service.ensure_built(db)
+
+        assert len(service.tasks) == 1
+        assert len(service.freelancers) == 1
+
@@ -0,0 +1,133 @@
+"""
+Unit tests for range-capable, cacheable file downloads.
+"""
+
+import hashlib
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.services.file_downloads import (
+    ZERO_COPY_EXTENSION, AccessCache, DownloadTarget, FileRangeResponse, RangeNotSatisfiable,
+    download_response, etag_matches, parse_range,
+)
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(DATA)
+    targets = {
+        "blob": DownloadTarget("report.pdf", "application/pdf", sha256=hashlib.sha256(DATA).hexdigest(),
+                               size=len(DATA), legacy_path=str(path)),
+        "legacy": DownloadTarget("report.pdf", legacy_path=str(path)),
+        "missing": DownloadTarget("gone.pdf", legacy_path=str(tmp_path / "gone.pdf")),
+    }
+    app = FastAPI()
+
+    @app.get("/files/{name}")
+    def download(name: str, request: Request):
+        return download_response(request, targets[name])
+
+    return TestClient(app)
+
+
+class TestParseRange:
+    """Test Range header parsing."""
+
+    def test_single_ranges(self):
+        """Test explicit, open-ended and suffix ranges, clamped to the file."""
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-", 1000) == (900, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=990-5000", 1000) == (990, 999)
+
+    def test_whole_file_or_unsatisfiable(self):
+        """Test headers served as the whole file, and ranges past the end."""
+        for header in (None, "bytes=0-1,5-9", "items=0-1", "bytes=9-2", "bytes=a-b"):
+            assert parse_range(header, 1000) is None
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+
+    def test_etag_matches(self):
+        """Test If-None-Match lists, weak tags and the wildcard."""
+        assert etag_matches('"a", W/"b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches('"a"', '"b"')
+
+
+class TestDownloadResponse:
+    """Test the download responses."""
+
+    def test_range_and_etag(self, client):
+        """Test a resumed download gets the rest of the file under the content hash."""
+        full = client.get("/files/blob")
+        etag = f'"{hashlib.sha256(DATA).hexdigest()}"'
+        assert full.status_code == 200 and full.content == DATA
+        assert full.headers["etag"] == etag and full.headers["accept-ranges"] == "bytes"
+
+        part = client.get("/files/blob", headers={"Range": "bytes=1000-", "If-Range": etag})
+        assert part.status_code == 206
+        assert part.content == DATA[1000:]
+        assert part.headers["content-range"] == f"bytes 1000-{len(DATA) - 1}/{len(DATA)}"
+
+        stale = client.get("/files/blob", headers={"Range": "bytes=1000-", "If-Range": '"old"'})
+        assert stale.status_code == 200 and stale.content == DATA
+
+    def test_not_modified_and_unsatisfiable(self, client):
+        """Test If-None-Match, a range past the end and a missing legacy file."""
+        etag = client.get("/files/legacy").headers["etag"]
+        assert etag.startswith("W/")
+        cached = client.get("/files/legacy", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+
+        past = client.get("/files/blob", headers={"Range": f"bytes={len(DATA)}-"})
+        assert past.status_code == 416
+        assert past.headers["content-range"] == f"bytes */{len(DATA)}"
+        assert client.get("/files/missing").status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_zero_copy_send(self, tmp_path):
+        """Test servers offering the zero-copy extension get the file descriptor and range."""
+        path = tmp_path / "a.bin"
+        path.write_bytes(DATA)
+        response = FileRangeResponse(str(path), 10, 19, len(DATA), 206, {"content-length": "10"}, "application/octet-stream")
+        messages = []
+
+        async def send(message):
+            if message["type"] == ZERO_COPY_EXTENSION:
+                message = {**message, "file": message["file"].fileno() > 0}
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "extensions": {ZERO_COPY_EXTENSION: {}}}
+        await response(scope, None, send)
+
+        assert messages[0]["status"] == 206
+        assert messages[1] == {"type": ZERO_COPY_EXTENSION, "file": True, "offset": 10, "count": 10, "more_body": False}
+
+
+class TestAccessCache:
+    """Test the access decision cache."""
+
+    def test_allowed_downloads_are_cached(self):
+        """Test a granted download is reused until it expires and a refusal is not kept."""
+        cache = AccessCache(ttl=60, max_size=1)
+        loads = []
+
+        def allow():
+            loads.append(1)
+            return DownloadTarget("a.pdf", sha256="0" * 64, size=1)
+
+        def deny():
+            raise HTTPException(status_code=403)
+
+        assert cache.get_or_load((1, "a"), allow) == cache.get_or_load((1, "a"), allow)
+        assert len(loads) == 1
+        with pytest.raises(HTTPException):
+            cache.get_or_load((2, "a"), deny)
+        cache.get_or_load((2, "a"), allow)
+        cache.get_or_load((1, "a"), allow)
+        assert len(loads) == 3
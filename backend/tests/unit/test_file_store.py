@@ -0,0 +1,122 @@
+"""
+Unit tests for the content-addressed file store.
+"""
+
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.api.endpoints import chats as chats_endpoints
+from app.db_models import Chat, ChatFile, ChatMember, FileBlob, Message, UnreadCounter, User
+from app.services.file_store import FileStore, LocalStorage, blob_key
+from app.services.uploads import StoredFile
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Chat, ChatMember, Message, ChatFile, FileBlob, UnreadCounter]
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = str(tmp_path / "blobs")
+    return FileStore(LocalStorage(root), os.path.join(root, ".staging"), grace_seconds=60, chunk_size=4)
+
+
+def _stage(store, data):
+    path = store.staging_path()
+    with open(path, "wb") as f:
+        f.write(data)
+    return StoredFile(path, len(data), hashlib.sha256(data).hexdigest())
+
+
+def _upload(store, db, data):
+    stored = _stage(store, data)
+    store.add(db, stored.path, stored.sha256, stored.size)
+    db.commit()
+    return stored.sha256
+
+
+class TestFileStore:
+    """Test deduplication, reference counts and garbage collection."""
+
+    def test_same_content_is_stored_once(self, store, db):
+        """Test a second upload of the same bytes only adds a reference."""
+        sha256 = _upload(store, db, b"contract.pdf")
+        assert _upload(store, db, b"contract.pdf") == sha256
+
+        path = store.local_path(sha256)
+        assert path.endswith(os.path.join(sha256[:2], sha256[2:4], sha256))
+        assert b"".join(store.iter_bytes(sha256)) == b"contract.pdf"
+        assert os.listdir(store.staging_dir) == []
+        assert db.get(FileBlob, sha256).ref_count == 2
+
+    def test_release_and_collect(self, store, db):
+        """Test a blob is collected only after its last reference is gone and the grace period passed."""
+        shared = _upload(store, db, b"shared")
+        _upload(store, db, b"shared")
+        other = _upload(store, db, b"other")
+
+        store.release(db, [shared, other, None])
+        db.commit()
+        later = datetime.now(timezone.utc) + timedelta(minutes=5)
+        assert store.collect_garbage(db, later) == 1
+        assert db.get(FileBlob, other) is None
+        assert not os.path.exists(store.local_path(other))
+
+        store.release(db, [shared])
+        db.commit()
+        assert store.collect_garbage(db) == 0
+        assert store.collect_garbage(db, later) == 1
+        assert not store.backend.exists(blob_key(shared))
+
+    def test_reupload_revives_released_blob(self, store, db):
+        """Test content uploaded again during the grace period is kept."""
+        sha256 = _upload(store, db, b"again")
+        store.release(db, [sha256])
+        db.commit()
+        _upload(store, db, b"again")
+
+        blob = db.get(FileBlob, sha256)
+        db.refresh(blob)
+        assert (blob.ref_count, blob.released_at) == (1, None)
+        assert store.collect_garbage(db, datetime.now(timezone.utc) + timedelta(minutes=5)) == 0
+        assert os.path.exists(store.local_path(sha256))
+
+    def test_blob_left_by_rolled_back_upload_is_collected(self, store, db):
+        """Test bytes stored by a transaction that rolled back are adopted and then collected."""
+        kept = _upload(store, db, b"kept")
+        path = store.staging_path()
+        with open(path, "wb") as f:
+            f.write(b"lost")
+        lost = hashlib.sha256(b"lost").hexdigest()
+        store.add(db, path, lost, 4)
+        db.rollback()
+        with open(os.path.join(store.staging_dir, "partial"), "wb") as f:
+            f.write(b"x")
+
+        assert store.adopt_orphans(db, batch_size=1) == 1
+        assert store.adopt_orphans(db) == 0
+        assert store.collect_garbage(db, datetime.now(timezone.utc) + timedelta(minutes=5)) == 1
+        assert not os.path.exists(store.local_path(lost))
+        assert os.path.exists(store.local_path(kept))
+        assert os.path.exists(os.path.join(store.staging_dir, "partial"))
+
+
+class TestChatAttachments:
+    """Test a chat attachment and its blob reference are stored together."""
+
+    def test_failed_attachment_keeps_no_reference(self, store, db, monkeypatch):
+        """Test a ChatFile that cannot be written takes the message and the reference with it."""
+        monkeypatch.setattr(chats_endpoints, "file_store", store)
+        db.add(Chat(id=1, title="Task 1", creator_id=1, participant_ids=[2]))
+        db.commit()
+
+        with pytest.raises(IntegrityError):
+            chats_endpoints._attach_file(db, 1, 1, "a.pdf", None, _stage(store, b"pdf"), True)
+        db.rollback()
+        assert db.query(Message).count() == 0
+        assert db.query(FileBlob).count() == 0
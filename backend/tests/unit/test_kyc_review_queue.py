@@ -0,0 +1,195 @@
+"""
+Unit tests for the background KYC review queue.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db_models import KYCRequest, KYCStatus, User
+from app.services import kyc_review_service
+from app.services.kyc_review_service import KYCReviewQueue, claim_unreviewed_jobs, review_kyc_request
+
+
+@pytest.fixture
+def db_tables():
+    return [User, KYCRequest]
+
+
+class TestKYCReviewQueue:
+    """Test KYC review queue behaviour."""
+
+    @pytest.mark.asyncio
+    async def test_jobs_are_reviewed_in_background(self):
+        """Test submitted jobs are handled by the worker pool."""
+        reviewed = []
+
+        async def handler(job):
+            reviewed.append(job["kyc_id"])
+            return "approved"
+
+        queue = KYCReviewQueue(handler, concurrency=2, max_size=10)
+        await queue.start()
+        for kyc_id in range(5):
+            queue.submit({"kyc_id": kyc_id})
+        await queue.join()
+        await queue.stop()
+
+        assert sorted(reviewed) == [0, 1, 2, 3, 4]
+        assert queue.processed == 5
+        assert queue.stats()["throughput_per_second"] > 0
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Test no more than `concurrency` reviews run at once."""
+        running = 0
+        peak = 0
+
+        async def handler(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "approved"
+
+        queue = KYCReviewQueue(handler, concurrency=3, max_size=100)
+        await queue.start()
+        for kyc_id in range(20):
+            queue.submit({"kyc_id": kyc_id})
+        await queue.join()
+        await queue.stop()
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_and_handler_errors_are_counted(self):
+        """Test overflow and failures do not break the workers."""
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+            if job["kyc_id"] == 0:
+                raise RuntimeError("AI down")
+            return "rejected"
+
+        queue = KYCReviewQueue(handler, concurrency=1, max_size=1)
+        await queue.start()
+        queue.submit({"kyc_id": 0})
+        await asyncio.sleep(0)
+        queue.submit({"kyc_id": 1})
+        queue.submit({"kyc_id": 2})
+        release.set()
+        await queue.join()
+        await queue.stop()
+
+        assert queue.dropped == 1
+        assert queue.failed == 1
+        assert queue.processed == 1
+
+    def test_submit_without_running_queue_is_noop(self):
+        """Test submitting before start leaves the request pending."""
+        async def handler(job):
+            return "approved"
+
+        queue = KYCReviewQueue(handler)
+        queue.submit({"kyc_id": 1})
+        assert queue.stats()["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_sweep_recovers_unqueued_requests(self):
+        """Test requests submitted while stopped or dropped by a full queue are reviewed later."""
+        pending = {1, 2, 3}
+        reviewed = []
+
+        async def handler(job):
+            reviewed.append(job["kyc_id"])
+            pending.discard(job["kyc_id"])
+            return "approved"
+
+        def load_pending(limit, exclude):
+            return [{"kyc_id": kyc_id} for kyc_id in sorted(pending - exclude)[:limit]]
+
+        queue = KYCReviewQueue(handler, concurrency=1, max_size=2, load_pending=load_pending, sweep_interval=3600)
+        await queue.start()
+        await asyncio.sleep(0.01)
+        await queue.join()
+        assert reviewed == [1, 2]
+
+        assert await queue.sweep() == 1
+        await queue.join()
+        await queue.stop()
+
+        assert reviewed == [1, 2, 3]
+        assert queue.stats()["recovered"] == 3
+
+
+class TestReviewKYCRequest:
+    """Test how the AI verdict is stored."""
+
+    @pytest.mark.asyncio
+    async def test_admin_decision_is_not_overwritten(self, session_factory, monkeypatch):
+        """Test the verdict only lands on requests still pending, and the user hears about it."""
+        db = session_factory()
+        db.add_all([
+            KYCRequest(id=1, user_id=7, document_type="passport", document_url="/a", comment="hi"),
+            KYCRequest(id=2, user_id=8, document_type="passport", document_url="/b", status=KYCStatus.REJECTED),
+        ])
+        db.commit()
+        notified = []
+
+        async def review(**kwargs):
+            return {"status": "APPROVED", "reason": "looks fine"}
+
+        async def notify(user_id, payload):
+            notified.append((user_id, payload["data"]["status"]))
+
+        monkeypatch.setattr(kyc_review_service, "SessionLocal", session_factory)
+        monkeypatch.setattr(kyc_review_service.ai_service, "review_kyc_document", review)
+        monkeypatch.setattr(kyc_review_service.notification_manager, "send_personal_notification", notify)
+
+        assert await review_kyc_request({"kyc_id": 1, "document_type": "passport"}) == "approved"
+        assert await review_kyc_request({"kyc_id": 2, "document_type": "passport"}) == "skipped"
+        assert await review_kyc_request({"kyc_id": 3, "document_type": "passport"}) == "missing"
+
+        db.expire_all()
+        assert db.get(KYCRequest, 1).status == KYCStatus.APPROVED
+        assert db.get(KYCRequest, 1).comment == "hi\n[AI]: looks fine"
+        assert db.get(KYCRequest, 2).status == KYCStatus.REJECTED
+        assert notified == [(7, "approved")]
+        db.close()
+
+    def test_unreviewed_jobs_are_claimed_once(self, session_factory, monkeypatch):
+        """Test only unclaimed pending requests without an AI note are claimed, skipping queued ones."""
+        db = session_factory()
+        db.add(User(id=7, username="ann", email="ann@example.com", hashed_password="x"))
+        db.add_all([
+            KYCRequest(id=1, user_id=7, document_type="passport", document_url="/a"),
+            KYCRequest(id=2, user_id=7, document_type="passport", document_url="/b", comment="[AI]: no answer"),
+            KYCRequest(id=3, user_id=7, document_type="selfie", document_url="/c", status=KYCStatus.APPROVED),
+            KYCRequest(id=4, user_id=7, document_type="selfie", document_url="/d", comment="retake"),
+            KYCRequest(id=5, user_id=7, document_type="selfie", document_url="/e"),
+            KYCRequest(
+                id=6, user_id=7, document_type="selfie", document_url="/f",
+                review_claimed_at=datetime.now(timezone.utc),
+            ),
+            KYCRequest(
+                id=7, user_id=7, document_type="selfie", document_url="/g",
+                review_claimed_at=datetime.now(timezone.utc) - timedelta(days=1),
+            ),
+        ])
+        db.commit()
+        db.close()
+        monkeypatch.setattr(kyc_review_service, "SessionLocal", session_factory)
+
+        jobs = claim_unreviewed_jobs(10, {5})
+
+        assert [job["kyc_id"] for job in jobs] == [1, 4, 7]
+        assert jobs[1]["comment"] == "retake"
+        assert jobs[0]["user_info"] == {"id": 7, "email": "ann@example.com"}
+        # Another process sweeping now finds them taken
+        assert claim_unreviewed_jobs(10, set()) == [{
+            "kyc_id": 5, "document_type": "selfie", "comment": "", "document_url": "/e",
+            "user_info": {"id": 7, "email": "ann@example.com"},
+        }]
@@ -0,0 +1,131 @@
+"""
+Unit tests for market rollups and the quantile sketch.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db_models import (
+    Application, ApplicationStatus, Base, MarketRollup, Task, TaskStatus, User
+)
+from app.services.market_rollup_service import MarketRollupService, QuantileSketch
+
+
+class TestQuantileSketch:
+    """Test approximate quantiles."""
+
+    def test_quantiles_within_relative_error(self):
+        """Test percentiles stay within the configured relative accuracy."""
+        rng = random.Random(7)
+        values = sorted(rng.lognormvariate(6, 1) for _ in range(20000))
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+
+        for q in (0.25, 0.5, 0.75, 0.9):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(sketch.quantile(q) - exact) / exact <= 0.011
+        assert len(sketch.bins) < 1000
+
+    def test_merge_and_serialization(self):
+        """Test merged and round-tripped sketches match a single sketch."""
+        left, right, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 501):
+            (left if value % 2 else right).add(value)
+            whole.add(value)
+        left.merge(QuantileSketch.from_dict(right.to_dict()))
+
+        assert left.count == whole.count
+        assert left.quantile(0.5) == whole.quantile(0.5)
+        assert left.min == 1 and left.max == 500
+
+    def test_bins_are_bounded(self):
+        """Test the sketch collapses its lowest buckets past max_bins."""
+        sketch = QuantileSketch(relative_accuracy=0.01, max_bins=50)
+        for exponent in range(200):
+            sketch.add(1.1 ** exponent)
+        assert len(sketch.bins) == 50
+        assert sketch.quantile(1.0) == pytest.approx(1.1 ** 199)
+
+
+class TestMarketRollupService:
+    """Test rebuild and incremental refresh."""
+
+    @pytest.fixture
+    def db(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    def _hire(self, db, client, freelancer, bid, posted_at, hired_after):
+        task = Task(
+            title="Landing page", description="Build it", category="Web",
+            skills_required=["React", "CSS"], creator_id=client.id,
+            status=TaskStatus.COMPLETED, created_at=posted_at,
+            updated_at=posted_at + hired_after,
+        )
+        db.add(task)
+        db.flush()
+        db.add(Application(
+            proposal="I can do it", bid_amount=Decimal(bid), task_id=task.id,
+            applicant_id=freelancer.id, status=ApplicationStatus.ACCEPTED,
+            created_at=posted_at, updated_at=posted_at + hired_after,
+        ))
+        db.commit()
+
+    def test_rebuild_then_refresh(self, db):
+        """Test refresh folds new hires into the rebuilt rollups."""
+        client = User(username="client", email="c@example.com", hashed_password="x")
+        freelancer = User(username="dev", email="d@example.com", hashed_password="x")
+        db.add_all([client, freelancer])
+        db.commit()
+
+        posted = datetime.now(timezone.utc) - timedelta(days=10)
+        for bid in (100, 200, 300):
+            self._hire(db, client, freelancer, bid, posted, timedelta(hours=24))
+
+        service = MarketRollupService(relative_accuracy=0.01)
+        service.rebuild(db)
+        web = db.query(MarketRollup).filter_by(dimension="category", key="web").one()
+        assert web.hires_count == 3
+        assert web.tasks_completed == 3
+        assert float(web.price_p50) == pytest.approx(200, rel=0.01)
+        assert web.hire_hours_p50 == pytest.approx(24, rel=0.01)
+
+        self._hire(db, client, freelancer, 1000, datetime.now(timezone.utc), timedelta(0))
+        service.refresh(db)
+        db.expire_all()
+        react = db.query(MarketRollup).filter_by(dimension="skill", key="react").one()
+        assert react.hires_count == 4
+        assert react.tasks_posted == 4
+        assert react.price_sketch["max"] == 1000
+        assert float(react.price_p50) == pytest.approx(200, rel=0.01)
+        assert set(service.lookup(db, "Web", ["react", "Go"])) == {("category", "web"), ("skill", "react")}
+
+    def test_edited_rows_are_not_counted_again(self, db):
+        """Test a hire edited after it was folded in leaves the rollups unchanged."""
+        client = User(username="client", email="c@example.com", hashed_password="x")
+        freelancer = User(username="dev", email="d@example.com", hashed_password="x")
+        db.add_all([client, freelancer])
+        db.commit()
+        service = MarketRollupService(relative_accuracy=0.01)
+        service.rebuild(db)
+
+        self._hire(db, client, freelancer, 500, datetime.now(timezone.utc), timedelta(0))
+        service.refresh(db)
+        db.query(Application).update({"proposal": "Edited", "updated_at": datetime.now(timezone.utc)})
+        db.query(Task).update({"updated_at": datetime.now(timezone.utc)})
+        db.commit()
+        service.refresh(db)
+
+        db.expire_all()
+        web = db.query(MarketRollup).filter_by(dimension="category", key="web").one()
+        assert (web.hires_count, web.tasks_completed, web.price_sketch["count"]) == (1, 1, 1)
+
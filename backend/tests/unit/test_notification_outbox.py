@@ -0,0 +1,101 @@
+"""
+Unit tests for the notification outbox dispatcher.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.db_models import NotificationOutbox
+from app.services.outbox_dispatcher import FAILED, PENDING, SENT, OutboxDispatcher, outbox_row
+
+
+@pytest.fixture
+def db_tables():
+    return [NotificationOutbox]
+
+
+def _enqueue(session_factory, rows):
+    db = session_factory()
+    db.execute(insert(NotificationOutbox), rows)
+    db.commit()
+    db.close()
+
+
+def _rows(session_factory):
+    db = session_factory()
+    rows = {row.dedup_key: row for row in db.query(NotificationOutbox)}
+    db.close()
+    return rows
+
+
+class TestOutboxDispatcher:
+    """Test delivery, retries and per-channel limits."""
+
+    @pytest.mark.asyncio
+    async def test_delivers_and_marks_sent(self, session_factory):
+        """Test delivered rows are marked sent and not claimed again."""
+        delivered = []
+
+        async def websocket(entry):
+            delivered.append(entry["payload"]["n"])
+
+        _enqueue(session_factory, [outbox_row(i, 1, "websocket", {"n": i}) for i in range(1, 4)])
+        dispatcher = OutboxDispatcher({"websocket": websocket}, session_factory=session_factory)
+
+        assert await dispatcher.drain_once() == 3
+        assert await dispatcher.drain_once() == 0
+        assert delivered == [1, 2, 3]
+        assert {row.status for row in _rows(session_factory).values()} == {SENT}
+
+    @pytest.mark.asyncio
+    async def test_failures_back_off_then_give_up(self, session_factory):
+        """Test a failing row is rescheduled with backoff and marked failed after max attempts."""
+        async def email(entry):
+            raise RuntimeError("SMTP down")
+
+        _enqueue(session_factory, [outbox_row(1, 1, "email")])
+        dispatcher = OutboxDispatcher(
+            {"email": email}, session_factory=session_factory, max_attempts=2, backoff_base=60
+        )
+
+        await dispatcher.drain_once()
+        row = _rows(session_factory)["1:email"]
+        assert row.status == PENDING and row.attempts == 1
+        assert row.next_attempt_at > datetime.utcnow()
+        assert row.last_error == "SMTP down"
+        # Not due yet
+        assert await dispatcher.drain_once() == 0
+
+        db = session_factory()
+        db.query(NotificationOutbox).update({NotificationOutbox.next_attempt_at: datetime.utcnow()})
+        db.commit()
+        db.close()
+        await dispatcher.drain_once()
+        assert _rows(session_factory)["1:email"].status == FAILED
+
+    @pytest.mark.asyncio
+    async def test_per_channel_concurrency(self, session_factory):
+        """Test a channel never runs more deliveries at once than its limit."""
+        running = {"now": 0, "peak": 0}
+
+        async def email(entry):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+
+        _enqueue(session_factory, [outbox_row(i, 1, "email") for i in range(1, 9)])
+        dispatcher = OutboxDispatcher({"email": email}, concurrency={"email": 3}, session_factory=session_factory)
+
+        assert await dispatcher.drain_once() == 8
+        assert running["peak"] == 3
+
+    def test_dedup_key_is_unique(self, session_factory):
+        """Test the same delivery cannot be enqueued twice."""
+        _enqueue(session_factory, [outbox_row(1, 1, "push")])
+        with pytest.raises(IntegrityError):
+            _enqueue(session_factory, [outbox_row(1, 1, "push")])
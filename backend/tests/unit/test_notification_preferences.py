@@ -0,0 +1,88 @@
+"""
+Unit tests for compiled notification preferences and their cache.
+"""
+
+import pytest
+
+from app.db_models import NotificationSetting, NotificationType
+from app.services.notification_preferences import PreferenceCache, UserPreferences
+
+
+@pytest.fixture
+def db_tables():
+    return [NotificationSetting]
+
+
+@pytest.fixture
+def db(db):
+    db.add(NotificationSetting(
+        user_id=1, notification_type=NotificationType.PAYMENT_RECEIVED,
+        email_enabled=False, push_enabled=True, sms_enabled=True,
+    ))
+    db.commit()
+    return db
+
+
+def _disable_push(db, user_id):
+    db.add(NotificationSetting(
+        user_id=user_id, notification_type=NotificationType.SYSTEM_MESSAGE,
+        email_enabled=True, push_enabled=False,
+    ))
+    db.commit()
+
+
+class TestUserPreferences:
+    """Test compiled channel decisions."""
+
+    def test_settings_override_defaults_per_type(self, db):
+        """Test a row decides its own type and other types use the defaults."""
+        preferences = PreferenceCache().get(db, 1)
+
+        assert not preferences.allows("email", NotificationType.PAYMENT_RECEIVED)
+        assert preferences.allows("sms", NotificationType.PAYMENT_RECEIVED)
+        assert preferences.allows("email", NotificationType.TASK_CREATED)
+        assert not preferences.allows("sms", NotificationType.TASK_CREATED)
+
+    def test_user_without_settings_gets_defaults(self):
+        """Test email and push are on and SMS is off by default."""
+        preferences = UserPreferences.compile(9, [])
+
+        assert preferences.allows("push", NotificationType.SYSTEM_MESSAGE)
+        assert not preferences.allows("sms", NotificationType.SYSTEM_MESSAGE)
+
+
+class TestPreferenceCache:
+    """Test caching, invalidation and bounds."""
+
+    def test_hits_do_not_query(self, db):
+        """Test a cached user is answered without reading new settings rows."""
+        cache = PreferenceCache()
+        assert cache.get(db, 2).allows("push", NotificationType.SYSTEM_MESSAGE)
+        _disable_push(db, 2)
+
+        assert cache.get(db, 2).allows("push", NotificationType.SYSTEM_MESSAGE)
+
+    def test_invalidate_reloads(self, db):
+        """Test a settings change is visible right after invalidation."""
+        cache = PreferenceCache()
+        cache.get(db, 2)
+        _disable_push(db, 2)
+        cache.invalidate(2)
+
+        assert not cache.get(db, 2).allows("push", NotificationType.SYSTEM_MESSAGE)
+
+    def test_entries_expire(self, db):
+        """Test an expired entry is loaded again."""
+        cache = PreferenceCache(ttl=0)
+        cache.get(db, 2)
+        _disable_push(db, 2)
+
+        assert not cache.get(db, 2).allows("push", NotificationType.SYSTEM_MESSAGE)
+
+    def test_size_is_bounded(self, db):
+        """Test the least recently used users are evicted past max_size."""
+        cache = PreferenceCache(max_size=2)
+        preferences = cache.get_many(db, [1, 2, 3, 3])
+
+        assert sorted(preferences) == [1, 2, 3]
+        assert list(cache._entries) == [2, 3]
@@ -0,0 +1,146 @@
+"""
+Unit tests for notification retention and archival.
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db_models import (
+    Notification, NotificationArchive, NotificationOutbox, NotificationType, UnreadCounter, User
+)
+from app.services import notification_retention as retention_module
+from app.services.notification_retention import PARTITION_PREFIX, NotificationRetention
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Notification, NotificationArchive, NotificationOutbox, UnreadCounter]
+
+
+def _add(db, title, age_days, type=NotificationType.TASK_CREATED, is_read=True, user_id=1):
+    notification = Notification(
+        user_id=user_id, title=title, message="m", type=type, is_read=is_read,
+        created_at=datetime.utcnow() - timedelta(days=age_days),
+    )
+    db.add(notification)
+    db.flush()
+    return notification
+
+
+def _titles(db, model):
+    return sorted(title for title, in db.query(model.title))
+
+
+class TestArchival:
+    """Test which rows move and what moves with them."""
+
+    def test_per_type_retention(self, session_factory):
+        """Test each type expires after its own retention period."""
+        db = session_factory()
+        _add(db, "old task", 400)
+        _add(db, "recent task", 100)
+        _add(db, "old system", 40, type=NotificationType.SYSTEM_MESSAGE)
+        _add(db, "recent system", 10, type=NotificationType.SYSTEM_MESSAGE)
+        db.commit()
+
+        result = NotificationRetention(
+            session_factory, default_days=365, days_by_type={"system_message": 30}
+        ).run()
+
+        assert result["archived"] == 2
+        assert _titles(db, Notification) == ["recent system", "recent task"]
+        assert _titles(db, NotificationArchive) == ["old system", "old task"]
+        archived = db.query(NotificationArchive).filter_by(title="old system").one()
+        assert archived.type == "SYSTEM_MESSAGE" and archived.user_id == 1
+        db.close()
+
+    def test_outbox_rows_and_unread_counts_follow(self, session_factory):
+        """Test archived rows take their outbox rows and unread counts with them."""
+        db = session_factory()
+        unread = _add(db, "unread", 400, is_read=False)
+        _add(db, "kept", 1, is_read=False)
+        db.add(NotificationOutbox(
+            notification_id=unread.id, user_id=1, channel="email", dedup_key="email:1", status="sent"
+        ))
+        db.add(UnreadCounter(user_id=1, notifications=2, messages=0))
+        db.commit()
+
+        NotificationRetention(session_factory).run()
+
+        db.expire_all()
+        assert db.query(NotificationOutbox).count() == 0
+        assert db.get(UnreadCounter, 1).notifications == 1
+        db.close()
+
+
+class TestPartitions:
+    """Test monthly partition upkeep."""
+
+    def test_default_retention_alone_keeps_recent_partitions(self, db, monkeypatch):
+        """Test partitions within the default period are kept when no type has its own period."""
+        now = datetime.now(timezone.utc)
+        monkeypatch.setattr(retention_module, "partitions", lambda db: [f"{PARTITION_PREFIX}{now:%Y%m}"])
+
+        retention = NotificationRetention(lambda: db, default_days=365, days_by_type={})
+
+        assert retention.drop_empty_partitions(db, now) == []
+
+
+class TestThrottling:
+    """Test batching, the duty cycle and the time budget."""
+
+    def test_sleeps_between_batches(self, session_factory):
+        """Test full batches are followed by a pause and a short batch ends the run."""
+        db = session_factory()
+        for n in range(5):
+            _add(db, f"n{n}", 400 + n)
+        db.commit()
+        pauses = []
+
+        result = NotificationRetention(
+            session_factory, batch_size=2, duty_cycle=0.5, sleep=pauses.append
+        ).run()
+
+        assert result["archived"] == 5 and result["batches"] == 3
+        assert len(pauses) == 2
+        assert db.query(Notification).count() == 0
+        db.close()
+
+    def test_time_budget_stops_the_run(self, session_factory):
+        """Test nothing is moved once the run's budget is spent."""
+        db = session_factory()
+        _add(db, "old", 400)
+        db.commit()
+
+        result = NotificationRetention(session_factory, max_seconds=0).run()
+
+        assert result["archived"] == 0
+        assert db.query(Notification).count() == 1
+        db.close()
+
+
+class TestJsonlBackend:
+    """Test archiving to compressed files."""
+
+    def test_rows_are_written_to_gzipped_jsonl(self, session_factory, tmp_path):
+        """Test every batch is appended to the run's file before the rows go."""
+        db = session_factory()
+        for n in range(3):
+            _add(db, f"n{n}", 400 + n)
+        db.commit()
+
+        NotificationRetention(
+            session_factory, backend="jsonl", archive_dir=str(tmp_path), batch_size=2, sleep=lambda _: None
+        ).run()
+
+        (path,) = tmp_path.iterdir()
+        with gzip.open(path, "rt") as archive:
+            records = [json.loads(line) for line in archive]
+        assert [record["title"] for record in records] == ["n2", "n1", "n0"]
+        assert records[0]["type"] == "TASK_CREATED"
+        assert db.query(Notification).count() == 0
+        assert db.query(NotificationArchive).count() == 0
+        db.close()
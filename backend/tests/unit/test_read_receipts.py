@@ -0,0 +1,101 @@
+"""
+Unit tests for chat read watermarks.
+"""
+
+import pytest
+
+from app.db_models import Chat, ChatMember, ChatRead, Message, Notification, UnreadCounter, User
+from app.services.read_receipts import ReadReceipts
+from app.services.unread_counters import UnreadCounterService, message_deltas
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Notification, Chat, ChatMember, Message, ChatRead, UnreadCounter]
+
+
+@pytest.fixture
+def db(db):
+    db.add(Chat(id=1, title="Task 1", creator_id=1, participant_ids=[2, 3]))
+    db.add(Chat(id=2, title="Task 2", creator_id=1, participant_ids=[2]))
+    db.commit()
+    # Chat 1: ids 1-4 sent by users 2, 3, 1, 2; chat 2: ids 5-6 sent by user 2
+    sent = [(1, 2), (1, 3), (1, 1), (1, 2), (2, 2), (2, 2)]
+    for chat_id, sender_id in sent:
+        db.add(Message(chat_id=chat_id, sender_id=sender_id, content="hi"))
+    UnreadCounterService().increment(db, "messages", message_deltas(db, sent))
+    db.commit()
+    return db
+
+
+def _unread(db, user_id):
+    return UnreadCounterService().get(db, user_id)["messages"]
+
+
+class TestMarkRead:
+    """Test watermark moves and their effect on unread counts."""
+
+    def test_reading_a_message_reads_everything_before_it(self, db):
+        """Test one upsert reads the earlier messages too, skipping the reader's own."""
+        receipts = ReadReceipts()
+        assert _unread(db, 1) == 5
+
+        assert receipts.mark_read(db, 1, 1, 4) == 3
+        db.commit()
+
+        assert receipts.watermark(db, 1, 1) == 4
+        assert _unread(db, 1) == 2
+
+    def test_watermark_never_moves_back(self, db):
+        """Test a late or repeated mark-read changes nothing."""
+        receipts = ReadReceipts()
+        receipts.mark_read(db, 1, 1, 4)
+        assert receipts.mark_read(db, 1, 1, 2) == 0
+        receipts._advance(db, 1, {1: 1})
+        db.commit()
+
+        assert receipts.watermark(db, 1, 1) == 4
+
+    def test_mark_all_read(self, db):
+        """Test every chat's watermark jumps to its newest message and the count clears."""
+        receipts = ReadReceipts()
+        assert receipts.mark_all_read(db, 1, [1, 2]) == 5
+        db.commit()
+
+        assert receipts.watermarks(db, 2) == {1: 6}
+        assert _unread(db, 1) == 0
+        assert receipts.unread(db, 1, [1, 2]).count() == 0
+
+
+class TestUnread:
+    """Test unread detection and read ticks."""
+
+    def test_unread_is_everything_above_the_watermark(self, db):
+        """Test unread messages exclude read and own messages."""
+        receipts = ReadReceipts()
+        receipts.mark_read(db, 3, 1, 2)
+        db.commit()
+
+        assert [message.id for message in receipts.unread(db, 3, [1]).order_by(Message.id)] == [3, 4]
+        assert [message.id for message in receipts.unread(db, 2, [1, 2]).order_by(Message.id)] == [2, 3]
+
+    def test_read_flags(self, db):
+        """Test own messages show read once anyone else read them."""
+        receipts = ReadReceipts()
+        receipts.mark_read(db, 2, 1, 3)
+        db.commit()
+        messages = db.query(Message).filter(Message.chat_id == 1).all()
+
+        assert receipts.read_flags(db, 1, 1, messages) == {1: False, 2: False, 3: True, 4: False}
+        assert receipts.read_flags(db, 2, 1, messages) == {1: False, 2: True, 3: True, 4: False}
+
+    def test_reconcile_counts_from_watermarks(self, db):
+        """Test the reconciler's true counts respect watermarks."""
+        ReadReceipts().mark_read(db, 3, 1, 2)
+        db.add(ChatRead(chat_id=2, user_id=1, last_read_message_id=5))
+        db.query(UnreadCounter).update({"messages": 0})
+        db.commit()
+
+        UnreadCounterService().reconcile(db)
+
+        assert {user_id: _unread(db, user_id) for user_id in (1, 2, 3)} == {1: 4, 2: 2, 3: 2}
@@ -0,0 +1,158 @@
+"""
+Unit tests for the pooled SMTP sender, against a local SMTP server.
+"""
+
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.services.email_service import EmailService
+from app.services.smtp_pool import RateLimiter, SMTPConnectionPool
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal debugging SMTP server that keeps every message it accepts."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.messages = []
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.sessions += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250-sink")
+                self.reply("250 8BITMIME")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data in iter(self.rfile.readline, b""):
+                    if data == b".\r\n":
+                        break
+                    body.append(data)
+                with self.server.lock:
+                    self.server.messages.append(b"".join(body))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RSET, NOOP
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _service(sink, **pool_options):
+    host, port = sink.server_address
+    pool = SMTPConnectionPool(host, port, use_tls=False, **pool_options)
+    return EmailService(host, port, "", "", "noreply@freelanceai.com", pool=pool)
+
+
+class TestSMTPConnectionPool:
+    """Test session reuse, batching and reconnects."""
+
+    def test_sequential_sends_share_one_session(self, sink):
+        """Test one handshake serves many individual sends."""
+        service = _service(sink)
+        for i in range(5):
+            assert service.send_email(f"user{i}@example.com", "Hi", f"<p>{i}</p>")
+        service.pool.close()
+
+        assert len(sink.messages) == 5
+        assert sink.sessions == 1
+        assert service.pool.stats()["sent"] == 5
+
+    def test_bulk_send_rotates_long_sessions(self, sink):
+        """Test a batch is split across sessions at the per-connection cap."""
+        service = _service(sink, max_messages_per_connection=4)
+        emails = [
+            {"to_email": f"user{i}@example.com", "subject": "Digest", "html_content": "<p>hi</p>"}
+            for i in range(10)
+        ]
+        assert service.send_bulk_emails(emails) == 10
+        service.pool.close()
+
+        assert len(sink.messages) == 10
+        assert service.pool.connections_opened == 3
+
+    def test_dropped_session_is_replaced(self, sink):
+        """Test a session the server closed is reopened instead of failing the send."""
+        service = _service(sink)
+        assert service.send_email("a@example.com", "Hi", "<p>1</p>")
+        service.pool._idle.queue[0].smtp.close()
+
+        assert service.send_email("b@example.com", "Hi", "<p>2</p>")
+        assert len(sink.messages) == 2
+        assert service.pool.connections_opened == 2
+
+    def test_bulk_send_survives_separate_drops(self, sink):
+        """Test every drop in a batch gets its reconnect as long as sends succeed in between."""
+        service = _service(sink)
+        pool = service.pool
+        send_on = pool._send_on
+        calls = []
+
+        def dropping_send_on(connection, message):
+            calls.append(message)
+            if len(calls) in (2, 5):
+                connection.smtp.close()
+            send_on(connection, message)
+
+        pool._send_on = dropping_send_on
+        emails = [
+            {"to_email": f"user{i}@example.com", "subject": "Digest", "html_content": "<p>hi</p>"}
+            for i in range(5)
+        ]
+        assert service.send_bulk_emails(emails) == 5
+        pool.close()
+
+        assert len(sink.messages) == 5
+        assert pool.failed == 0
+
+    def test_unreachable_server_fails_cleanly(self):
+        """Test a send to a closed port returns False without raising."""
+        pool = SMTPConnectionPool("127.0.0.1", 1, use_tls=False, timeout=1)
+        service = EmailService("127.0.0.1", 1, "", "", "noreply@freelanceai.com", pool=pool)
+
+        assert service.send_email("a@example.com", "Hi", "<p>1</p>") is False
+        assert pool.failed == 1
+
+
+class TestRateLimiter:
+    """Test the per-provider send cap."""
+
+    def test_waits_once_burst_is_spent(self):
+        """Test sends beyond the burst are spaced at the configured rate."""
+        limiter = RateLimiter(50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+
+        assert time.monotonic() - started >= 0.09
@@ -0,0 +1,132 @@
+"""
+Unit tests for per-user unread counters.
+"""
+
+import asyncio
+
+import pytest
+
+from app.db_models import Chat, ChatMember, ChatRead, Message, Notification, NotificationType, UnreadCounter, User
+from app.services import unread_counters as unread_module
+from app.services.unread_counters import UnreadCounterService, message_deltas, removed_message_deltas
+
+
+@pytest.fixture
+def db_tables():
+    return [User, Notification, Chat, ChatMember, Message, ChatRead, UnreadCounter]
+
+
+@pytest.fixture
+def db(db):
+    db.add(Chat(id=1, title="Task 1", creator_id=1, participant_ids=[2, 3]))
+    db.commit()
+    return db
+
+
+def _notify(db, user_id, is_read=False):
+    db.add(Notification(
+        user_id=user_id, title="t", message="m", type=NotificationType.SYSTEM_MESSAGE, is_read=is_read
+    ))
+
+
+class TestIncrement:
+    """Test atomic counter maintenance."""
+
+    def test_upsert_creates_and_adds(self, db):
+        """Test increments create missing rows and add to existing ones."""
+        counters = UnreadCounterService()
+        counters.increment(db, "notifications", {1: 2, 2: 1})
+        counters.increment(db, "notifications", {1: 1})
+        counters.increment(db, "messages", {1: 4})
+        db.commit()
+
+        assert counters.get(db, 1) == {"notifications": 3, "messages": 4}
+        assert counters.get(db, 2) == {"notifications": 1, "messages": 0}
+        assert counters.get(db, 9) == {"notifications": 0, "messages": 0}
+
+    def test_decrement_stops_at_zero(self, db):
+        """Test a stale decrement cannot make a count negative."""
+        counters = UnreadCounterService()
+        counters.increment(db, "messages", {1: 1})
+        counters.increment(db, "messages", {1: -3})
+        db.commit()
+
+        assert counters.get(db, 1)["messages"] == 0
+
+    def test_message_deltas_skip_the_sender(self, db):
+        """Test a message counts for every chat member except its sender."""
+        assert dict(message_deltas(db, [(1, 2), (1, 2), (1, 1)])) == {1: 2, 3: 3, 2: 1}
+
+    def test_removed_message_deltas_skip_readers(self, db):
+        """Test deleting messages only decrements members who had not read them."""
+        first = Message(chat_id=1, sender_id=2, content="a")
+        second = Message(chat_id=1, sender_id=3, content="b")
+        db.add_all([first, second])
+        db.flush()
+        db.add(ChatRead(chat_id=1, user_id=1, last_read_message_id=first.id))
+        db.commit()
+
+        assert removed_message_deltas(db, 1, first.id) == {3: -1}
+        assert removed_message_deltas(db, 1) == {1: -1, 2: -1, 3: -1}
+
+
+class TestReconcile:
+    """Test drift correction."""
+
+    def test_fixes_drift_and_creates_missing_rows(self, db):
+        """Test stored counts are replaced by the true ones."""
+        _notify(db, 1)
+        _notify(db, 1)
+        _notify(db, 1, is_read=True)
+        db.add(Message(chat_id=1, sender_id=2, content="hi"))
+        db.add(UnreadCounter(user_id=1, notifications=7, messages=0))
+        db.add(UnreadCounter(user_id=5, notifications=2, messages=2))
+        db.commit()
+
+        result = UnreadCounterService().reconcile(db)
+
+        assert result == {"checked": 3, "corrected": 2, "created": 1}
+        counts = {row.user_id: (row.notifications, row.messages) for row in db.query(UnreadCounter)}
+        assert counts == {1: (2, 1), 3: (0, 1), 5: (0, 0)}
+
+    def test_concurrent_change_is_not_overwritten(self, db, monkeypatch):
+        """Test a counter that moved during the run is left for the next one."""
+        _notify(db, 1)
+        db.add(UnreadCounter(user_id=1, notifications=5, messages=0))
+        db.commit()
+        counters = UnreadCounterService()
+        true_counts = counters._true_counts
+
+        def racing_true_counts(session):
+            counters.increment(session, "notifications", {1: 1})
+            return true_counts(session)
+
+        monkeypatch.setattr(counters, "_true_counts", racing_true_counts)
+        assert counters.reconcile(db)["corrected"] == 0
+        assert counters.get(db, 1)["notifications"] == 6
+
+
+class TestPublish:
+    """Test WebSocket pushes."""
+
+    @pytest.mark.asyncio
+    async def test_pushes_counts_to_online_users(self, db, monkeypatch):
+        """Test only online users get an unread_counts event."""
+        sent = []
+
+        class FakeManager:
+            def online_users(self, user_ids):
+                return {user_id for user_id in user_ids if user_id == 1}
+
+            async def send_personal_notification(self, user_id, data):
+                sent.append((user_id, data))
+
+        monkeypatch.setattr(unread_module, "notification_manager", FakeManager())
+        counters = UnreadCounterService()
+        await counters.start()
+        counters.increment(db, "notifications", {1: 1, 2: 1})
+        db.commit()
+        counters.publish(db, [1, 2])
+        await asyncio.sleep(0)
+
+        assert sent == [(1, {"type": "unread_counts", "notifications": 1, "messages": 0})]
@@ -0,0 +1,149 @@
+"""
+Unit tests for streaming and resumable uploads.
+"""
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db_models import UploadSession, User
+from app.services.uploads import (
+    UploadError, UploadOffsetMismatch, UploadSessions, UploadTooLarge, rechunk, save_stream,
+)
+
+
+async def _stream(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+@pytest.fixture
+def db_tables():
+    return [User, UploadSession]
+
+
+@pytest.fixture
+def db(db):
+    db.add(User(id=1, username="ann", email="ann@example.com", hashed_password="x"))
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path / ".sessions"), chunk_size=4, ttl_seconds=60)
+
+
+class TestSaveStream:
+    """Test single-shot streaming saves."""
+
+    @pytest.mark.asyncio
+    async def test_hashes_and_renames(self, tmp_path):
+        """Test the file lands under its name with the size and hash of what was sent."""
+        destination = str(tmp_path / "files" / "doc.txt")
+        stored = await save_stream(rechunk(_stream(b"hel", b"lo wor", b"ld"), 4), destination, 100)
+
+        assert open(destination, "rb").read() == b"hello world"
+        assert (stored.size, stored.sha256) == (11, hashlib.sha256(b"hello world").hexdigest())
+        assert os.listdir(tmp_path / "files") == ["doc.txt"]
+
+    @pytest.mark.asyncio
+    async def test_aborts_past_the_limit(self, tmp_path):
+        """Test the copy stops at the first chunk over the limit and leaves nothing behind."""
+        read = []
+
+        async def chunks():
+            for piece in (b"aaaa", b"bbbb", b"cccc"):
+                read.append(piece)
+                yield piece
+
+        with pytest.raises(UploadTooLarge):
+            await save_stream(chunks(), str(tmp_path / "big.bin"), 6)
+
+        assert read == [b"aaaa", b"bbbb"]
+        assert os.listdir(tmp_path) == []
+
+
+class TestUploadSessions:
+    """Test resumable uploads."""
+
+    @pytest.mark.asyncio
+    async def test_resume_and_complete(self, db, sessions, tmp_path):
+        """Test a retried chunk replaces the interrupted one and the hash is checked on completion."""
+        data = b"0123456789"
+        session = sessions.create(db, 1, "chat_file", "../notes.txt", len(data), 100, params={"chat_id": 7})
+        assert session.filename == "notes.txt"
+        assert await sessions.append(db, session, 0, _stream(data[:4])) == 4
+
+        # A chunk that died halfway leaves bytes past the committed offset
+        with open(sessions.part_path(session.id), "ab") as part:
+            part.write(b"xx")
+        with pytest.raises(UploadOffsetMismatch) as mismatch:
+            await sessions.append(db, session, 2, _stream(data[2:]))
+        assert mismatch.value.offset == 4
+        with pytest.raises(UploadError):
+            await sessions.complete(db, session, str(tmp_path / "out.txt"))
+
+        assert await sessions.append(db, session, 4, _stream(data[4:])) == 10
+        stored = await sessions.complete(
+            db, session, str(tmp_path / "out.txt"), hashlib.sha256(data).hexdigest()
+        )
+        db.commit()
+
+        assert open(stored.path, "rb").read() == data
+        assert db.query(UploadSession).count() == 0
+        assert not os.path.exists(sessions.part_path(session.id))
+
+    @pytest.mark.asyncio
+    async def test_racing_chunks_at_one_offset(self, db, sessions):
+        """Test the chunk that loses the race for an offset leaves the committed bytes alone."""
+        session = sessions.create(db, 1, "chat_file", "a.txt", 8, 100)
+        release = asyncio.Event()
+
+        async def slow():
+            yield b"AA"
+            await release.wait()
+            yield b"AA"
+
+        original = asyncio.ensure_future(sessions.append(db, session, 0, slow()))
+        await asyncio.sleep(0.05)
+        assert await sessions.append(db, session, 0, _stream(b"BBBB")) == 4
+        release.set()
+        with pytest.raises(UploadOffsetMismatch):
+            await original
+
+        assert open(sessions.part_path(session.id), "rb").read() == b"BBBB"
+        assert [name for name in os.listdir(sessions.directory) if name.endswith(".chunk")] == []
+
+    @pytest.mark.asyncio
+    async def test_limits(self, db, sessions, tmp_path):
+        """Test declared size limits, oversized chunks and a wrong checksum."""
+        with pytest.raises(UploadTooLarge):
+            sessions.create(db, 1, "chat_file", "a.txt", 101, 100)
+        session = sessions.create(db, 1, "chat_file", "a.txt", 5, 100)
+        with pytest.raises(UploadTooLarge):
+            await sessions.append(db, session, 0, _stream(b"abcdef"))
+        with pytest.raises(UploadTooLarge):
+            await sessions.append(db, session, 0, _stream(), length=6)
+
+        # Another worker took the first chunk, so the hash is computed from the file
+        sessions._digests.clear()
+        with open(sessions.part_path(session.id), "wb") as part:
+            part.write(b"abcde")
+        session.received = 5
+        db.commit()
+        with pytest.raises(UploadError, match="Checksum"):
+            await sessions.complete(db, session, str(tmp_path / "a.txt"), "0" * 64)
+
+    def test_expire(self, db, sessions):
+        """Test idle sessions are dropped with their partial files."""
+        session = sessions.create(db, 1, "kyc_document", "id.png", 5, 100)
+        path = sessions.part_path(session.id)
+
+        assert sessions.expire(db, datetime.now(timezone.utc)) == 0
+        assert sessions.expire(db, datetime.now(timezone.utc) + timedelta(minutes=2)) == 1
+        assert not os.path.exists(path)
+        assert db.query(UploadSession).count() == 0
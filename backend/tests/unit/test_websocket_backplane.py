@@ -0,0 +1,62 @@
+"""
+Unit tests for cross-worker WebSocket fan-out.
+"""
+
+import json
+import pytest
+
+from app.websockets.backplane import InMemoryBackplane
+from app.websockets.notification_manager import NotificationConnectionManager
+
+
+class FakeWebSocket:
+    """Records what the manager sends."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+class TestBackplaneFanOut:
+    """Test delivery between managers sharing a backplane."""
+
+    async def _workers(self):
+        backplane = InMemoryBackplane()
+        first = NotificationConnectionManager(backplane)
+        second = NotificationConnectionManager(backplane)
+        await first.start()
+        await second.start()
+        return first, second
+
+    @pytest.mark.asyncio
+    async def test_notification_reaches_user_on_other_worker(self):
+        """Test a push from one worker is delivered to a socket held by another."""
+        first, second = await self._workers()
+        socket = FakeWebSocket()
+        connection = await second.connect(42, socket)
+
+        await first.send_personal_notification(42, {"type": "kyc_status"})
+        await connection.drain()
+
+        assert socket.sent == [{"event_id": 1, "type": "kyc_status"}]
+
+    @pytest.mark.asyncio
+    async def test_local_delivery_is_not_duplicated(self):
+        """Test the publishing worker ignores its own backplane echo."""
+        first, second = await self._workers()
+        local, remote = FakeWebSocket(), FakeWebSocket()
+        local_connection = await first.connect(7, local)
+        remote_connection = await second.connect(7, remote)
+
+        await first.send_personal_notification(7, {"n": 1})
+        await first.broadcast({"n": 2})
+        await local_connection.drain()
+        await remote_connection.drain()
+
+        assert local.sent == [{"event_id": 1, "n": 1}, {"n": 2}]
+        assert remote.sent == [{"event_id": 1, "n": 1}, {"n": 2}]
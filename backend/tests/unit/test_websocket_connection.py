@@ -0,0 +1,102 @@
+"""
+Unit tests for per-connection WebSocket send queues.
+"""
+
+import asyncio
+import json
+import pytest
+
+from app.websockets.connection import ClientConnection, DISCONNECT, DROP_OLDEST
+from app.websockets.notification_manager import NotificationConnectionManager
+from app.websockets.backplane import InMemoryBackplane
+
+
+class FakeWebSocket:
+    """WebSocket whose sends can be held back to simulate a slow client."""
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+class TestClientConnection:
+    """Test queueing, drop policies and eviction."""
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_keeps_latest_messages(self):
+        """Test a full queue discards the oldest message under drop_oldest."""
+        socket = FakeWebSocket()
+        socket.release.clear()
+        connection = ClientConnection(socket, 1, max_queue=2, send_timeout=1, policy=DROP_OLDEST)
+        connection.start()
+        await asyncio.sleep(0)  # writer takes message 0 and blocks on the socket
+
+        for n in range(4):
+            connection.enqueue({"n": n})
+        socket.release.set()
+        await connection.drain()
+
+        assert [item["n"] for item in socket.sent] == [2, 3]
+        assert connection.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_evicted(self):
+        """Test a client that falls behind is closed and removed from the manager."""
+        manager = NotificationConnectionManager(InMemoryBackplane())
+        slow = FakeWebSocket()
+        slow.release.clear()
+        connection = await manager.connect(5, slow)
+        connection.policy = DISCONNECT
+        connection.queue = asyncio.Queue(maxsize=1)
+
+        for n in range(3):
+            await manager.send_personal_notification(5, {"n": n})
+        await asyncio.sleep(0.01)
+
+        assert slow.close_code == 1013
+        assert 5 not in manager.active_connections
+
+    @pytest.mark.asyncio
+    async def test_send_deadline_evicts_stuck_client(self):
+        """Test a send that exceeds the deadline evicts the client."""
+        stuck = FakeWebSocket()
+        stuck.release.clear()
+        closed = []
+
+        async def on_close(connection):
+            closed.append(connection.user_id)
+
+        connection = ClientConnection(stuck, 9, send_timeout=0.01, on_close=on_close)
+        connection.start()
+        connection.enqueue({"n": 1})
+        await asyncio.sleep(0.05)
+
+        assert closed == [9]
+        assert stuck.close_code == 1013
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_delay_others(self):
+        """Test fan-out to a fast client is not blocked by a slow one."""
+        manager = NotificationConnectionManager(InMemoryBackplane())
+        slow, fast = FakeWebSocket(), FakeWebSocket()
+        slow.release.clear()
+        await manager.connect(1, slow)
+        fast_connection = await manager.connect(2, fast)
+
+        await manager.broadcast({"type": "system"})
+        await asyncio.wait_for(fast_connection.drain(), timeout=0.1)
+
+        assert fast.sent == [{"type": "system"}]
+        assert slow.sent == []
@@ -0,0 +1,90 @@
+"""
+Unit tests for resumable WebSocket delivery.
+"""
+
+import json
+import pytest
+
+from app.websockets.backplane import InMemoryBackplane
+from app.websockets.event_log import InMemoryEventLog
+from app.websockets.notification_manager import NotificationConnectionManager
+
+
+class FakeWebSocket:
+    """Records what the manager sends."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+class TestInMemoryEventLog:
+    """Test the per-user ring buffer."""
+
+    @pytest.mark.asyncio
+    async def test_since_returns_only_the_gap(self):
+        """Test events after last_event_id are returned in order."""
+        log = InMemoryEventLog(max_events=10)
+        for n in range(5):
+            await log.append(1, {"n": n})
+
+        events, complete = await log.since(1, 3)
+        assert [event["event_id"] for event in events] == [4, 5]
+        assert complete
+
+    @pytest.mark.asyncio
+    async def test_evicted_events_require_resync(self):
+        """Test a gap older than the buffer is reported as incomplete."""
+        log = InMemoryEventLog(max_events=2)
+        for n in range(5):
+            await log.append(1, {"n": n})
+
+        events, complete = await log.since(1, 1)
+        assert [event["event_id"] for event in events] == [4, 5]
+        assert not complete
+        assert (await log.since(1, 9))[1] is False
+
+
+class TestResumableDelivery:
+    """Test reconnecting with last_event_id."""
+
+    @pytest.mark.asyncio
+    async def test_reconnect_receives_missed_events_once(self):
+        """Test a reconnecting client gets exactly the events it missed."""
+        manager = NotificationConnectionManager(InMemoryBackplane(), InMemoryEventLog())
+        first = FakeWebSocket()
+        connection = await manager.connect(3, first)
+        await manager.send_personal_notification(3, {"n": 1})
+        await connection.drain()
+        await manager.disconnect(3, first)
+
+        await manager.send_personal_notification(3, {"n": 2})
+        await manager.send_personal_notification(3, {"n": 3})
+
+        second = FakeWebSocket()
+        connection = await manager.connect(3, second, last_event_id=first.sent[-1]["event_id"])
+        await manager.send_personal_notification(3, {"n": 4})
+        await connection.drain()
+
+        assert [event["n"] for event in second.sent] == [2, 3, 4]
+        assert [event["event_id"] for event in second.sent] == [2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_events_published_during_replay_are_not_duplicated(self):
+        """Test held live events already covered by the replay are skipped."""
+        manager = NotificationConnectionManager(InMemoryBackplane(), InMemoryEventLog())
+        await manager.send_personal_notification(8, {"n": 1})
+
+        socket = FakeWebSocket()
+        connection = await manager.connect(8, socket)
+        connection.hold()
+        await manager.send_personal_notification(8, {"n": 2})
+        await manager._replay(connection, 0)
+        await connection.drain()
+
+        assert [event["event_id"] for event in socket.sent] == [1, 2]
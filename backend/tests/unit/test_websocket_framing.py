@@ -0,0 +1,75 @@
+"""
+Unit tests for WebSocket subprotocol negotiation and frame coalescing.
+"""
+
+import asyncio
+import json
+import pytest
+
+from app.websockets import framing
+from app.websockets.connection import ClientConnection
+from app.websockets.framing import Framer, JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, batch_events, negotiate
+
+
+class FakeWebSocket:
+    """WebSocket that records every frame it is asked to send."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+class TestNegotiation:
+    """Test subprotocol selection."""
+
+    def test_legacy_client_gets_no_subprotocol(self):
+        """Test a client offering nothing stays on one JSON frame per event."""
+        assert negotiate([]) is None
+        assert negotiate(["chat"]) is None
+        assert not Framer(None).batching
+
+    def test_msgpack_requires_the_package(self, monkeypatch):
+        """Test msgpack is only chosen when it can be imported."""
+        monkeypatch.setattr(framing, "msgpack", None)
+        assert negotiate([MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]) == JSON_SUBPROTOCOL
+        assert negotiate([MSGPACK_SUBPROTOCOL]) is None
+        assert Framer(MSGPACK_SUBPROTOCOL).codec == "json"
+
+
+class TestCoalescing:
+    """Test bursts are written as batch frames."""
+
+    @pytest.mark.asyncio
+    async def test_burst_is_sent_as_one_frame(self):
+        """Test events queued within the window share a frame."""
+        socket = FakeWebSocket()
+        connection = ClientConnection(socket, 1, framer=Framer(JSON_SUBPROTOCOL))
+        connection.start()
+        for i in range(20):
+            connection.enqueue({"type": "notification", "id": i})
+        await asyncio.wait_for(connection.drain(), 1)
+
+        assert len(socket.frames) == 1
+        assert [event["id"] for event in batch_events(socket.frames[0])] == list(range(20))
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_legacy_clients_are_not_batched(self):
+        """Test a connection without a subprotocol gets one frame per event."""
+        socket = FakeWebSocket()
+        connection = ClientConnection(socket, 1)
+        connection.start()
+        for i in range(3):
+            connection.enqueue({"type": "notification", "id": i})
+        await asyncio.wait_for(connection.drain(), 1)
+
+        assert socket.frames == [{"type": "notification", "id": i} for i in range(3)]
+        await connection.close()
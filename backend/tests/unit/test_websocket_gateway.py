@@ -0,0 +1,138 @@
+"""
+Unit tests for the WebSocket gateway and presence.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import settings
+from app.websockets import gateway
+from app.websockets.backplane import InMemoryBackplane
+from app.websockets.event_log import InMemoryEventLog
+from app.websockets.notification_manager import NotificationConnectionManager
+
+
+def make_token(claims):
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = NotificationConnectionManager(InMemoryBackplane(), InMemoryEventLog())
+    monkeypatch.setattr(gateway, "notification_manager", manager)
+    return manager
+
+
+@pytest.fixture
+def client(manager):
+    app = FastAPI()
+    app.add_api_websocket_route("/ws/{token}", gateway.websocket_endpoint)
+    return TestClient(app)
+
+
+class TestGateway:
+    """Test authentication, messaging and presence."""
+
+    def test_valid_token_connects_without_database(self, client, manager, monkeypatch):
+        """Test the uid claim is enough to connect and presence is tracked."""
+        monkeypatch.setattr(gateway, "_lookup_user_id", lambda email: pytest.fail("database hit"))
+        token = make_token({"sub": "a@example.com", "uid": 11})
+
+        with client.websocket_connect(f"/ws/{token}") as ws:
+            assert ws.receive_json()["user_id"] == 11
+            assert manager.is_online(11)
+            ws.send_json({"type": "ping", "timestamp": 1})
+            assert ws.receive_json() == {"type": "pong", "timestamp": 1}
+            ws.send_json({"type": "join_group", "group_name": "task_5"})
+            assert ws.receive_json()["type"] == "group_joined"
+
+        assert not manager.is_online(11)
+        assert manager.groups == {}
+
+    def test_invalid_and_refresh_tokens_are_rejected(self, client):
+        """Test bad signatures and refresh tokens cannot open a socket."""
+        for token in ("garbage", make_token({"sub": "a@example.com", "uid": 1, "type": "refresh"})):
+            with pytest.raises(WebSocketDisconnect):
+                with client.websocket_connect(f"/ws/{token}") as ws:
+                    ws.receive_json()
+
+    @pytest.mark.asyncio
+    async def test_legacy_tokens_are_cached_briefly_and_boundedly(self, monkeypatch):
+        """Test email-only tokens reuse a lookup until it expires, and a deactivated user is refused."""
+        active = {"a@example.com": 1, "b@example.com": 2}
+        lookups = []
+
+        def lookup(email):
+            lookups.append(email)
+            return active.get(email)
+
+        monkeypatch.setattr(gateway, "_lookup_user_id", lookup)
+        monkeypatch.setattr(gateway, "_legacy_user_ids", gateway.OrderedDict())
+        monkeypatch.setattr(gateway, "LEGACY_USER_CACHE_SIZE", 1)
+        token = make_token({"sub": "a@example.com"})
+
+        assert await gateway.authenticate(token) == 1
+        assert await gateway.authenticate(token) == 1
+        assert lookups == ["a@example.com"]
+
+        assert await gateway.authenticate(make_token({"sub": "b@example.com"})) == 2
+        assert list(gateway._legacy_user_ids) == ["b@example.com"]
+
+        del active["a@example.com"]
+        assert await gateway.authenticate(token) is None
+
+        monkeypatch.setattr(gateway, "LEGACY_USER_CACHE_TTL", 0.0)
+        gateway._legacy_user_ids.clear()
+        token = make_token({"sub": "b@example.com"})
+        assert await gateway.authenticate(token) == 2
+        del active["b@example.com"]
+        assert await gateway.authenticate(token) is None
+
+    def test_idle_client_is_reaped(self, client, manager, monkeypatch):
+        """Test a client that never answers heartbeats is closed."""
+        monkeypatch.setattr(settings, "WEBSOCKET_HEARTBEAT_INTERVAL", 0.01)
+        monkeypatch.setattr(settings, "WEBSOCKET_IDLE_TIMEOUT", 0.05)
+        token = make_token({"sub": "a@example.com", "uid": 12})
+
+        with client.websocket_connect(f"/ws/{token}") as ws:
+            ws.receive_json()
+            assert ws.receive_json()["type"] == "ping"
+            message = ws.receive()
+            while message.get("type") == "websocket.send":
+                message = ws.receive()
+            assert message["code"] == gateway.IDLE_CLOSE_CODE
+
+
+class TestPresenceAcrossWorkers:
+    """Test presence propagation over the backplane."""
+
+    @pytest.mark.asyncio
+    async def test_remote_presence(self):
+        """Test a user connected to one worker is online for the other."""
+        backplane = InMemoryBackplane()
+        first = NotificationConnectionManager(backplane, InMemoryEventLog())
+        second = NotificationConnectionManager(backplane, InMemoryEventLog())
+        await first.start()
+        await second.start()
+
+        class Socket:
+            async def accept(self):
+                pass
+
+            async def send_text(self, text):
+                pass
+
+        socket = Socket()
+        await first.connect(21, socket)
+        assert second.is_online(21)
+
+        late = NotificationConnectionManager(backplane, InMemoryEventLog())
+        await late.start()
+        assert late.is_online(21)
+
+        await first.disconnect(21, socket)
+        assert not second.is_online(21)
+        assert not late.is_online(21)
@@ -63,6 +63,11 @@ export const useWebSocket = () => {
       ws.current.onmessage = (event) => {
         try {
           const message: WebSocketMessage = JSON.parse(event.data);
+          if (message.type === 'ping') {
+            // Server heartbeat: answer so the connection is not reaped as idle
+            ws.current?.send(JSON.stringify({ type: 'pong', timestamp: message.timestamp }));
+            return;
+          }
           setLastMessage(message);
           console.log('WebSocket message received:', message);
         } catch (err) {